@@ -3,17 +3,34 @@ import time
 import random
 import os
 import sys
+import stat
 import ctypes
+import ctypes.util
+import struct
+import select
 import json
+import math
+import re
+import fnmatch
 import threading
+import concurrent.futures
 import datetime
+import sqlite3
+import hashlib
+import hmac
+import secrets
+import collections
+import heapq
+import bisect
+import csv
+import io
 
 # 尝试导入pyautogui和win32com，这些是exe环境中最容易出问题的模块
 try:
     import pyautogui
     # 设置pyautogui的安全设置
     pyautogui.FAILSAFE = True
-    pyautogui.PAUSE = 1  # 每个操作后暂停1秒
+    pyautogui.PAUSE = 1  # 每个操作后暂停1秒（加载配置后按 program_detection.pyautogui_pause 调整）
     PYAUTOGUI_AVAILABLE = True
 except Exception as e:
     print(f"Warning: pyautogui import failed: {e}")
@@ -42,10 +59,3837 @@ except Exception as e:
                 return MockApp()
     win32com = MockWin32com()
 
+# psutil为可选依赖，用于获取启动进程的子进程
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# numpy为可选依赖，用于向量化的排程模拟
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from tkinter import Tk, filedialog, Label, Button, Frame, Entry, OptionMenu, StringVar, IntVar, DoubleVar, messagebox, Checkbutton, TclError
 import logging
 
 
+# 候选文件记录：完整路径、小写扩展名、文件大小（字节）、修改时间（时间戳）
+FileRecord = collections.namedtuple('FileRecord', ['path', 'ext', 'size', 'mtime'])
+
+
+def path_key(path):
+    """统一路径的分隔符和大小写写法，用于比较文件夹与文件路径（不用于打开文件）"""
+    return os.path.normcase(os.path.normpath(path))
+
+
+class FileIndex:
+    """候选文件持久化索引（SQLite）
+
+    保存所有通过过滤的候选文件及其扩展名、大小、修改时间，
+    随机选择文件时直接查询索引，不再遍历目录。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.generation = 0  # 每次修改索引内容都会递增
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        # 任务线程和界面线程都会访问索引，统一通过锁串行化
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    folder TEXT NOT NULL,
+                    ext TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_files_folder ON files(folder);
+                CREATE INDEX IF NOT EXISTS idx_files_ext ON files(ext);
+                CREATE TABLE IF NOT EXISTS folders (
+                    folder TEXT PRIMARY KEY,
+                    signature TEXT NOT NULL,
+                    scanned_at REAL NOT NULL,
+                    file_count INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS saves (
+                    path TEXT NOT NULL,
+                    saved_at REAL NOT NULL,
+                    outcome TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_saves_time ON saves(saved_at);
+            """)
+            self.conn.commit()
+
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
+
+    def get_folder_state(self, folder):
+        """获取文件夹的索引状态，返回 (签名, 扫描时间, 文件数量)，未索引时返回None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT signature, scanned_at, file_count FROM folders WHERE folder = ?",
+                (folder,)
+            ).fetchone()
+        return row
+
+    def replace_folder(self, folder, records, signature):
+        """用新的扫描结果整体替换某个文件夹的索引内容（内容没有变化时只更新扫描时间）"""
+        rows = {(r.path, r.ext, r.size, r.mtime) for r in records}
+        with self.lock:
+            existing = set(self.conn.execute("SELECT path, ext, size, mtime FROM files WHERE folder = ?", (folder,)))
+            changed = existing != rows
+            with self.conn:
+                if changed:
+                    self.conn.execute("DELETE FROM files WHERE folder = ?", (folder,))
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO files (path, folder, ext, size, mtime) VALUES (?, ?, ?, ?, ?)",
+                        ((path, folder, ext, size, mtime) for path, ext, size, mtime in rows)
+                    )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO folders (folder, signature, scanned_at, file_count) VALUES (?, ?, ?, ?)",
+                    (folder, signature, time.time(), len(rows))
+                )
+            if changed:
+                self.generation += 1
+
+    def remove_path(self, path):
+        """从索引中移除单个文件（例如文件已被删除）"""
+        with self.lock:
+            with self.conn:
+                removed = self.conn.execute("DELETE FROM files WHERE path = ?", (path,)).rowcount
+            if removed:
+                self.generation += 1
+
+    def record_save(self, path, outcome, size=None, mtime=None):
+        """记录一次保存的验证结果；文件已写入时同步更新索引中的大小和修改时间"""
+        with self.lock:
+            with self.conn:
+                self.conn.execute("INSERT INTO saves (path, saved_at, outcome) VALUES (?, ?, ?)",
+                                  (path, time.time(), outcome))
+                if size is not None and mtime is not None:
+                    self.conn.execute("UPDATE files SET size = ?, mtime = ? WHERE path = ?", (size, mtime, path))
+
+    def save_counts(self, since=0):
+        """统计某个时间之后各类保存结果的次数"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT outcome, COUNT(*) FROM saves WHERE saved_at >= ? GROUP BY outcome", (since,)
+            ).fetchall()
+        return dict(rows)
+
+    def _build_where(self, folders=None, extensions=None, min_size=None, max_size=None,
+                     mtime_after=None, mtime_before=None):
+        """根据过滤条件构建WHERE子句"""
+        clauses = []
+        params = []
+
+        if folders is not None:
+            folders = list(folders)
+            if not folders:
+                return "WHERE 0", []
+            clauses.append(f"folder IN ({', '.join('?' * len(folders))})")
+            params.extend(folders)
+
+        if extensions is not None:
+            extensions = [ext.lower() for ext in extensions]
+            if not extensions:
+                return "WHERE 0", []
+            clauses.append(f"ext IN ({', '.join('?' * len(extensions))})")
+            params.extend(extensions)
+
+        if min_size is not None:
+            clauses.append("size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            clauses.append("size <= ?")
+            params.append(max_size)
+        if mtime_after is not None:
+            clauses.append("mtime >= ?")
+            params.append(mtime_after)
+        if mtime_before is not None:
+            clauses.append("mtime <= ?")
+            params.append(mtime_before)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def count(self, **filters):
+        """统计符合过滤条件的文件数量"""
+        where, params = self._build_where(**filters)
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM files {where}", params).fetchone()[0]
+
+    def query(self, limit=None, **filters):
+        """查询符合过滤条件的文件记录"""
+        where, params = self._build_where(**filters)
+        sql = f"SELECT path, ext, size, mtime FROM files {where} ORDER BY path"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = params + [limit]
+        with self.lock:
+            return [FileRecord(*row) for row in self.conn.execute(sql, params)]
+
+    def random_pick(self, **filters):
+        """从符合过滤条件的文件中均匀随机选择一个，没有候选文件时返回None"""
+        where, params = self._build_where(**filters)
+        with self.lock:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM files {where}", params).fetchone()[0]
+            if total == 0:
+                return None
+            offset = random.randrange(total)
+            row = self.conn.execute(
+                f"SELECT path, ext, size, mtime FROM files {where} LIMIT 1 OFFSET ?",
+                params + [offset]
+            ).fetchone()
+        return FileRecord(*row) if row else None
+
+
+class DirCache:
+    """目录列举缓存（SQLite）
+
+    保存每个目录的修改时间和列举结果（子目录名、候选文件记录）。再次扫描时先stat目录，
+    修改时间未变的目录直接复用缓存，只有发生变化的目录才重新列举，
+    适合无法使用文件监视的网络共享。目录修改时间只反映条目的增删和重命名，
+    复用的文件大小和修改时间可能略有滞后。
+    """
+
+    RACY_WINDOW = 2.0  # 修改时间距现在不足该秒数的目录不写入缓存（同一时间粒度内的后续修改无法分辨）
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS dir_cache ("
+                "dir TEXT PRIMARY KEY, mtime_ns INTEGER, signature TEXT, subdirs TEXT, files TEXT)"
+            )
+        self._entries = None   # 目录 -> (mtime_ns, signature, 子目录名列表, 文件记录列表)，首次使用时加载
+        self._dirty = {}       # 重新列举、等待写回的目录
+
+    def _ensure_loaded(self):
+        if self._entries is None:
+            self._entries = {}
+            for dir_path, mtime_ns, signature, subdirs, files in self.conn.execute(
+                    "SELECT dir, mtime_ns, signature, subdirs, files FROM dir_cache"):
+                self._entries[dir_path] = (mtime_ns, signature, json.loads(subdirs), json.loads(files))
+
+    def lookup(self, dir_path, mtime_ns, signature):
+        """修改时间和扫描签名都一致时返回缓存的 (子目录名列表, 文件记录列表)，否则返回None"""
+        with self.lock:
+            self._ensure_loaded()
+            entry = self._entries.get(dir_path)
+        if entry is None or entry[0] != mtime_ns or entry[1] != signature:
+            return None
+        return entry[2], entry[3]
+
+    def store(self, dir_path, mtime_ns, signature, subdirs, files):
+        """记录一个目录新的列举结果"""
+        if time.time() - mtime_ns / 1e9 < self.RACY_WINDOW:
+            return
+        entry = (mtime_ns, signature, subdirs, files)
+        with self.lock:
+            self._ensure_loaded()
+            self._entries[dir_path] = entry
+            self._dirty[dir_path] = entry
+
+    def flush(self, roots=None, visited=()):
+        """把新的列举结果写回数据库
+
+        Args:
+            roots (list): 本次完整递归扫描过的根目录；其下本次未访问到的目录（已删除或被排除）会从缓存中移除
+            visited (set): 本次扫描访问过的目录（每次扫描各自记录，并发扫描互不影响）
+        """
+        with self.lock:
+            removed = []
+            if roots and self._entries is not None:
+                roots = set(roots)
+                prefixes = tuple(root.rstrip(os.sep) + os.sep for root in roots)
+                removed = [d for d in self._entries
+                           if (d in roots or d.startswith(prefixes)) and d not in visited]
+                for dir_path in removed:
+                    del self._entries[dir_path]
+                    self._dirty.pop(dir_path, None)
+            dirty, self._dirty = self._dirty, {}
+            with self.conn:
+                self.conn.executemany("DELETE FROM dir_cache WHERE dir = ?", ((d,) for d in removed))
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO dir_cache (dir, mtime_ns, signature, subdirs, files) VALUES (?, ?, ?, ?, ?)",
+                    ((d, e[0], e[1], json.dumps(e[2], ensure_ascii=False), json.dumps(e[3], ensure_ascii=False))
+                     for d, e in dirty.items())
+                )
+
+
+class ScanStats:
+    """扫描统计信息，用于观察每个文件消耗的系统调用次数"""
+
+    def __init__(self):
+        self.dirs_listed = 0     # 列举的目录数量（每个目录一次scandir）
+        self.dirs_reused = 0     # 修改时间未变、直接复用缓存列举结果的目录数量
+        self.dir_stats = 0       # 为判断目录是否变化发起的stat调用次数
+        self.entries_seen = 0    # 遍历到的目录条目数量
+        self.stat_calls = 0      # 实际发起的stat调用次数
+        self.files_matched = 0   # 通过过滤的候选文件数量
+        self.started_at = time.time()
+        self.elapsed = 0.0
+
+    @property
+    def syscalls(self):
+        """估算的文件系统调用总数（目录列举 + stat）"""
+        return self.dirs_listed + self.stat_calls + self.dir_stats
+
+    @property
+    def syscalls_per_file(self):
+        """平均每个候选文件消耗的系统调用次数"""
+        return self.syscalls / self.files_matched if self.files_matched else 0.0
+
+    def finish(self):
+        self.elapsed = time.time() - self.started_at
+
+    def merge(self, other):
+        """合并另一个统计对象（并行扫描时每个线程单独计数）"""
+        self.dirs_listed += other.dirs_listed
+        self.dirs_reused += other.dirs_reused
+        self.dir_stats += other.dir_stats
+        self.entries_seen += other.entries_seen
+        self.stat_calls += other.stat_calls
+        self.files_matched += other.files_matched
+
+    def summary(self):
+        return (f"目录: {self.dirs_listed} | 复用目录: {self.dirs_reused} | 条目: {self.entries_seen} | 候选文件: {self.files_matched} | "
+                f"stat调用: {self.stat_calls} | 每文件系统调用: {self.syscalls_per_file:.2f} | 耗时: {self.elapsed:.2f}秒")
+
+
+class ScanRules:
+    """文件扫描的包含/排除规则（一次编译，多次使用）
+
+    规则按文件名或目录名匹配，默认使用通配符（不区分大小写），以"re:"开头的规则按正则表达式处理。
+    被排除的目录在扫描时直接剪枝，不会进入其子目录；max_depth限制递归深度（-1表示不限制）。
+    """
+
+    DEFAULT_EXCLUDE_PATTERNS = ['~$*', '.~*', '~*', '.*', '*.tmp', '*.temp']  # 临时文件和隐藏文件
+    DEFAULT_EXCLUDE_DIRS = []  # 默认不排除目录，与原来的扫描结果一致
+    SUGGESTED_EXCLUDE_DIRS = ['.*', 'node_modules', '__pycache__']  # 建议排除的隐藏目录和依赖/缓存目录
+
+    def __init__(self, include_patterns=None, exclude_patterns=None, exclude_dirs=None, max_depth=-1):
+        self.include_patterns = list(include_patterns or [])
+        self.exclude_patterns = list(self.DEFAULT_EXCLUDE_PATTERNS if exclude_patterns is None else exclude_patterns)
+        self.exclude_dirs = list(self.DEFAULT_EXCLUDE_DIRS if exclude_dirs is None else exclude_dirs)
+        self.max_depth = -1 if max_depth is None or max_depth < 0 else int(max_depth)
+
+        self._include_regex = self._compile(self.include_patterns)
+        self._exclude_regex = self._compile(self.exclude_patterns)
+        self._exclude_dir_regex = self._compile(self.exclude_dirs)
+
+    @staticmethod
+    def _compile(patterns):
+        """把多条通配符/正则规则合并编译为一个正则表达式，没有规则时返回None"""
+        parts = []
+        for pattern in patterns:
+            if pattern.startswith('re:'):
+                parts.append(f"(?:{pattern[3:]})\\Z")
+            else:
+                parts.append(fnmatch.translate(pattern))
+        if not parts:
+            return None
+        return re.compile('|'.join(f"(?:{part})" for part in parts), re.IGNORECASE)
+
+    @property
+    def signature(self):
+        """规则签名，用于判断索引等缓存是否需要重建"""
+        return json.dumps([self.include_patterns, self.exclude_patterns, self.exclude_dirs, self.max_depth])
+
+    @classmethod
+    def benchmark(cls, root, allowed_extensions=None, exclude_dirs=None, repeat=3):
+        """对比不排除目录和排除目录时递归扫描root的耗时，返回 {'full': (秒, 文件数), 'pruned': (秒, 文件数)}"""
+        exclude_dirs = cls.SUGGESTED_EXCLUDE_DIRS if exclude_dirs is None else exclude_dirs
+        results = {}
+        for label, rules in (('full', cls(exclude_dirs=[])), ('pruned', cls(exclude_dirs=exclude_dirs))):
+            best, count = None, 0
+            for _ in range(max(1, repeat)):
+                scanner = ScandirScanner(allowed_extensions, recursive=True, rules=rules)
+                started = time.perf_counter()
+                count = sum(1 for _ in scanner.scan(root))
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = (best, count)
+        return results
+
+    @staticmethod
+    def build_benchmark_tree(root, project_files=2000, dependency_files=50000, width=50):
+        """生成基准测试用的目录树：少量项目文件 + 一个很大的node_modules"""
+        for index in range(project_files):
+            folder = os.path.join(root, "src", f"pkg{index % width}")
+            os.makedirs(folder, exist_ok=True)
+            open(os.path.join(folder, f"file{index}.py"), 'w').close()
+        for index in range(dependency_files):
+            folder = os.path.join(root, "node_modules", f"dep{index % width}", "lib")
+            os.makedirs(folder, exist_ok=True)
+            open(os.path.join(folder, f"module{index}.js"), 'w').close()
+
+    def allow_file(self, name):
+        """判断文件名是否满足包含/排除规则"""
+        if self._exclude_regex is not None and self._exclude_regex.match(name):
+            return False
+        if self._include_regex is not None and not self._include_regex.match(name):
+            return False
+        return True
+
+    def allow_dir(self, name, depth):
+        """判断是否进入深度为depth的子目录（根目录深度为0）"""
+        if self.max_depth >= 0 and depth > self.max_depth:
+            return False
+        return self._exclude_dir_regex is None or not self._exclude_dir_regex.match(name)
+
+
+def run_scan_benchmark_cli(argv):
+    """命令行扫描基准测试入口：python activity_tracker.py --benchmark-scan [FOLDER]"""
+    import argparse
+    import tempfile
+    import shutil
+    parser = argparse.ArgumentParser(description="对比排除目录前后的扫描耗时（不打开界面）")
+    parser.add_argument("--benchmark-scan", metavar="FOLDER", nargs="?", const="", required=True,
+                        help="要扫描的文件夹（不指定时生成带大型node_modules的临时目录树）")
+    args = parser.parse_args(argv)
+
+    root = args.benchmark_scan
+    temp_root = None
+    if not root:
+        temp_root = root = tempfile.mkdtemp(prefix="scan_benchmark_")
+        ScanRules.build_benchmark_tree(root)
+    try:
+        results = ScanRules.benchmark(root)
+    finally:
+        if temp_root:
+            shutil.rmtree(temp_root, ignore_errors=True)
+    (full_time, full_count), (pruned_time, pruned_count) = results['full'], results['pruned']
+    print(f"不排除目录: {full_time:.3f}秒, {full_count} 个文件")
+    print(f"排除 {', '.join(ScanRules.SUGGESTED_EXCLUDE_DIRS)}: {pruned_time:.3f}秒, {pruned_count} 个文件")
+    print(f"加速: {full_time / max(1e-9, pruned_time):.1f}x")
+    return 0
+
+
+class ScandirScanner:
+    """基于os.scandir的文件扫描器
+
+    直接使用DirEntry缓存的类型信息判断文件/目录，只对通过名称过滤的文件调用一次stat()，
+    在网络共享上比逐个调用exists/isfile/isdir/getsize快得多。
+    """
+
+    def __init__(self, allowed_extensions, recursive=True, time_budget=0, entry_budget=0, with_stat=True,
+                 rules=None, dir_cache=None):
+        # 后缀白名单在每次扫描时只构建一次（None表示不按后缀过滤）
+        if allowed_extensions is None:
+            self.allowed_extensions = None
+        else:
+            self.allowed_extensions = frozenset(ext.lower() for ext in allowed_extensions)
+        self.recursive = recursive
+        self.with_stat = with_stat  # 是否需要文件大小和修改时间
+        self.rules = rules if rules is not None else ScanRules()
+        self.stats = ScanStats()
+
+        # 目录列举缓存：列举结果取决于过滤条件，签名不一致的缓存不会被复用
+        self.dir_cache = dir_cache
+        self.visited_dirs = set()     # 本次扫描访问过的目录（只在使用缓存时记录）
+        self.completed_roots = set()  # 完整扫描完毕的根目录（预算用尽或提前停止的不算）
+        self.cache_signature = json.dumps([self.rules.signature, sorted(self.allowed_extensions or []),
+                                           self.allowed_extensions is None, with_stat])
+
+        # 扫描预算（0表示不限制），预算在多次scan()调用之间共享
+        self.deadline = time.time() + time_budget if time_budget and time_budget > 0 else None
+        self.entry_budget = entry_budget if entry_budget and entry_budget > 0 else None
+        self.budget_exhausted = False
+
+    def _check_budget(self):
+        """检查扫描预算是否用尽"""
+        if self.budget_exhausted:
+            return True
+        if self.entry_budget is not None and self.stats.entries_seen >= self.entry_budget:
+            self.budget_exhausted = True
+        elif self.deadline is not None and time.time() >= self.deadline:
+            self.budget_exhausted = True
+        return self.budget_exhausted
+
+    def is_candidate_name(self, name):
+        """仅根据文件名判断是否为候选文件（不产生系统调用）"""
+        if not self.rules.allow_file(name):
+            return False
+        if self.allowed_extensions is None:
+            return True
+        return os.path.splitext(name)[1].lower() in self.allowed_extensions
+
+    def iter_directory(self, dir_path, stats, subdirs, check_budget=None, depth=0):
+        """列举单个目录：产出其中的候选文件记录，并把需要继续扫描的子目录以 (路径, 深度) 追加到subdirs"""
+        cache = self.dir_cache
+        if cache is not None:
+            try:
+                dir_mtime_ns = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                return
+            stats.dir_stats += 1
+            self.visited_dirs.add(dir_path)
+            cached = cache.lookup(dir_path, dir_mtime_ns, self.cache_signature)
+            if cached is not None:
+                yield from self._replay_directory(dir_path, cached, stats, subdirs, depth)
+                return
+            cached_subdirs = []
+            cached_files = []
+
+        try:
+            iterator = os.scandir(dir_path)
+        except OSError:
+            return
+        stats.dirs_listed += 1
+        complete = True
+
+        with iterator:
+            for entry in iterator:
+                if check_budget is not None and check_budget():
+                    complete = False
+                    break
+                stats.entries_seen += 1
+                try:
+                    if entry.is_dir():
+                        # 与os.walk一致：不进入符号链接指向的目录；被排除的目录直接剪枝
+                        if entry.is_symlink():
+                            continue
+                        if cache is not None:
+                            cached_subdirs.append(entry.name)
+                        if self.recursive and self.rules.allow_dir(entry.name, depth + 1):
+                            subdirs.append((entry.path, depth + 1))
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+
+                name = entry.name
+                if not self.is_candidate_name(name):
+                    continue
+
+                ext = os.path.splitext(name)[1].lower()
+                if not self.with_stat:
+                    stats.files_matched += 1
+                    if cache is not None:
+                        cached_files.append([name, ext, None, None])
+                    yield FileRecord(entry.path, ext, None, None)
+                    continue
+
+                try:
+                    entry_stat = entry.stat()
+                except OSError:
+                    continue
+                stats.stat_calls += 1
+                stats.files_matched += 1
+
+                if cache is not None:
+                    cached_files.append([name, ext, entry_stat.st_size, entry_stat.st_mtime])
+                yield FileRecord(entry.path, ext, entry_stat.st_size, entry_stat.st_mtime)
+
+        # 只缓存完整列举的目录（预算用尽中断的不写入）
+        if cache is not None and complete:
+            cache.store(dir_path, dir_mtime_ns, self.cache_signature, cached_subdirs, cached_files)
+
+    def _replay_directory(self, dir_path, cached, stats, subdirs, depth):
+        """复用缓存的目录列举结果（不访问磁盘）"""
+        cached_subdirs, cached_files = cached
+        stats.dirs_reused += 1
+        stats.entries_seen += len(cached_subdirs) + len(cached_files)
+        if self.recursive:
+            for name in cached_subdirs:
+                if self.rules.allow_dir(name, depth + 1):
+                    subdirs.append((os.path.join(dir_path, name), depth + 1))
+        for name, ext, size, mtime in cached_files:
+            stats.files_matched += 1
+            yield FileRecord(os.path.join(dir_path, name), ext, size, mtime)
+
+    def flush_cache(self, roots=None):
+        """把本次扫描的目录列举结果写回缓存
+
+        只有递归扫描且完整扫描完毕的根目录才会清理其下未访问到的目录；
+        非递归扫描、预算用尽或提前停止时只写回，不清理。
+        """
+        if self.dir_cache is None:
+            return
+        prune_roots = None
+        if roots and self.recursive and not self.budget_exhausted:
+            prune_roots = [root for root in roots if root in self.completed_roots]
+        self.dir_cache.flush(prune_roots, self.visited_dirs)
+
+    def scan(self, folder_path):
+        """扫描文件夹，逐个产出通过过滤的FileRecord"""
+        pending_dirs = [(folder_path, 0)]
+
+        try:
+            while pending_dirs and not self._check_budget():
+                dir_path, depth = pending_dirs.pop()
+                yield from self.iter_directory(dir_path, self.stats, pending_dirs, self._check_budget, depth)
+            if not pending_dirs and not self.budget_exhausted:
+                self.completed_roots.add(folder_path)
+        finally:
+            self.stats.finish()
+
+
+class FolderScanResult:
+    """单个项目文件夹的扫描结果"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.records = []
+        self.dirs_listed = 0
+        self.elapsed = 0.0
+
+
+class ParallelScanEngine:
+    """多文件夹并行扫描引擎
+
+    使用有界线程池同时扫描多个项目文件夹。每个工作线程维护自己的目录双端队列，
+    优先处理队列尾部的目录（深度优先），队列为空时从其他线程队列头部窃取较大的子树，
+    使单个大文件夹的扫描也能分摊到多个线程上。结果按文件夹顺序和路径排序合并，保证确定性。
+    """
+
+    def __init__(self, scanner, max_workers=4):
+        self.scanner = scanner
+        self.max_workers = max(1, int(max_workers or 1))
+
+    def scan(self, folders):
+        """并行扫描多个文件夹，返回与folders顺序一致的FolderScanResult列表"""
+        folders = list(folders)
+        results = [FolderScanResult(folder) for folder in folders]
+        if not folders:
+            return results
+
+        if self.max_workers == 1:
+            # 单线程时直接顺序扫描
+            for result in results:
+                folder_start = time.time()
+                dirs_before = self.scanner.stats.dirs_listed + self.scanner.stats.dirs_reused
+                result.records = sorted(self.scanner.scan(result.folder))
+                result.dirs_listed = self.scanner.stats.dirs_listed + self.scanner.stats.dirs_reused - dirs_before
+                result.elapsed = time.time() - folder_start
+            return results
+
+        worker_count = self.max_workers
+        queues = [collections.deque() for _ in range(worker_count)]
+        for folder_idx, folder in enumerate(folders):
+            queues[folder_idx % worker_count].append((folder_idx, folder, 0))
+
+        condition = threading.Condition()
+        pending = {'total': len(folders)}  # 尚未处理完的目录数量
+        folder_pending = [1] * len(folders)
+        done = threading.Event()
+        start_time = time.time()
+        worker_stats = [ScanStats() for _ in range(worker_count)]
+        worker_records = [collections.defaultdict(list) for _ in range(worker_count)]
+
+        def take_task(worker_id):
+            """先从自己队列尾部取任务，再从其他队列头部窃取"""
+            try:
+                return queues[worker_id].pop()
+            except IndexError:
+                pass
+            for offset in range(1, worker_count):
+                try:
+                    return queues[(worker_id + offset) % worker_count].popleft()
+                except IndexError:
+                    continue
+            return None
+
+        def worker(worker_id):
+            stats = worker_stats[worker_id]
+            records = worker_records[worker_id]
+            while not done.is_set():
+                task = take_task(worker_id)
+                if task is None:
+                    with condition:
+                        condition.wait(0.05)
+                    continue
+
+                folder_idx, dir_path, depth = task
+                subdirs = []
+                try:
+                    records[folder_idx].extend(self.scanner.iter_directory(dir_path, stats, subdirs, depth=depth))
+                finally:
+                    # 先登记新增的子目录再放入队列，保证未完成计数不会提前归零
+                    with condition:
+                        pending['total'] += len(subdirs) - 1
+                        folder_pending[folder_idx] += len(subdirs) - 1
+                        results[folder_idx].dirs_listed += 1
+                        if folder_pending[folder_idx] == 0:
+                            results[folder_idx].elapsed = time.time() - start_time
+                            self.scanner.completed_roots.add(folders[folder_idx])
+                        if pending['total'] == 0:
+                            done.set()
+                        for subdir, subdir_depth in subdirs:
+                            queues[worker_id].append((folder_idx, subdir, subdir_depth))
+                        condition.notify_all()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=worker_count) as executor:
+            futures = [executor.submit(worker, worker_id) for worker_id in range(worker_count)]
+            for future in futures:
+                future.result()
+
+        # 按文件夹顺序确定性地合并各线程的结果
+        for folder_idx, result in enumerate(results):
+            merged = []
+            for records in worker_records:
+                merged.extend(records.get(folder_idx, ()))
+            merged.sort()
+            result.records = merged
+
+        for stats in worker_stats:
+            self.scanner.stats.merge(stats)
+        self.scanner.stats.finish()
+
+        return results
+
+
+class ReservoirSampler:
+    """蓄水池抽样（k=1）：流式地从候选项中均匀选出一个，内存占用恒定"""
+
+    def __init__(self):
+        self.count = 0
+        self.selected = None
+
+    def offer(self, item):
+        """提供一个候选项，第n个候选项以1/n的概率替换当前选择"""
+        self.count += 1
+        if random.randrange(self.count) == 0:
+            self.selected = item
+
+
+class FenwickTree:
+    """树状数组：O(log n)修改单个权重，O(log n)按前缀和定位元素"""
+
+    def __init__(self, weights=()):
+        self.weights = [float(w) for w in weights]
+        size = len(self.weights)
+        self._tree = [0.0] * (size + 1)
+        # O(n)建树：每个节点把自己的部分和累加到父节点
+        for i in range(1, size + 1):
+            self._tree[i] += self.weights[i - 1]
+            parent = i + (i & -i)
+            if parent <= size:
+                self._tree[parent] += self._tree[i]
+
+    def __len__(self):
+        return len(self.weights)
+
+    def _prefix(self, i):
+        """前i个权重之和"""
+        total = 0.0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    @property
+    def total(self):
+        return self._prefix(len(self.weights))
+
+    def append(self, weight):
+        """在末尾追加一个权重，返回其位置"""
+        weight = float(weight)
+        self.weights.append(weight)
+        i = len(self.weights)
+        # 新节点覆盖区间(i - lowbit(i), i]
+        self._tree.append(weight + self._prefix(i - 1) - self._prefix(i - (i & -i)))
+        return i - 1
+
+    def set(self, position, weight):
+        """修改某个位置的权重"""
+        weight = float(weight)
+        delta = weight - self.weights[position]
+        self.weights[position] = weight
+        i = position + 1
+        size = len(self.weights)
+        while i <= size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def find(self, target):
+        """找到前缀和首次超过target的位置（二进制提升，O(log n)）"""
+        position = 0
+        size = len(self.weights)
+        step = 1 << size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= size and self._tree[nxt] <= target:
+                position = nxt
+                target -= self._tree[nxt]
+            step >>= 1
+        return min(position, size - 1)
+
+
+class FileWeightPolicy:
+    """文件权重策略：根据索引中的元数据（修改时间、大小、扩展名、置顶列表）计算权重
+
+    各个因子相乘得到最终权重，可以通过add_factor追加自定义的权重函数。
+    """
+
+    def __init__(self, recency_half_life_days=0, min_recency_weight=0.1, size_soft_limit_mb=0,
+                 extension_weights=None, pinned_files=None, pinned_weight=1.0):
+        self.recency_half_life = recency_half_life_days * 86400
+        self.min_recency_weight = min_recency_weight
+        self.size_soft_limit = size_soft_limit_mb * 1024 * 1024
+        self.extension_weights = {ext.lower(): float(w) for ext, w in (extension_weights or {}).items()}
+        self.pinned_files = {os.path.normcase(os.path.abspath(p)) for p in (pinned_files or [])}
+        self.pinned_weight = pinned_weight
+        self.factors = []
+        if self.recency_half_life > 0:
+            self.factors.append(self._recency_factor)
+        if self.size_soft_limit > 0:
+            self.factors.append(self._size_factor)
+        if self.extension_weights:
+            self.factors.append(self._extension_factor)
+        if self.pinned_files:
+            self.factors.append(self._pinned_factor)
+
+    def add_factor(self, factor):
+        """追加一个权重函数：factor(record, now) -> 非负倍数"""
+        self.factors.append(factor)
+
+    def _recency_factor(self, record, now):
+        """最近修改的文件权重更高，按半衰期指数衰减"""
+        age = max(0.0, now - record.mtime)
+        return max(self.min_recency_weight, 0.5 ** (age / self.recency_half_life))
+
+    def _size_factor(self, record, now):
+        """超过软上限的大文件按比例降低权重"""
+        if record.size <= self.size_soft_limit:
+            return 1.0
+        return self.size_soft_limit / record.size
+
+    def _extension_factor(self, record, now):
+        return self.extension_weights.get(record.ext, 1.0)
+
+    def _pinned_factor(self, record, now):
+        return self.pinned_weight if os.path.normcase(record.path) in self.pinned_files else 1.0
+
+    def weight(self, record, now=None):
+        """计算单个文件的权重"""
+        if now is None:
+            now = time.time()
+        weight = 1.0
+        for factor in self.factors:
+            weight *= factor(record, now)
+        return max(0.0, weight)
+
+
+class WeightedSelector:
+    """加权文件选择器：权重保存在树状数组中，选择和单个文件的权重更新都是O(log n)
+
+    移除的文件权重置零并留下空位，空位过多时整体重建。
+    """
+
+    def __init__(self, policy, records=(), opened_factor=1.0):
+        self.policy = policy
+        self.opened_factor = opened_factor
+        self.opened_counts = {}  # 路径 -> 已打开次数（重建后仍然保留）
+        self.source_key = None   # 构建时候选来源的标识，用于判断是否需要重建
+        self.rebuild(records)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, path):
+        return path in self._slots
+
+    def _weight(self, record, now):
+        weight = self.policy.weight(record, now)
+        opened = self.opened_counts.get(record.path)
+        if opened:
+            weight *= self.opened_factor ** opened
+        return weight
+
+    def rebuild(self, records, source_key=None):
+        """用一批候选文件记录重建选择器（O(n)）"""
+        now = time.time()
+        records = list(records)
+        self._records = records
+        self._slots = {record.path: i for i, record in enumerate(records)}
+        self._tree = FenwickTree(self._weight(record, now) for record in records)
+        self.source_key = source_key
+
+    def add(self, record):
+        """添加或更新一个候选文件"""
+        weight = self._weight(record, time.time())
+        position = self._slots.get(record.path)
+        if position is None:
+            self._slots[record.path] = self._tree.append(weight)
+            self._records.append(record)
+        else:
+            self._records[position] = record
+            self._tree.set(position, weight)
+
+    def remove(self, path):
+        """移除一个候选文件"""
+        position = self._slots.pop(path, None)
+        if position is None:
+            return
+        self._tree.set(position, 0.0)
+        self._records[position] = None
+        if len(self._records) > 64 and len(self._slots) * 2 < len(self._records):
+            self.rebuild([r for r in self._records if r is not None], self.source_key)
+
+    def mark_opened(self, path):
+        """文件被打开后按配置的倍数调整其权重"""
+        self.opened_counts[path] = self.opened_counts.get(path, 0) + 1
+        position = self._slots.get(path)
+        if position is not None and self.opened_factor != 1.0:
+            self._tree.set(position, self._tree.weights[position] * self.opened_factor)
+
+    def weight_of(self, path):
+        position = self._slots.get(path)
+        return self._tree.weights[position] if position is not None else 0.0
+
+    @property
+    def total_weight(self):
+        return self._tree.total
+
+    def pick(self):
+        """按权重随机选择一个文件，没有候选文件或权重全为零时返回None"""
+        total = self._tree.total
+        if not self._slots or total <= 0:
+            return None
+        record = self._records[self._tree.find(random.random() * total)]
+        if record is None:
+            # 浮点误差落在空位上时退回到均匀选择
+            record = self._records[self._slots[random.choice(list(self._slots))]]
+        return record.path
+
+
+class ShuffleBag:
+    """不重复洗牌选择：一轮内每个文件最多被选中一次，全部选完后开始新一轮
+
+    未选中的文件保存在可O(1)删除的列表中，每次从中均匀随机抽取，等价于
+    按洗好的牌依次发牌；新增文件相当于随机插入牌堆，无需重新洗牌。
+    发牌记录和每个文件最近一次打开的时间以追加日志的形式持久化，
+    日志过长时压缩为一条快照，程序重启或停止任务后可以接着上次的进度。
+    """
+
+    RETENTION_DAYS = 90  # 压缩日志时保留的打开记录天数
+
+    def __init__(self, log_path):
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.round = 0
+        self.dealt = set()        # 本轮已经发出的文件
+        self.last_opened = {}     # 路径 -> 最近一次打开的时间戳
+        self._remaining = []      # 本轮尚未发出的文件
+        self._remaining_slots = {}
+        self._corpus = set()
+        self._log_lines = 0
+        self.source_key = None
+
+        log_dir = os.path.dirname(log_path)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return len(self._corpus)
+
+    @property
+    def remaining(self):
+        return len(self._remaining)
+
+    def _load(self):
+        """重放日志恢复发牌进度，损坏的行直接跳过"""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                self._log_lines += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                op = entry[0]
+                if op == "s":
+                    self.round, dealt, self.last_opened = entry[1], entry[2], entry[3]
+                    self.dealt = set(dealt)
+                elif op == "d":
+                    self.dealt.add(entry[1])
+                    self.last_opened[entry[1]] = entry[2]
+                elif op == "r":
+                    self.round = entry[1]
+                    self.dealt.clear()
+
+    def _append(self, entry):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._log_lines += 1
+        if self._log_lines > 2 * (len(self.dealt) + len(self.last_opened)) + 1000:
+            self._compact()
+
+    def _compact(self):
+        """把日志压缩为一条快照（先写临时文件再替换，避免中途失败丢失进度）"""
+        cutoff = time.time() - self.RETENTION_DAYS * 86400
+        self.last_opened = {path: ts for path, ts in self.last_opened.items() if ts >= cutoff}
+        temp_path = self.log_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(["s", self.round, sorted(self.dealt), self.last_opened], ensure_ascii=False) + "\n")
+        os.replace(temp_path, self.log_path)
+        self._log_lines = 1
+
+    def _push(self, path):
+        if path not in self._remaining_slots:
+            self._remaining_slots[path] = len(self._remaining)
+            self._remaining.append(path)
+
+    def _pop(self, path):
+        position = self._remaining_slots.pop(path, None)
+        if position is None:
+            return
+        last_path = self._remaining.pop()
+        if last_path != path:
+            self._remaining[position] = last_path
+            self._remaining_slots[last_path] = position
+
+    def sync(self, paths, source_key=None):
+        """用当前的候选文件更新牌堆：只处理新增和移除的文件，不重新洗牌"""
+        paths = set(paths)
+        with self.lock:
+            for path in self._corpus - paths:
+                self._pop(path)
+                self.dealt.discard(path)
+            for path in paths - self._corpus:
+                if path not in self.dealt:
+                    self._push(path)
+            self._corpus = paths
+            self.source_key = source_key
+
+    def add(self, record):
+        """添加一个候选文件（已在牌堆或本轮已发出时不变）"""
+        with self.lock:
+            if record.path in self._corpus:
+                return
+            self._corpus.add(record.path)
+            if record.path not in self.dealt:
+                self._push(record.path)
+
+    def remove(self, path):
+        """移除一个已不存在的文件"""
+        with self.lock:
+            self._corpus.discard(path)
+            self._pop(path)
+            self.dealt.discard(path)
+
+    def pick(self):
+        """从本轮尚未发出的文件中随机选择一个；本轮已发完时开始新一轮"""
+        with self.lock:
+            if not self._remaining:
+                if not self._corpus:
+                    return None
+                self.round += 1
+                self.dealt.clear()
+                for path in self._corpus:
+                    self._push(path)
+                self._append(["r", self.round])
+            return self._remaining[random.randrange(len(self._remaining))]
+
+    def mark_opened(self, path, timestamp=None):
+        """记录文件已被打开：从本轮牌堆中移除并更新最近打开时间"""
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            self._pop(path)
+            self.dealt.add(path)
+            self.last_opened[path] = timestamp
+            self._append(["d", path, timestamp])
+
+    def coverage(self, days, now=None):
+        """统计最近days天内被打开过的文件占当前候选文件的比例
+
+        Returns:
+            tuple: (被打开过的文件数, 候选文件总数, 比例)
+        """
+        if now is None:
+            now = time.time()
+        cutoff = now - days * 86400
+        with self.lock:
+            total = len(self._corpus)
+            touched = sum(1 for path in self._corpus if self.last_opened.get(path, 0) >= cutoff)
+        return touched, total, (touched / total if total else 0.0)
+
+
+class CandidateSet:
+    """候选文件集合：支持O(1)的增删和均匀随机选择，可被多个线程同时访问"""
+
+    CHANGE_LOG_SIZE = 4096  # 保留的最近变化条数，派生结构落后更多时需要整体重建
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._paths = []   # 用于随机选择的路径列表
+        self._slots = {}   # 路径 -> (在_paths中的位置, FileRecord)
+        self._by_dir = collections.defaultdict(set)  # 目录 -> 该目录下的候选文件路径
+        self.version = 0   # 内容真正变化（新增、删除或记录变化）时递增，用于判断派生的数据结构是否过期
+        self._changes = collections.deque(maxlen=self.CHANGE_LOG_SIZE)  # 最近的变化 (版本, 路径, 记录或None)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __contains__(self, path):
+        return path in self._slots
+
+    def add(self, record):
+        """添加或更新一个候选文件"""
+        with self.lock:
+            slot = self._slots.get(record.path)
+            if slot is not None:
+                if slot[1] == record:
+                    return
+                self._slots[record.path] = (slot[0], record)
+                self._record_change(record.path, record)
+                return
+            self._record_change(record.path, record)
+            self._slots[record.path] = (len(self._paths), record)
+            self._paths.append(record.path)
+            self._by_dir[os.path.dirname(record.path)].add(record.path)
+
+    def discard(self, path):
+        """移除一个候选文件（与列表末尾交换后删除）"""
+        with self.lock:
+            slot = self._slots.pop(path, None)
+            if slot is None:
+                return
+            self._record_change(path, None)
+            position = slot[0]
+            last_path = self._paths.pop()
+            if last_path != path:
+                self._paths[position] = last_path
+                self._slots[last_path] = (position, self._slots[last_path][1])
+            dir_paths = self._by_dir.get(os.path.dirname(path))
+            if dir_paths is not None:
+                dir_paths.discard(path)
+                if not dir_paths:
+                    del self._by_dir[os.path.dirname(path)]
+
+    def _record_change(self, path, record):
+        """递增版本并记录一次变化（调用方需持有锁）"""
+        self.version += 1
+        self._changes.append((self.version, path, record))
+
+    def changes_since(self, version):
+        """获取某个版本之后的变化 [(路径, 记录或None)]，变化记录已不完整时返回None"""
+        with self.lock:
+            if version == self.version:
+                return []
+            if version > self.version or not self._changes or self._changes[0][0] > version + 1:
+                return None
+            return [(path, record) for changed_version, path, record in self._changes if changed_version > version]
+
+    def paths_in_dir(self, dir_path):
+        """获取某个目录下（不含子目录）的候选文件路径"""
+        with self.lock:
+            return set(self._by_dir.get(dir_path, ()))
+
+    def discard_tree(self, dir_path):
+        """移除某个目录及其所有子目录下的候选文件"""
+        prefix = dir_path.rstrip(os.sep) + os.sep
+        with self.lock:
+            dirs = [d for d in self._by_dir if d == dir_path or d.startswith(prefix)]
+            paths = [p for d in dirs for p in self._by_dir[d]]
+        for path in paths:
+            self.discard(path)
+
+    def choice(self):
+        """均匀随机选择一个候选文件，集合为空时返回None"""
+        with self.lock:
+            if not self._paths:
+                return None
+            return self._paths[random.randrange(len(self._paths))]
+
+    def records(self):
+        """获取所有候选文件记录的快照"""
+        with self.lock:
+            return [record for _, record in self._slots.values()]
+
+
+class ScanResult:
+    """一次扫描的结果：候选文件集合、各文件夹和各扩展名的文件数量以及扫描耗时
+
+    启动任务时的可用文件检查、文件数量统计和工作模式中第一次选择文件在有效期内共用同一个结果，
+    启动一次任务只需扫描一次。
+    """
+
+    def __init__(self, recursive, folders, records, elapsed=0.0, signature=None, source="scan"):
+        self.recursive = recursive
+        self.signature = signature
+        self.source = source  # 候选文件来源：watcher / index / scan
+        self.elapsed = elapsed
+        self.created_at = time.time()
+        self.candidates = CandidateSet()
+        self.folder_counts = collections.OrderedDict((folder, 0) for folder in folders)
+        self.extension_counts = collections.Counter()
+
+        prefixes = [(folder, path_key(folder).rstrip(os.sep) + os.sep) for folder in folders]
+        for record in records:
+            self.candidates.add(record)
+            self.extension_counts[record.ext] += 1
+            record_key = path_key(record.path)
+            for folder, prefix in prefixes:
+                if record_key.startswith(prefix):
+                    self.folder_counts[folder] += 1
+                    break
+
+    def __len__(self):
+        return len(self.candidates)
+
+    @property
+    def age(self):
+        return time.time() - self.created_at
+
+    def is_fresh(self, max_age, signature):
+        """结果在有效期内且扫描条件未变化"""
+        return self.signature == signature and self.age <= max_age
+
+    def summary(self):
+        top_extensions = ", ".join(f"{ext or '无后缀'}: {count}" for ext, count in self.extension_counts.most_common(5))
+        return (f"来源: {self.source} | 候选文件: {len(self)} | 文件夹: {len(self.folder_counts)} | "
+                f"主要类型: {top_extensions or '无'} | 耗时: {self.elapsed:.2f}秒")
+
+
+class TitleMatcher:
+    """窗口标题 -> 项目文件匹配器（Aho-Corasick多模式匹配）
+
+    以所有跟踪和索引中文件的小写文件名及文件名主干为模式构建自动机，
+    每个窗口标题只需线性扫描一遍即可找出其中包含的文件名。
+    文件增删时只记录差异：新增的模式先放在待合并列表中逐个检查，删除的模式在输出时过滤，
+    待合并的模式过多时才重建自动机。
+    """
+
+    REBUILD_THRESHOLD = 256  # 待合并模式超过该数量（或模式总数的1/10）时重建自动机
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._files = {}      # 路径 -> 文件名
+        self._patterns = {}   # 小写模式 -> {文件名: 引用次数}
+        self._pending = set() # 自动机构建后新增、尚未合并的模式
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [None]   # 节点 -> 以该节点结尾的模式
+        self._dict_link = [0]   # 节点 -> 沿失败链最近的输出节点
+        self.source_key = None
+        self.rebuilds = 0
+
+    def __len__(self):
+        return len(self._files)
+
+    @staticmethod
+    def _file_patterns(file_name):
+        name_lower = file_name.lower()
+        stem_lower = os.path.splitext(file_name)[0].lower()
+        return {pattern for pattern in (name_lower, stem_lower) if pattern}
+
+    def _add(self, path):
+        if path in self._files:
+            return
+        file_name = os.path.basename(path)
+        self._files[path] = file_name
+        for pattern in self._file_patterns(file_name):
+            owners = self._patterns.get(pattern)
+            if owners is None:
+                owners = self._patterns[pattern] = {}
+                self._pending.add(pattern)
+            owners[file_name] = owners.get(file_name, 0) + 1
+
+    def _remove(self, path):
+        file_name = self._files.pop(path, None)
+        if file_name is None:
+            return
+        for pattern in self._file_patterns(file_name):
+            owners = self._patterns.get(pattern)
+            if owners is None:
+                continue
+            owners[file_name] -= 1
+            if owners[file_name] <= 0:
+                del owners[file_name]
+            if not owners:
+                del self._patterns[pattern]
+                self._pending.discard(pattern)
+
+    def add_file(self, path):
+        with self.lock:
+            self._add(path)
+
+    def remove_file(self, path):
+        with self.lock:
+            self._remove(path)
+
+    def sync(self, paths, source_key=None):
+        """与当前的文件集合同步，只处理新增和删除的文件"""
+        paths = set(paths)
+        with self.lock:
+            for path in [p for p in self._files if p not in paths]:
+                self._remove(path)
+            for path in paths:
+                self._add(path)
+            self.source_key = source_key
+
+    def _build(self):
+        """根据当前所有模式重建自动机（BFS计算失败链）"""
+        goto = [{}]
+        output = [None]
+        for pattern in self._patterns:
+            node = 0
+            for char in pattern:
+                nxt = goto[node].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][char] = nxt
+                    goto.append({})
+                    output.append(None)
+                node = nxt
+            output[node] = pattern
+
+        fail = [0] * len(goto)
+        dict_link = [0] * len(goto)
+        queue = collections.deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                dict_link[child] = fail[child] if output[fail[child]] is not None else dict_link[fail[child]]
+                queue.append(child)
+
+        self._goto, self._fail, self._output, self._dict_link = goto, fail, output, dict_link
+        self._pending = set()
+        self.rebuilds += 1
+
+    def match(self, title):
+        """返回标题中包含的最长文件名或文件名主干对应的文件名，没有时返回None"""
+        title = title.lower()
+        with self.lock:
+            if len(self._pending) > max(self.REBUILD_THRESHOLD, len(self._patterns) // 10):
+                self._build()
+
+            best = None
+            goto, fail, output, dict_link = self._goto, self._fail, self._output, self._dict_link
+            node = 0
+            for char in title:
+                while node and char not in goto[node]:
+                    node = fail[node]
+                node = goto[node].get(char, 0)
+                hit = node if output[node] is not None else dict_link[node]
+                while hit:
+                    pattern = output[hit]
+                    # 自动机构建后已被删除的模式直接跳过
+                    if pattern in self._patterns and (best is None or len(pattern) > len(best)):
+                        best = pattern
+                    hit = dict_link[hit]
+
+            for pattern in self._pending:
+                if pattern in title and (best is None or len(pattern) > len(best)):
+                    best = pattern
+
+            if best is None:
+                return None
+            return next(iter(self._patterns[best]))
+
+
+class InotifyBackend:
+    """基于ctypes调用Linux inotify的目录事件源"""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                  IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify仅在Linux上可用")
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1失败")
+        self.watches = {}  # wd -> 目录路径
+        self.watched_dirs = {}  # 目录路径 -> wd
+
+    def add_watch(self, dir_path):
+        if dir_path in self.watched_dirs:
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"无法监视目录: {dir_path}")
+        self.watches[wd] = dir_path
+        self.watched_dirs[dir_path] = wd
+
+    def remove_tree(self, dir_path):
+        """移除某个目录及其子目录的监视"""
+        prefix = dir_path.rstrip(os.sep) + os.sep
+        for path in [p for p in self.watched_dirs if p == dir_path or p.startswith(prefix)]:
+            wd = self.watched_dirs.pop(path)
+            self.watches.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout):
+        """等待事件，返回 (需要重新列举的目录集合, 是否发生队列溢出)
+
+        目录本身被删除或移走时返回该目录（重新列举时发现已不存在即忘记整个目录树），
+        父目录如果也在监视中会收到自己的删除/移动事件。
+        """
+        dirty_dirs = set()
+        overflow = False
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return dirty_dirs, overflow
+
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+
+            offset = 0
+            while offset + self.EVENT_HEADER.size <= len(data):
+                wd, mask, _, name_len = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size + name_len
+
+                if mask & self.IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                dir_path = self.watches.get(wd)
+                if dir_path is None:
+                    continue
+                if mask & self.IN_IGNORED:
+                    # 目录已被删除或移走，内核自动移除了监视
+                    self.watches.pop(wd, None)
+                    self.watched_dirs.pop(dir_path, None)
+                dirty_dirs.add(dir_path)
+
+        return dirty_dirs, overflow
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class FolderWatcher:
+    """项目文件夹监视器
+
+    初始扫描一次项目文件夹，之后根据文件系统事件增量维护候选文件集合，
+    选择文件和判断是否有可用文件都只需访问内存中的集合。
+    Linux下使用inotify，其他平台或inotify不可用时定期轮询目录修改时间。
+    事件只用于标记“脏”目录，一批事件合并后每个脏目录只重新列举一次，
+    即使一次生成上万个文件也只需少量目录列举。
+    """
+
+    def __init__(self, folders, allowed_extensions, recursive, poll_interval=10.0,
+                 debounce=0.5, log_callback=None, rules=None):
+        self.folders = [os.path.normpath(folder) for folder in folders]
+        self._folder_keys = [path_key(folder) for folder in folders]
+        self.allowed_extensions = list(allowed_extensions)
+        self.recursive = recursive
+        self.rules = rules if rules is not None else ScanRules()
+        self.poll_interval = max(0.5, float(poll_interval))
+        self.debounce = max(0.0, float(debounce))
+        self.log_callback = log_callback
+
+        self.candidates = CandidateSet()
+        self.dir_mtimes = {}  # 已知目录 -> 修改时间（轮询模式使用）
+        self.dir_depths = {}  # 已知目录 -> 相对项目文件夹的深度
+        self.backend = None
+        self.backend_name = "polling"
+        self.stop_event = threading.Event()
+        self.ready = threading.Event()  # 初始扫描完成后置位，之前候选集合还不完整
+        self.thread = None
+        self.events_applied = 0  # 已处理的事件批次数
+        self.dirs_relisted = 0   # 因事件重新列举的目录数
+
+    def _log(self, message, extra_info=None):
+        if self.log_callback:
+            self.log_callback(message, extra_info)
+
+    def matches(self, folders, allowed_extensions, recursive, rules):
+        """判断监视器是否与当前的文件夹和过滤配置一致"""
+        return (self._folder_keys == [path_key(folder) for folder in folders] and
+                sorted(self.allowed_extensions) == sorted(allowed_extensions) and
+                self.recursive == recursive and
+                self.rules.signature == rules.signature)
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        """启动后台监视线程（初始扫描也在后台线程中进行，完成后ready置位）"""
+        try:
+            self.backend = InotifyBackend()
+            self.backend_name = "inotify"
+        except Exception:
+            self.backend = None
+            self.backend_name = "polling"
+
+        self.stop_event.clear()
+        self.ready.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _initial_scan(self):
+        scan_start = time.time()
+        for folder in self.folders:
+            if self.stop_event.is_set():
+                return
+            self._scan_tree(folder)
+        self.ready.set()
+        self._log("文件监视器启动", f"方式: {self.backend_name} | 目录: {len(self.dir_mtimes)} | 候选文件: {len(self.candidates)} | 初始扫描耗时: {time.time() - scan_start:.2f}秒")
+
+    def stop(self):
+        """停止监视线程"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        if self.backend:
+            self.backend.close()
+            self.backend = None
+
+    def _create_scanner(self):
+        return ScandirScanner(self.allowed_extensions, self.recursive, rules=self.rules)
+
+    def _watch_dir(self, dir_path, depth):
+        """记录目录修改时间，并在inotify模式下添加监视（失败时退回轮询模式）"""
+        try:
+            self.dir_mtimes[dir_path] = os.stat(dir_path).st_mtime
+            self.dir_depths[dir_path] = depth
+        except OSError:
+            self.dir_mtimes.pop(dir_path, None)
+            self.dir_depths.pop(dir_path, None)
+            return
+        if self.backend:
+            try:
+                self.backend.add_watch(dir_path)
+            except OSError as e:
+                self._log("文件监视器降级", f"无法继续使用inotify（{e}），改为轮询目录修改时间")
+                self.backend.close()
+                self.backend = None
+                self.backend_name = "polling"
+
+    def _scan_tree(self, root_dir, depth=0):
+        """扫描一个目录树，将候选文件加入集合并监视其中的目录"""
+        scanner = self._create_scanner()
+        pending_dirs = [(root_dir, depth)]
+        while pending_dirs:
+            dir_path, dir_depth = pending_dirs.pop()
+            self._watch_dir(dir_path, dir_depth)
+            for record in scanner.iter_directory(dir_path, scanner.stats, pending_dirs, depth=dir_depth):
+                self.candidates.add(record)
+
+    def _relist_dir(self, dir_path):
+        """重新列举一个目录，并与候选集合对齐（处理新建、删除、重命名和修改）"""
+        self.dirs_relisted += 1
+
+        if not os.path.isdir(dir_path):
+            # 目录本身已被删除或移走
+            self._forget_tree(dir_path)
+            return
+
+        depth = self.dir_depths.get(dir_path, 0)
+        scanner = self._create_scanner()
+        subdirs = []
+        present = set()
+        for record in scanner.iter_directory(dir_path, scanner.stats, subdirs, depth=depth):
+            present.add(record.path)
+            self.candidates.add(record)
+
+        for path in self.candidates.paths_in_dir(dir_path) - present:
+            self.candidates.discard(path)
+
+        self._watch_dir(dir_path, depth)
+
+        # 新出现的子目录需要完整扫描；消失的子目录需要清理
+        known_subdirs = {d for d in self.dir_mtimes if os.path.dirname(d) == dir_path}
+        current_subdirs = {subdir for subdir, _ in subdirs}
+        for subdir, subdir_depth in subdirs:
+            if subdir not in self.dir_mtimes:
+                self._scan_tree(subdir, subdir_depth)
+        for subdir in known_subdirs - current_subdirs:
+            self._forget_tree(subdir)
+
+    def _forget_tree(self, dir_path):
+        """忘记一个已不存在的目录树"""
+        self.candidates.discard_tree(dir_path)
+        prefix = dir_path.rstrip(os.sep) + os.sep
+        for known in [d for d in self.dir_mtimes if d == dir_path or d.startswith(prefix)]:
+            del self.dir_mtimes[known]
+            self.dir_depths.pop(known, None)
+        if self.backend:
+            self.backend.remove_tree(dir_path)
+
+    def _within_folders(self, dir_path):
+        """目录是否是某个项目文件夹或在其之下"""
+        dir_key = path_key(dir_path)
+        return any(dir_key == folder or dir_key.startswith(folder.rstrip(os.sep) + os.sep)
+                   for folder in self._folder_keys)
+
+    def _apply(self, dirty_dirs):
+        """应用一批合并后的变化（项目文件夹之外的目录从不重新列举）"""
+        # 父目录会被重新列举时，其下新出现的子目录会被完整扫描，无需单独处理
+        for dir_path in sorted(dirty_dirs, key=len):
+            if self.stop_event.is_set():
+                return
+            if self._within_folders(dir_path):
+                self._relist_dir(dir_path)
+        self.events_applied += 1
+
+    def _poll_dirty_dirs(self):
+        """轮询模式：比较目录修改时间找出发生变化的目录"""
+        dirty_dirs = set()
+        for dir_path, old_mtime in list(self.dir_mtimes.items()):
+            try:
+                if os.stat(dir_path).st_mtime != old_mtime:
+                    dirty_dirs.add(dir_path)
+            except OSError:
+                dirty_dirs.add(os.path.dirname(dir_path) if dir_path not in self.folders else dir_path)
+        return dirty_dirs
+
+    def _run(self):
+        try:
+            self._initial_scan()
+        except Exception as e:
+            if not self.stop_event.is_set():
+                self._log("文件监视器错误", f"初始扫描失败: {str(e)}，将使用索引或直接扫描")
+            return
+        while not self.stop_event.is_set():
+            try:
+                if self.backend:
+                    dirty_dirs, overflow = self.backend.read_events(timeout=1.0)
+                    if not dirty_dirs and not overflow:
+                        continue
+                    # 合并突发事件：持续收集直到安静debounce秒（最多5秒）
+                    burst_deadline = time.time() + 5.0
+                    while time.time() < burst_deadline and not self.stop_event.is_set():
+                        more_dirs, more_overflow = self.backend.read_events(timeout=self.debounce)
+                        if not more_dirs and not more_overflow:
+                            break
+                        dirty_dirs |= more_dirs
+                        overflow = overflow or more_overflow
+                    if overflow:
+                        # 事件队列溢出，无法确定变化范围，重新检查所有已知目录
+                        self._log("文件监视器", "inotify事件队列溢出，重新检查所有目录")
+                        dirty_dirs = set(self.dir_mtimes) | set(self.folders)
+                    self._apply(dirty_dirs)
+                else:
+                    if self.stop_event.wait(self.poll_interval):
+                        break
+                    dirty_dirs = self._poll_dirty_dirs()
+                    if dirty_dirs:
+                        self._apply(dirty_dirs)
+            except Exception as e:
+                self._log("文件监视器错误", f"错误: {str(e)}")
+                self.stop_event.wait(self.poll_interval)
+
+
+AppMatch = collections.namedtuple('AppMatch', ['category', 'app_type', 'display_name', 'pattern'])
+
+
+class AppRegistry:
+    """应用程序注册表：软件识别模式、排除模式、自身保护关键词、文档编辑器和扩展名 -> 程序映射
+
+    内置默认值可以通过配置追加或覆盖。每一类模式编译为一个不区分大小写的正则表达式，
+    一次调用即可完成窗口标题分类，结果按标题缓存。
+    """
+
+    DEFAULT_APPS = collections.OrderedDict([
+        ('word', {'name': 'Microsoft Word', 'patterns': ['microsoft word', 'word', 'winword']}),
+        ('excel', {'name': 'Microsoft Excel', 'patterns': ['microsoft excel', 'excel']}),
+        ('powerpoint', {'name': 'Microsoft PowerPoint', 'patterns': ['microsoft powerpoint', 'powerpoint']}),
+        ('wps_writer', {'name': 'WPS 文字', 'patterns': ['wps writer', 'wps 文字', 'wps文字']}),
+        ('wps_spreadsheet', {'name': 'WPS 表格', 'patterns': ['wps spreadsheets', 'wps 表格', 'wps表格']}),
+        ('wps_presentation', {'name': 'WPS 演示', 'patterns': ['wps presentation', 'wps 演示', 'wps演示']}),
+        ('notepad', {'name': '记事本', 'patterns': ['notepad.exe', '记事本']}),
+        ('notepadpp', {'name': 'Notepad++', 'patterns': ['notepad++']}),
+        ('sublime', {'name': 'Sublime Text', 'patterns': ['sublime text']}),
+        ('vscode', {'name': 'Visual Studio Code', 'patterns': ['visual studio code', 'vscode']}),
+        ('pycharm', {'name': 'PyCharm', 'patterns': ['pycharm']}),
+        ('adobe_acrobat', {'name': 'Adobe Acrobat', 'patterns': ['adobe acrobat', 'acrobat']}),
+        ('foxit', {'name': 'Foxit Reader', 'patterns': ['foxit reader', '福昕']}),
+        ('chrome', {'name': 'Google Chrome', 'patterns': ['google chrome']}),
+        ('edge', {'name': 'Microsoft Edge', 'patterns': ['microsoft edge']}),
+    ])
+
+    # 不应关闭的软件（避免关闭开发环境和系统工具）
+    DEFAULT_EXCLUDED_PATTERNS = [
+        'activity_tracker', 'worktrace mocker', 'worktracemocker', 'python', 'pythonw',
+        'cmd.exe', 'powershell', 'explorer.exe', 'taskmgr.exe', 'pyinstaller', '.exe - python'
+    ]
+
+    # 可能是自身程序的关键词
+    DEFAULT_SELF_PROTECTION_KEYWORDS = ['活动痕迹', '自动活动', 'activity tracker', 'trace mocker']
+
+    # 批量保存时视为文档编辑器的窗口
+    DEFAULT_DOCUMENT_APPS = [
+        "notepad", "记事本", "wordpad", "写字板",
+        "microsoft word", "word", "excel", "powerpoint",
+        "wps", "金山", "sublime", "atom", "brackets",
+        "adobe", "pdf", "foxit", "福昕", "visual studio code",
+        "pycharm", "intellij", "eclipse", "dev-c++"
+    ]
+
+    # 文档类型到程序的映射
+    DEFAULT_EXTENSION_PROGRAMS = {
+        '.txt': ['记事本', 'Notepad', 'Sublime Text', 'VS Code'],
+        '.docx': ['Microsoft Word', 'WPS Writer', 'WPS 文字'],
+        '.doc': ['Microsoft Word', 'WPS Writer', 'WPS 文字'],
+        '.pdf': ['Adobe Acrobat', 'Foxit Reader', '福昕', 'Microsoft Edge'],
+        '.wps': ['WPS Writer', 'WPS 文字'],
+        '.py': ['VS Code', 'PyCharm', 'IDLE', 'Sublime Text'],
+        '.java': ['IntelliJ IDEA', 'Eclipse', 'VS Code'],
+        '.cpp': ['VS Code', 'Dev-C++', 'Code::Blocks'],
+        '.html': ['VS Code', 'Sublime Text', 'Chrome', 'Edge'],
+        '.js': ['VS Code', 'Sublime Text', 'WebStorm'],
+        '.md': ['VS Code', 'Typora', 'MarkdownPad'],
+        '.xlsx': ['Microsoft Excel', 'WPS 表格'],
+        '.xls': ['Microsoft Excel', 'WPS 表格'],
+        '.pptx': ['Microsoft PowerPoint', 'WPS 演示'],
+        '.ppt': ['Microsoft PowerPoint', 'WPS 演示']
+    }
+
+    MEMO_LIMIT = 4096  # 标题分类缓存的最大条目数
+
+    def __init__(self, apps=None, excluded_patterns=(), self_protection_keywords=(), document_apps=(),
+                 extension_programs=None, self_names=()):
+        # 配置中的软件追加到内置软件之后，同名软件覆盖内置定义
+        self.apps = collections.OrderedDict((k, dict(v)) for k, v in self.DEFAULT_APPS.items())
+        for app_type, app in (apps or {}).items():
+            merged = dict(self.apps.get(app_type, {}))
+            merged.update(app)
+            merged.setdefault('name', app_type)
+            merged.setdefault('patterns', [])
+            self.apps[app_type] = merged
+
+        self.extension_programs = {ext: list(programs) for ext, programs in self.DEFAULT_EXTENSION_PROGRAMS.items()}
+        for ext, programs in (extension_programs or {}).items():
+            self.extension_programs[ext.lower()] = list(programs)
+
+        # 模式 -> 优先级/软件类型（同一位置按优先级选择，保持原来按软件顺序匹配的结果）
+        self._app_patterns = {}
+        for app_type, app in self.apps.items():
+            for pattern in app['patterns']:
+                self._app_patterns.setdefault(pattern.lower(), (len(self._app_patterns), app_type))
+        self._app_regex = self._compile_all_positions(sorted(self._app_patterns, key=lambda p: self._app_patterns[p][0]))
+
+        self._excluded_regex = self._compile(list(self.DEFAULT_EXCLUDED_PATTERNS) + list(excluded_patterns))
+        self._self_regex = self._compile(list(self.DEFAULT_SELF_PROTECTION_KEYWORDS) + list(self_protection_keywords) +
+                                         [name for name in self_names if name])
+        self._document_regex = self._compile(list(self.DEFAULT_DOCUMENT_APPS) + list(document_apps))
+        self._memo = {}
+
+    @staticmethod
+    def _compile(patterns):
+        """把一组子串编译为一个不区分大小写的正则表达式（长的模式优先）"""
+        patterns = sorted({p.lower() for p in patterns if p}, key=len, reverse=True)
+        if not patterns:
+            return None
+        return re.compile('|'.join(re.escape(p) for p in patterns), re.IGNORECASE)
+
+    @staticmethod
+    def _compile_all_positions(patterns):
+        """编译为零宽前瞻形式，可以找出每个位置上优先级最高的匹配"""
+        if not patterns:
+            return None
+        return re.compile('(?=(' + '|'.join(re.escape(p) for p in patterns) + '))', re.IGNORECASE)
+
+    def classify(self, title):
+        """对窗口标题分类，返回AppMatch
+
+        category: excluded（不应关闭）/ self（自身程序）/ app（已知软件）/ None（未识别）
+        """
+        memo = self._memo.get(title)
+        if memo is not None:
+            return memo
+
+        result = AppMatch(None, None, None, None)
+        match = self._excluded_regex.search(title) if self._excluded_regex else None
+        if match:
+            result = AppMatch('excluded', None, None, match.group(0).lower())
+        else:
+            match = self._self_regex.search(title) if self._self_regex else None
+            if match:
+                result = AppMatch('self', None, None, match.group(0).lower())
+            elif self._app_regex is not None:
+                best = None
+                for found in self._app_regex.finditer(title):
+                    candidate = self._app_patterns[found.group(1).lower()]
+                    if best is None or candidate[0] < best[0]:
+                        best = candidate + (found.group(1).lower(),)
+                if best is not None:
+                    app_type = best[1]
+                    result = AppMatch('app', app_type, self.apps[app_type]['name'], best[2])
+
+        if len(self._memo) >= self.MEMO_LIMIT:
+            self._memo.clear()
+        self._memo[title] = result
+        return result
+
+    def is_document_window(self, title):
+        """窗口标题是否属于文档编辑器"""
+        return bool(self._document_regex and self._document_regex.search(title))
+
+    def display_name(self, app_type):
+        app = self.apps.get(app_type)
+        return app['name'] if app else None
+
+    def programs_for_extension(self, ext):
+        return self.extension_programs.get(ext.lower(), [])
+
+
+WindowInfo = collections.namedtuple('WindowInfo', ['handle', 'title', 'title_lower', 'pid', 'class_name', 'window'])
+
+
+class PyautoguiWindowBackend:
+    """基于pyautogui的窗口后端：枚举窗口、激活窗口和发送快捷键
+
+    进程ID和窗口类名需要pywin32，不可用时为None。
+    """
+
+    name = "pyautogui"
+
+    def __init__(self):
+        self.available = PYAUTOGUI_AVAILABLE
+        try:
+            import win32gui
+            import win32process
+            self._win32gui = win32gui
+            self._win32process = win32process
+        except Exception:
+            self._win32gui = None
+            self._win32process = None
+
+    def list_windows(self):
+        """枚举当前所有窗口"""
+        windows = []
+        for window in pyautogui.getAllWindows():
+            title = window.title or ""
+            handle = getattr(window, '_hWnd', None)
+            pid = None
+            class_name = None
+            if handle is not None and self._win32gui is not None:
+                try:
+                    pid = self._win32process.GetWindowThreadProcessId(handle)[1]
+                    class_name = self._win32gui.GetClassName(handle)
+                except Exception:
+                    pass
+            windows.append(WindowInfo(handle, title, title.lower(), pid, class_name, window))
+        return windows
+
+    def activate(self, window):
+        window.activate()
+
+    def hotkey(self, *keys):
+        pyautogui.hotkey(*keys)
+
+    def open_file(self, path):
+        """使用系统默认程序打开文件，能获取到启动的进程时返回其进程ID"""
+        if sys.platform.startswith('win32'):
+            os.startfile(path)
+            return None
+        elif sys.platform.startswith('darwin'):
+            return subprocess.Popen(['open', path]).pid
+        else:
+            return subprocess.Popen(['xdg-open', path]).pid
+
+
+class FakeWindow:
+    """模拟窗口（供FakeWindowBackend使用）"""
+
+    def __init__(self, backend, handle, title, pid, path=None):
+        self.backend = backend
+        self._hWnd = handle
+        self.title = title
+        self.pid = pid
+        self.path = path
+
+    def activate(self):
+        self.backend.activate(self)
+
+
+class FakeWindowBackend:
+    """模拟窗口后端：在内存中模拟打开文件、窗口、激活和快捷键，便于在Linux等无图形界面的环境中测试
+
+    打开文件时创建一个标题为"文件名 - 编辑器名"的窗口；Ctrl+S记录保存（touch_on_save为True时
+    同时更新文件的修改时间，模拟编辑器写入文件），Alt+F4/Ctrl+Q关闭当前激活的窗口，
+    Ctrl+W同样关闭（每个窗口只有一个文档）。
+    """
+
+    name = "fake"
+
+    def __init__(self, editor_name="FakeEditor", touch_on_save=False):
+        self.available = True
+        self.editor_name = editor_name
+        self.touch_on_save = touch_on_save
+        self.lock = threading.Lock()
+        self.windows = []
+        self.active = None
+        self.actions = []   # (动作, 窗口标题) 记录，便于检查
+        self.saved = collections.Counter()  # 窗口句柄 -> 保存次数
+        self._next_handle = 1000
+        self._next_pid = 5000
+
+    def add_window(self, title, pid=None, path=None):
+        """添加一个窗口（不指定path时模拟与打开文件无关的其他程序）"""
+        with self.lock:
+            self._next_handle += 1
+            if pid is None:
+                self._next_pid += 1
+                pid = self._next_pid
+            window = FakeWindow(self, self._next_handle, title, pid, path)
+            self.windows.append(window)
+            return window
+
+    def open_file(self, path):
+        window = self.add_window(f"{os.path.basename(path)} - {self.editor_name}", path=path)
+        self.actions.append(('open', window.title))
+        return window.pid
+
+    def list_windows(self):
+        with self.lock:
+            return [WindowInfo(w._hWnd, w.title, w.title.lower(), w.pid, self.editor_name, w) for w in self.windows]
+
+    def activate(self, window):
+        with self.lock:
+            if window not in self.windows:
+                raise RuntimeError("窗口已关闭")
+            self.active = window
+            self.actions.append(('activate', window.title))
+
+    def hotkey(self, *keys):
+        with self.lock:
+            window = self.active
+            self.actions.append(('+'.join(keys), window.title if window else None))
+            if window is None:
+                return
+            if keys == ('ctrl', 's'):
+                self.saved[window._hWnd] += 1
+                if self.touch_on_save and window.path and os.path.exists(window.path):
+                    os.utime(window.path)
+            elif keys in (('alt', 'f4'), ('ctrl', 'q'), ('ctrl', 'w')):
+                if window in self.windows:
+                    self.windows.remove(window)
+                self.active = None
+
+
+class WindowInventory:
+    """窗口清单：一次枚举得到所有窗口的快照，在有效期内为所有查询服务
+
+    会改变窗口的操作（打开文件、发送关闭/保存快捷键）之后需要调用invalidate()，
+    下一次查询时重新枚举。统计枚举次数和耗时，便于观察减少了多少次枚举。
+    """
+
+    def __init__(self, backend, ttl=1.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self._snapshot = None
+        self._handles = frozenset()
+        self._taken_at = 0.0
+        self.enumerations = 0       # 实际枚举窗口的次数
+        self.enumeration_time = 0.0 # 枚举窗口花费的总时间（秒）
+        self.lookups = 0            # 查询次数
+        self.cache_hits = 0         # 直接使用快照的查询次数
+
+    def invalidate(self):
+        """使快照失效，下一次查询时重新枚举"""
+        with self.lock:
+            self._snapshot = None
+
+    def snapshot(self, max_age=None):
+        """获取窗口快照（有效期内直接复用，max_age可以临时缩短有效期，0表示强制重新枚举）"""
+        ttl = self.ttl if max_age is None else min(self.ttl, max_age)
+        with self.lock:
+            self.lookups += 1
+            if self._snapshot is not None and ttl > 0 and time.time() - self._taken_at <= ttl:
+                self.cache_hits += 1
+                return self._snapshot
+
+            start = time.time()
+            try:
+                windows = self.backend.list_windows()
+            finally:
+                self.enumerations += 1
+                self.enumeration_time += time.time() - start
+            self._snapshot = windows
+            self._handles = frozenset(info.handle for info in windows if info.handle is not None)
+            self._taken_at = time.time()
+            return windows
+
+    def find(self, text_lower):
+        """查找标题（小写）中包含指定文本的窗口"""
+        return [info for info in self.snapshot() if text_lower in info.title_lower]
+
+    def contains(self, window, max_age=None):
+        """判断窗口是否仍然存在（优先按窗口句柄比较）"""
+        windows = self.snapshot(max_age)
+        handle = getattr(window, '_hWnd', None)
+        if handle is not None:
+            return handle in self._handles
+        return any(info.window == window for info in windows)
+
+    def summary(self):
+        return (f"枚举次数: {self.enumerations} | 枚举耗时: {self.enumeration_time:.2f}秒 | "
+                f"查询次数: {self.lookups} | 复用快照: {self.cache_hits}")
+
+
+class LaunchRecord:
+    """一次打开文件操作与其窗口、进程的绑定关系"""
+
+    def __init__(self, path, opened_at, handles, pids, spawned_pid=None):
+        self.path = path
+        self.opened_at = opened_at
+        self.handles = set(handles)   # 绑定的窗口句柄
+        self.pids = set(pids)         # 绑定的进程ID（包括启动的进程及其子进程）
+        self.spawned_pid = spawned_pid
+
+
+class LaunchRegistry:
+    """记录每次打开文件后出现的窗口和进程
+
+    打开文件前后各取一次窗口快照，属于启动进程树或标题包含完整文件名的新窗口绑定到该文件；
+    没有这样的新窗口时（例如在已打开的编辑器中新建标签页），绑定标题发生变化且包含完整文件名的窗口。
+    与文件无关的窗口（例如同时弹出的其他程序窗口）不会被绑定，避免之后被误关闭。
+    保存和关闭时直接使用绑定的窗口句柄，找不到时才退回到按标题匹配。
+    """
+
+    def __init__(self, max_records=200):
+        self.lock = threading.Lock()
+        self.max_records = max_records
+        self._records = collections.OrderedDict()  # 路径 -> LaunchRecord
+        self.bound = 0     # 成功绑定到窗口的次数
+        self.unbound = 0   # 没有找到对应窗口的次数
+
+    @staticmethod
+    def descendant_pids(pid):
+        """获取进程及其所有子进程的ID（需要psutil，不可用时只返回进程本身）"""
+        if pid is None:
+            return set()
+        pids = {pid}
+        if psutil is not None:
+            try:
+                pids.update(child.pid for child in psutil.Process(pid).children(recursive=True))
+            except Exception:
+                pass
+        return pids
+
+    @staticmethod
+    def match_launched(path, before, after, process_tree):
+        """根据打开前后的窗口快照找出打开文件后出现的窗口（只按完整文件名或启动进程树匹配）"""
+        name_lower = os.path.basename(path).lower()
+
+        def mentions_file(info):
+            return name_lower in info.title_lower
+
+        before_titles = {info.handle: info.title for info in before if info.handle is not None}
+        new_windows = [info for info in after if info.handle is not None and info.handle not in before_titles]
+
+        candidates = [info for info in new_windows if info.pid in process_tree or mentions_file(info)]
+        if not candidates:
+            # 文件在已打开的程序中打开：标题变化且包含文件名的窗口
+            candidates = [info for info in after if info.handle in before_titles and
+                          info.title != before_titles[info.handle] and mentions_file(info)]
+        return candidates
+
+    def bind(self, path, before, after, spawned_pid=None):
+        """根据打开前后的窗口快照把新窗口绑定到文件，返回LaunchRecord"""
+        process_tree = self.descendant_pids(spawned_pid)
+        candidates = self.match_launched(path, before, after, process_tree)
+
+        record = LaunchRecord(path, time.time(),
+                              (info.handle for info in candidates),
+                              {info.pid for info in candidates if info.pid is not None} | process_tree,
+                              spawned_pid)
+        with self.lock:
+            self._records.pop(path, None)
+            self._records[path] = record
+            while len(self._records) > self.max_records:
+                self._records.popitem(last=False)
+            if record.handles:
+                self.bound += 1
+            else:
+                self.unbound += 1
+        return record
+
+    def get(self, path):
+        with self.lock:
+            return self._records.get(path)
+
+    def forget(self, path):
+        with self.lock:
+            self._records.pop(path, None)
+
+    def windows_for(self, path, snapshot):
+        """在窗口快照中找出仍然存在的、绑定到该文件的窗口"""
+        record = self.get(path)
+        if record is None or not record.handles:
+            return []
+        return [info for info in snapshot if info.handle in record.handles]
+
+
+class OpenWaiter:
+    """文件打开就绪等待器：以指数退避轮询窗口清单，出现对应窗口后立即返回
+
+    就绪条件与LaunchRegistry绑定窗口的条件相同：出现属于启动进程树或标题包含完整文件名的新窗口，
+    或者已有窗口的标题变为包含完整文件名。超时时间按扩展名配置，并记录每种扩展名实际的打开耗时：
+    近期实际耗时较长的扩展名（例如冷启动的Office）会自动放宽超时上限，文本编辑器则不受影响。
+    无法枚举窗口时（后端不可用、枚举出错或打开前后都没有任何窗口）不再等满超时，
+    而是固定等待FALLBACK_DELAY秒。
+    """
+
+    FALLBACK_DELAY = 2.0 # 无法枚举窗口时的固定等待（秒）
+    POLL_INITIAL = 0.1   # 第一次轮询间隔（秒）
+    POLL_MAX = 1.0       # 最大轮询间隔（秒）
+    MAX_TIMEOUT = 120.0  # 自动放宽后的超时上限（秒）
+    HISTORY = 20         # 每种扩展名保留的耗时记录数
+
+    def __init__(self, inventory, default_timeout=10.0, timeouts=None, settle_delay=0.5,
+                 sleep=time.sleep, clock=time.monotonic):
+        self.inventory = inventory
+        self.default_timeout = default_timeout
+        self.timeouts = {ext.lower(): value for ext, value in (timeouts or {}).items()}
+        self.settle_delay = settle_delay
+        self.sleep = sleep
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.latencies = collections.defaultdict(lambda: collections.deque(maxlen=self.HISTORY))
+        self.timeouts_hit = collections.Counter()  # 扩展名 -> 等待超时次数
+        self.fallbacks = 0  # 因无法枚举窗口而固定等待的次数
+
+    def timeout_for(self, ext):
+        """获取扩展名的等待上限：配置值与近期最大耗时的两倍取较大者"""
+        configured = self.timeouts.get(ext, self.default_timeout)
+        with self.lock:
+            observed = max(self.latencies[ext]) if self.latencies.get(ext) else 0.0
+        return min(max(configured, observed * 2), self.MAX_TIMEOUT)
+
+    def fallback_wait(self):
+        """无法枚举窗口时固定等待一段时间，返回等待的秒数"""
+        with self.lock:
+            self.fallbacks += 1
+        self.sleep(self.FALLBACK_DELAY)
+        return self.FALLBACK_DELAY
+
+    def wait(self, path, before, spawned_pid=None):
+        """等待文件对应的窗口出现，返回 (是否就绪, 耗时秒数)；无法枚举窗口时固定等待并返回 (None, 秒数)"""
+        if not getattr(self.inventory.backend, 'available', True):
+            return None, self.fallback_wait()
+
+        ext = os.path.splitext(path)[1].lower()
+        timeout = self.timeout_for(ext)
+        started = self.clock()
+        deadline = started + timeout
+        interval = self.POLL_INITIAL
+        ready = False
+        while True:
+            try:
+                after = self.inventory.snapshot(max_age=0)
+            except Exception:
+                return None, self.fallback_wait()
+            if not before and not after:
+                # 打开文件前后都没有任何窗口：当前环境无法枚举窗口
+                return None, self.fallback_wait()
+            process_tree = LaunchRegistry.descendant_pids(spawned_pid)
+            if LaunchRegistry.match_launched(path, before, after, process_tree):
+                ready = True
+                break
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                break
+            self.sleep(min(interval, remaining))
+            interval = min(interval * 2, self.POLL_MAX)
+
+        elapsed = self.clock() - started
+        with self.lock:
+            if ready:
+                self.latencies[ext].append(elapsed)
+            else:
+                self.timeouts_hit[ext] += 1
+        if ready and self.settle_delay > 0:
+            # 窗口刚出现时可能还在加载文档，稍等片刻再接收按键
+            self.sleep(self.settle_delay)
+        return ready, elapsed
+
+    def summary(self):
+        """按扩展名汇总打开耗时（次数、平均、最大）"""
+        with self.lock:
+            parts = []
+            for ext in sorted(set(self.latencies) | set(self.timeouts_hit)):
+                samples = self.latencies.get(ext) or ()
+                text = f"{ext or '(无扩展名)'}: {len(samples)}次"
+                if samples:
+                    text += f" 平均{sum(samples) / len(samples):.2f}秒 最大{max(samples):.2f}秒"
+                if self.timeouts_hit[ext]:
+                    text += f" 超时{self.timeouts_hit[ext]}次"
+                parts.append(text)
+        return " | ".join(parts) if parts else "暂无记录"
+
+
+class SaveVerifier:
+    """保存验证器：发送Ctrl+S后确认保存是否真正写入了文件
+
+    比较保存前后文件的修改时间和大小；可选地检查编辑器标题中的未保存标记
+    （如"*a.txt - 记事本"、"● a.py"），在期限内轮询，结果分为三类：
+    verified（文件已写入或未保存标记已消失）、unchanged（文件没有变化，通常是文档本来就没有修改）、
+    failed（文件已不存在、窗口已消失或期限内未保存标记仍在）。
+    保存前标题没有未保存标记时编辑器通常不会写入，只等待很短的unchanged_grace，
+    完整的期限只留给带未保存标记或无法判断标题的情况。
+    """
+
+    VERIFIED = "verified"
+    UNCHANGED = "unchanged"
+    FAILED = "failed"
+
+    DIRTY_MARKERS = ('*', '●', '•')
+    POLL_INITIAL = 0.1  # 第一次轮询间隔（秒）
+    POLL_MAX = 0.5      # 最大轮询间隔（秒）
+    UNCHANGED_GRACE = 0.5  # 标题没有未保存标记时等待文件写入的时间（秒）
+
+    def __init__(self, inventory, timeout=5.0, check_dirty_marker=True, sleep=time.sleep, clock=time.monotonic,
+                 unchanged_grace=UNCHANGED_GRACE):
+        self.inventory = inventory
+        self.timeout = timeout
+        self.check_dirty_marker = check_dirty_marker
+        self.unchanged_grace = unchanged_grace
+        self.sleep = sleep
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.counts = collections.Counter()  # 结果 -> 次数
+        self.verified_times = collections.deque()  # 最近一小时内验证成功的时间（time.time()）
+        self.started_at = time.time()
+
+    @staticmethod
+    def file_state(path):
+        """获取文件状态 (修改时间纳秒, 大小)，文件不存在时返回None"""
+        try:
+            file_stat = os.stat(path)
+        except OSError:
+            return None
+        return file_stat.st_mtime_ns, file_stat.st_size
+
+    @classmethod
+    def is_dirty(cls, title):
+        """判断窗口标题是否带有未保存标记"""
+        title = (title or "").strip()
+        return any(title.startswith(marker) or title.endswith(marker) or f"{marker} -" in title
+                   for marker in cls.DIRTY_MARKERS)
+
+    def _current_title(self, handle):
+        """重新枚举窗口获取指定句柄的标题，窗口已消失时返回None"""
+        for info in self.inventory.snapshot(max_age=0):
+            if info.handle == handle:
+                return info.title
+        return None
+
+    def verify(self, path, before_state, handle=None, title_before=None):
+        """等待并判断保存结果，返回 (结果, 文件新状态, 耗时秒数)"""
+        watch_title = self.check_dirty_marker and handle is not None
+        was_dirty = watch_title and self.is_dirty(title_before)
+        started = self.clock()
+        # 标题本来就没有未保存标记时，文件不变就是预期结果，不必等满整个期限
+        wait = min(self.timeout, self.unchanged_grace) if watch_title and not was_dirty else self.timeout
+        deadline = started + wait
+        interval = self.POLL_INITIAL
+        outcome, state = None, before_state
+        while outcome is None:
+            state = self.file_state(path)
+            title = self._current_title(handle) if watch_title else None
+            if state is None:
+                outcome = self.FAILED
+            elif before_state is not None and state != before_state:
+                outcome = self.VERIFIED
+            elif was_dirty and title is not None and not self.is_dirty(title):
+                outcome = self.VERIFIED
+            elif watch_title and title is None:
+                outcome = self.FAILED  # 窗口已消失但文件没有变化
+            else:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    outcome = self.FAILED if was_dirty else self.UNCHANGED
+                else:
+                    self.sleep(min(interval, remaining))
+                    interval = min(interval * 2, self.POLL_MAX)
+
+        elapsed = self.clock() - started
+        now = time.time()
+        with self.lock:
+            self.counts[outcome] += 1
+            if outcome == self.VERIFIED:
+                self.verified_times.append(now)
+            while self.verified_times and self.verified_times[0] < now - 3600:
+                self.verified_times.popleft()
+        return outcome, state, elapsed
+
+    def traces_per_hour(self, now=None):
+        """有效痕迹产出率：(最近一小时验证成功次数, 本次运行平均每小时验证成功次数)"""
+        now = time.time() if now is None else now
+        with self.lock:
+            recent = sum(1 for saved_at in self.verified_times if saved_at >= now - 3600)
+            hours = max((now - self.started_at) / 3600, 1 / 60)
+            return recent, self.counts[self.VERIFIED] / hours
+
+    def summary(self):
+        recent, average = self.traces_per_hour()
+        return (f"已验证 {self.counts[self.VERIFIED]} 次 | 文件未变化 {self.counts[self.UNCHANGED]} 次 | "
+                f"失败 {self.counts[self.FAILED]} 次 | 最近一小时有效痕迹 {recent} 次 | 平均 {average:.1f} 次/小时")
+
+
+class CloseEngine:
+    """程序关闭引擎：发送关闭快捷键后以指数退避轮询窗口清单，窗口消失后立即处理下一个
+
+    每种关闭方式的等待时间是上限而不是固定的睡眠时间。等待确认期间顺便检查后续目标，
+    已经随之关闭的窗口（例如同一程序的其他窗口）直接跳过，确认后立即激活下一个目标。
+    """
+
+    POLL_INITIAL = 0.05  # 第一次轮询间隔（秒）
+    POLL_MAX = 0.5       # 最大轮询间隔（秒）
+
+    def __init__(self, backend, inventory, strategies, activation_delay=0.5, verification_timeout=1.5,
+                 close_timeout=3.0, sleep=time.sleep, clock=time.monotonic):
+        self.backend = backend
+        self.inventory = inventory
+        self.strategies = list(strategies)  # [快捷键元组, ...]，按顺序尝试
+        self.activation_delay = activation_delay
+        self.verification_timeout = verification_timeout
+        self.close_timeout = close_timeout
+        self.sleep = sleep
+        self.clock = clock
+        self.polls = 0
+
+    def _alive(self, window):
+        return self.inventory.contains(window, max_age=0)
+
+    def wait_until_gone(self, window, timeout, upcoming=None):
+        """等待窗口消失，最多等待timeout秒；等待期间剔除upcoming中已经消失的目标"""
+        deadline = self.clock() + timeout
+        interval = self.POLL_INITIAL
+        while True:
+            self.polls += 1
+            if not self._alive(window):
+                return True
+            if upcoming:
+                # 复用刚取得的快照检查后续目标，不额外枚举窗口
+                upcoming[:] = [target for target in upcoming if self.inventory.contains(target['window'])]
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return False
+            self.sleep(min(interval, remaining))
+            interval = min(interval * 2, self.POLL_MAX)
+
+    def close_window(self, window, upcoming=None):
+        """关闭单个窗口，返回 (是否确认关闭, 生效的快捷键)"""
+        self.backend.activate(window)
+        if self.activation_delay > 0:
+            self.sleep(self.activation_delay)
+
+        for position, keys in enumerate(self.strategies):
+            self.backend.hotkey(*keys)
+            self.inventory.invalidate()
+            timeout = self.verification_timeout if position == 0 else self.close_timeout
+            if self.wait_until_gone(window, timeout, upcoming):
+                return True, '+'.join(keys)
+        return not self._alive(window), None
+
+    def close_all(self, targets, on_start=None, on_done=None):
+        """依次关闭所有目标窗口
+
+        Args:
+            targets (list): 程序信息字典列表（包含 'name' 和 'window'）
+            on_start (callable): 开始关闭某个目标时的回调 on_start(target)
+            on_done (callable): 某个目标处理完成时的回调 on_done(target, closed, keys, elapsed, error)
+        """
+        upcoming = list(targets)
+        results = []
+        while upcoming:
+            target = upcoming.pop(0)
+            window = target['window']
+            started = self.clock()
+            closed, keys, error = False, None, None
+            try:
+                if not self._alive(window):
+                    # 窗口已随之前的目标一起关闭
+                    closed, keys = True, 'already_closed'
+                else:
+                    if on_start:
+                        on_start(target)
+                    closed, keys = self.close_window(window, upcoming)
+            except Exception as e:
+                error = e
+            elapsed = self.clock() - started
+            results.append((target, closed, keys, elapsed, error))
+            if on_done:
+                on_done(target, closed, keys, elapsed, error)
+        return results
+
+
+class SystemClock:
+    """真实时钟：工作线程通过时钟对象获取当前时间、睡眠和等待事件，便于替换为虚拟时钟"""
+
+    def now(self):
+        return datetime.datetime.now()
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, event, timeout=None):
+        """等待事件被设置或超时，返回事件是否已被设置"""
+        return event.wait(timeout)
+
+
+class VirtualClock:
+    """虚拟时钟：睡眠和等待不真正阻塞，而是直接把时间拨到截止时间
+
+    配合假的窗口后端可以在几秒内完整运行一个月的工作流程（打开、保存、午休、下班关闭），
+    用于性能测试和排程逻辑的回归测试。只应在单个工作线程中使用。
+    到达stop_at时设置stop_event（通常是任务的取消事件），工作线程随之正常退出。
+    """
+
+    IDLE_STEP = 3600  # 没有截止时间的等待每次前进的秒数
+
+    def __init__(self, start, stop_at=None, stop_event=None):
+        self._now = start
+        self.stop_at = stop_at
+        self.stop_event = stop_event
+        self.advanced = 0.0  # 累计前进的秒数
+        self.waits = 0       # 睡眠和等待的次数
+
+    def now(self):
+        return self._now
+
+    def time(self):
+        return self._now.timestamp()
+
+    def monotonic(self):
+        return self._now.timestamp()
+
+    def advance(self, seconds):
+        """把时间向前拨动指定秒数（不超过stop_at，到达时设置stop_event）"""
+        target = self._now + datetime.timedelta(seconds=max(0.0, seconds))
+        if self.stop_at is not None and target >= self.stop_at:
+            target = max(self._now, self.stop_at)
+            if self.stop_event is not None:
+                self.stop_event.set()
+        self.advanced += (target - self._now).total_seconds()
+        self._now = target
+
+    def sleep(self, seconds):
+        self.waits += 1
+        self.advance(seconds)
+
+    def wait(self, event, timeout=None):
+        """虚拟时间中没有其他线程能设置事件，未设置时直接前进到超时时间"""
+        self.waits += 1
+        if event.is_set():
+            return True
+        self.advance(self.IDLE_STEP if timeout is None else timeout)
+        return event.is_set()
+
+
+# 调度事件：类型、计划时间（datetime）、附加数据
+ScheduledEvent = collections.namedtuple('ScheduledEvent', ['kind', 'when', 'payload'])
+
+
+class EventScheduler:
+    """基于最小堆的截止时间调度器
+
+    每种事件（打开文件、保存、午休开始/结束、工作结束）同时最多只有一个待执行实例，
+    重新安排时旧的实例被惰性删除。工作线程只需等待到最近的截止时间，空闲时不再每秒轮询。
+    多个事件同时到期时按优先级执行：工作结束 > 午休开始 > 保存 > 午休结束 > 打开文件，
+    保存不会因为同时到期的打开操作而被推迟。每个事件执行时记录实际时间与计划时间的差（超时）。
+    """
+
+    PRIORITY = {'work_end': 0, 'lunch_start': 1, 'save': 2, 'lunch_end': 3, 'open': 4}
+    MAX_WAIT = 60  # 单次等待的最长秒数：醒来后按当前时间重新计算，应对系统时间跳变和睡眠唤醒
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._heap = []      # (截止时间戳, 序号, 事件)
+        self._pending = {}   # 事件类型 -> 当前有效的序号
+        self._seq = 0
+        self.overruns = collections.defaultdict(list)  # 事件类型 -> [超时秒数]
+
+    def __len__(self):
+        return len(self._pending)
+
+    def schedule(self, kind, when, payload=None):
+        """安排（或重新安排）某类事件，when为datetime"""
+        self._seq += 1
+        event = ScheduledEvent(kind, when, payload)
+        heapq.heappush(self._heap, (when.timestamp(), self._seq, event))
+        self._pending[kind] = self._seq
+        return event
+
+    def cancel(self, kind):
+        self._pending.pop(kind, None)
+
+    def pending(self, kind):
+        """获取某类事件的计划时间，没有安排时返回None"""
+        seq = self._pending.get(kind)
+        if seq is None:
+            return None
+        for deadline, entry_seq, event in self._heap:
+            if entry_seq == seq:
+                return event.when
+        return None
+
+    def _prune(self):
+        """丢弃堆顶已被取消或重新安排的事件"""
+        while self._heap and self._pending.get(self._heap[0][2].kind) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+
+    def time_until_next(self):
+        """距离最近截止时间的秒数，没有待执行事件时返回None"""
+        self._prune()
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self.clock())
+
+    def pop_due(self):
+        """取出已到期的事件中优先级最高的一个，没有到期事件时返回None"""
+        now = self.clock()
+        due = []
+        while True:
+            self._prune()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            due.append(heapq.heappop(self._heap))
+        if not due:
+            return None
+        due.sort(key=lambda entry: (self.PRIORITY.get(entry[2].kind, len(self.PRIORITY)), entry[0], entry[1]))
+        deadline, seq, event = due[0]
+        for entry in due[1:]:
+            heapq.heappush(self._heap, entry)
+        del self._pending[event.kind]
+        self.overruns[event.kind].append(now - deadline)
+        return event
+
+    def overrun_of(self, kind):
+        """最近一次执行该类事件的超时秒数"""
+        samples = self.overruns.get(kind)
+        return samples[-1] if samples else 0.0
+
+    def summary(self):
+        """按事件类型汇总执行次数和超时（平均、最大）"""
+        parts = []
+        for kind in sorted(self.overruns, key=lambda k: self.PRIORITY.get(k, len(self.PRIORITY))):
+            samples = self.overruns[kind]
+            parts.append(f"{kind}: {len(samples)}次 平均超时{sum(samples) / len(samples):.2f}秒 "
+                         f"最大超时{max(samples):.2f}秒")
+        return " | ".join(parts) if parts else "暂无记录"
+
+
+# 日程中的一个动作：类型、计划时间（datetime）、打开序号（保存动作对应被保存的那次打开）
+PlannedAction = collections.namedtuple('PlannedAction', ['kind', 'when', 'index'])
+
+
+class DayPlan:
+    """一天的工作计划：按时间排序的动作列表（工作开始/结束、午休开始/结束、打开文件、保存）
+
+    可以查询下一个动作或某个时间段内的动作，可以序列化为JSON。
+    """
+
+    def __init__(self, work_start, work_end, lunch_start=None, lunch_end=None, actions=(), settings_key=None):
+        self.work_start = work_start
+        self.work_end = work_end
+        self.lunch_start = lunch_start
+        self.lunch_end = lunch_end
+        self.actions = sorted(actions, key=lambda action: (action.when, EventScheduler.PRIORITY.get(action.kind, -1)))
+        self._times = [action.when for action in self.actions]
+        self.settings_key = settings_key
+
+    def __len__(self):
+        return len(self.actions)
+
+    @property
+    def date(self):
+        return self.work_start.date()
+
+    def covers(self, moment):
+        """判断某个时间是否在计划的工作时间内"""
+        return self.work_start <= moment <= self.work_end
+
+    def next_action(self, after, kind=None):
+        """获取某个时间之后的第一个动作（可按类型过滤），没有时返回None"""
+        for action in self.actions[bisect.bisect_right(self._times, after):]:
+            if kind is None or action.kind == kind:
+                return action
+        return None
+
+    def last_action(self, before, kind=None):
+        """获取某个时间及之前的最后一个动作（可按类型过滤），没有时返回None"""
+        for action in reversed(self.actions[:bisect.bisect_right(self._times, before)]):
+            if kind is None or action.kind == kind:
+                return action
+        return None
+
+    def between(self, start, end, kind=None):
+        """获取 [start, end) 时间段内的所有动作（可按类型过滤）"""
+        actions = self.actions[bisect.bisect_left(self._times, start):bisect.bisect_left(self._times, end)]
+        return [action for action in actions if kind is None or action.kind == kind]
+
+    def save_for(self, index):
+        """获取第index次打开对应的保存动作，该次打开没有计划保存时返回None"""
+        for action in self.actions:
+            if action.kind == 'save' and action.index == index:
+                return action
+        return None
+
+    def count(self, kind):
+        return sum(1 for action in self.actions if action.kind == kind)
+
+    def to_dict(self):
+        def fmt(moment):
+            return moment.isoformat() if moment else None
+        return {
+            "work_start": fmt(self.work_start),
+            "work_end": fmt(self.work_end),
+            "lunch_start": fmt(self.lunch_start),
+            "lunch_end": fmt(self.lunch_end),
+            "settings": list(self.settings_key) if self.settings_key else None,
+            "actions": [{"kind": action.kind, "when": fmt(action.when), "index": action.index}
+                        for action in self.actions]
+        }
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=indent)
+
+    @classmethod
+    def from_dict(cls, data):
+        def parse(text):
+            return datetime.datetime.fromisoformat(text) if text else None
+        actions = [PlannedAction(item["kind"], parse(item["when"]), item.get("index")) for item in data.get("actions", [])]
+        settings = data.get("settings")
+        return cls(parse(data["work_start"]), parse(data["work_end"]), parse(data.get("lunch_start")),
+                   parse(data.get("lunch_end")), actions, tuple(settings) if settings else None)
+
+    def summary(self):
+        """计划概要：工作时间、午休、打开和保存次数以及前几个动作"""
+        text = f"工作 {self.work_start.strftime('%H:%M')}-{self.work_end.strftime('%H:%M')}"
+        if self.lunch_start and self.lunch_end:
+            text += f" | 午休 {self.lunch_start.strftime('%H:%M')}-{self.lunch_end.strftime('%H:%M')}"
+        return text + f" | 打开 {self.count('open')} 次 | 保存 {self.count('save')} 次"
+
+
+class ActivityModel:
+    """打开文件间隔的随机模型
+
+    间隔 = 最小间隔 + 随机部分，随机部分的均值为 (最大间隔 - 最小间隔) / 2，平均间隔与均匀分布相同：
+    - uniform: 均匀分布（原有行为）
+    - lognormal: 对数正态分布，大多数间隔接近平均值，偶尔出现较长的停顿（sigma越大越不规则）
+    - gamma: 伽马分布（shape越小越不规则，shape=1为指数分布）
+    - poisson: 非齐次泊松过程，打开频率随星期几和小时的强度曲线变化，用 inverse-CDF（时间变换）生成，
+      每次打开后经过最小间隔，再取下一个事件作为下一次打开
+    lognormal/gamma 的间隔不超过最大间隔的 MAX_STRETCH 倍。
+    一天的间隔或打开时间一次批量生成（安装numpy时向量化），DayPlanner、模拟器和工作模式共用同一模型。
+    """
+
+    TYPES = ('uniform', 'lognormal', 'gamma', 'poisson')
+    WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+    MAX_STRETCH = 2.0
+    # 默认的小时强度曲线（相对值）：上午和下午各有一个高峰，午饭前后和傍晚较低
+    DEFAULT_HOURLY_PROFILE = [0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.3, 0.5, 0.8, 1.2, 1.3, 1.1,
+                              0.6, 0.7, 1.1, 1.2, 1.0, 0.8, 0.5, 0.4, 0.3, 0.3, 0.2, 0.2]
+
+    def __init__(self, kind='uniform', interval_min=30.0, interval_max=60.0, lognormal_sigma=0.5,
+                 gamma_shape=2.0, hourly_profile=None, weekday_profiles=None):
+        self.kind = kind if kind in self.TYPES else 'uniform'
+        self.interval_min = max(0.1, interval_min)
+        self.interval_max = max(self.interval_min, interval_max)
+        self.lognormal_sigma = max(0.01, lognormal_sigma)
+        self.gamma_shape = max(0.01, gamma_shape)
+        self.hourly_profile = self._profile(hourly_profile) or list(self.DEFAULT_HOURLY_PROFILE)
+        self.weekday_profiles = {}  # 星期几(0=周一) -> 24小时强度，没有配置的使用 hourly_profile
+        for key, profile in (weekday_profiles or {}).items():
+            key = str(key).lower()[:3]
+            if key in self.WEEKDAYS and self._profile(profile):
+                self.weekday_profiles[self.WEEKDAYS.index(key)] = self._profile(profile)
+        self._tables = {}  # (星期几, 天数) -> 按整点分段的累计强度表
+        self._bit_generator = None  # 复用的numpy位生成器（每次按rng重置状态）
+        self._generator = None
+
+    @staticmethod
+    def _profile(values):
+        """校验24小时强度曲线（强度为0的小时按很小的正数处理，保证时间变换可逆）"""
+        if not isinstance(values, (list, tuple)) or len(values) != 24:
+            return None
+        return [max(0.01, float(value)) for value in values]
+
+    @property
+    def key(self):
+        """模型参数的标识（参数变化时DayPlanner重新计划）"""
+        if self.kind == 'lognormal':
+            return f"lognormal:{self.lognormal_sigma}"
+        if self.kind == 'gamma':
+            return f"gamma:{self.gamma_shape}"
+        if self.kind == 'poisson':
+            profiles = json.dumps([self.hourly_profile, sorted(self.weekday_profiles.items())])
+            return f"poisson:{hashlib.sha256(profiles.encode('utf-8')).hexdigest()[:12]}"
+        return 'uniform'
+
+    @property
+    def mean_excess(self):
+        """间隔中随机部分的均值（分钟）"""
+        return (self.interval_max - self.interval_min) / 2
+
+    def _numpy_generator(self, rng):
+        """由rng派生numpy随机数生成器
+
+        复用同一个PCG64，只用rng的随机位重置其状态：结果只取决于rng，而且比每天新建生成器
+        （需要SeedSequence初始化）快得多。同一个模型实例不应在多个线程中同时生成。
+        """
+        if self._bit_generator is None:
+            self._bit_generator = np.random.PCG64()
+            self._generator = np.random.Generator(self._bit_generator)
+        self._bit_generator.state = {'bit_generator': 'PCG64', 'has_uint32': 0, 'uinteger': 0,
+                                     'state': {'state': rng.getrandbits(128), 'inc': rng.getrandbits(128) | 1}}
+        return self._generator
+
+    def interval_array(self, generator, count):
+        """用numpy的随机数生成器一次生成count个间隔（分钟，间隔模型），返回数组"""
+        span = self.interval_max - self.interval_min
+        if span <= 0:
+            excess = np.zeros(count)
+        elif self.kind == 'lognormal':
+            mu = np.log(self.mean_excess) - self.lognormal_sigma ** 2 / 2
+            excess = generator.lognormal(mu, self.lognormal_sigma, count)
+        elif self.kind == 'gamma':
+            excess = generator.gamma(self.gamma_shape, self.mean_excess / self.gamma_shape, count)
+        else:
+            excess = generator.uniform(0, span, count)
+        return np.minimum(self.interval_min + excess, self.interval_max * self.MAX_STRETCH)
+
+    def intervals(self, rng, count):
+        """一次生成count个间隔（分钟，间隔模型），rng为random.Random或random模块"""
+        if np is not None:
+            return self.interval_array(self._numpy_generator(rng), count).tolist()
+        return self._python_intervals(rng, count)
+
+    def _python_intervals(self, rng, count):
+        """用Python的随机数逐个生成count个间隔（分钟，间隔模型）"""
+        span = self.interval_max - self.interval_min
+        low, cap = self.interval_min, self.interval_max * self.MAX_STRETCH
+        if span <= 0:
+            return [low] * count
+        if self.kind == 'lognormal':
+            mu = math.log(self.mean_excess) - self.lognormal_sigma ** 2 / 2
+            sigma = self.lognormal_sigma
+            return [min(cap, low + rng.lognormvariate(mu, sigma)) for _ in range(count)]
+        if self.kind == 'gamma':
+            shape, scale = self.gamma_shape, self.mean_excess / self.gamma_shape
+            return [min(cap, low + rng.gammavariate(shape, scale)) for _ in range(count)]
+        random_value = rng.random
+        return [low + span * random_value() for _ in range(count)]
+
+    def _intensity_table(self, weekday, days):
+        """从weekday当天0点起days天、按整点分段的累计强度表（未归一化，按参数缓存）
+
+        返回 (各小时的强度, 各整点的累计强度, 各小时的基准强度, 各整点的基准累计强度, 整点时刻数组, 累计强度数组)，
+        最后两项供numpy插值使用（未安装numpy时为None）。
+        """
+        key = (weekday, days)
+        table = self._tables.get(key)
+        if table is None:
+            profile, cumulative, base, base_cumulative = [], [0.0], [], [0.0]
+            for hour in range(days * 24):
+                profile.append(self.weekday_profiles.get((weekday + hour // 24) % 7, self.hourly_profile)[hour % 24])
+                base.append(self.hourly_profile[hour % 24])
+                cumulative.append(cumulative[-1] + profile[-1] * 3600)
+                base_cumulative.append(base_cumulative[-1] + base[-1] * 3600)
+            arrays = (np.arange(days * 24 + 1) * 3600.0, np.array(cumulative)) if np is not None else (None, None)
+            table = self._tables[key] = (profile, cumulative, base, base_cumulative) + arrays
+        return table
+
+    @staticmethod
+    def _level(profile, cumulative, moment):
+        """累计强度在moment（秒）处的值"""
+        hour = min(int(moment // 3600), len(profile) - 1)
+        return cumulative[hour] + profile[hour] * (moment - hour * 3600)
+
+    def _window_levels(self, weekday, start, end):
+        """[start, end)（从weekday当天0点起的秒数，可以跨多天）的强度表、起止累计强度和归一化系数
+
+        平均强度按 hourly_profile 在该时间段内的平均值归一化为每"随机部分均值"一次：最小间隔过后等待下一个事件
+        的平均时间（无记忆性）与其他模型的随机部分相同。某个星期几的曲线整体较低时当天打开次数也较少。
+        返回 (强度表, 起点累计强度, 终点累计强度, rate)，时间段内的期望事件数为 (终点 - 起点) * rate。
+        """
+        table = self._intensity_table(weekday, max(1, int(math.ceil(end / 86400))))
+        profile, cumulative, base, base_cumulative = table[:4]
+        base_mean = (self._level(base, base_cumulative, end) - self._level(base, base_cumulative, start)) / (end - start)
+        rate = 1 / (max(0.1, self.mean_excess) * 60 * base_mean)
+        return table, self._level(profile, cumulative, start), self._level(profile, cumulative, end), rate
+
+    def event_times(self, rng, weekday, start, end):
+        """在 [start, end)（从weekday当天0点起的秒数）内一次生成非齐次泊松过程的全部事件时间（升序，秒）
+
+        inverse-CDF：单位速率泊松过程的到达时刻（指数分布累加）经累计强度的反函数映射回实际时间。
+        """
+        if end <= start:
+            return []
+        table, start_level, end_level, rate = self._window_levels(weekday, start, end)
+        total = (end_level - start_level) * rate
+        if np is not None:
+            generator = self._numpy_generator(rng)
+            batch = int(total + 5 * math.sqrt(total) + 10)
+            arrivals = np.cumsum(generator.exponential(1.0, batch))
+            while arrivals[-1] < total:
+                arrivals = np.concatenate([arrivals, arrivals[-1] + np.cumsum(generator.exponential(1.0, batch))])
+            arrivals = arrivals[arrivals < total]
+            return np.interp(start_level + arrivals / rate, table[5], table[4]).tolist()
+
+        profile, cumulative = table[0], table[1]
+        events, arrival, scale = [], 0.0, 1 / rate
+        hour = int(start // 3600)
+        expovariate = rng.expovariate
+        while True:
+            arrival += expovariate(1.0)
+            if arrival >= total:
+                return events
+            level = start_level + arrival * scale
+            while cumulative[hour + 1] < level:
+                hour += 1
+            events.append(hour * 3600 + (level - cumulative[hour]) / profile[hour])
+
+    def sampler(self, rng, weekday, start, end):
+        """为一天的 [start, end)（当天的秒数）批量生成间隔或打开时间，返回 DaySampler"""
+        if self.kind == 'poisson' and self.mean_excess > 0:
+            return DaySampler(self, rng, events=self.event_times(rng, weekday, start, end))
+        count = int((end - start) / (self.interval_min * 60)) + 2
+        return DaySampler(self, rng, intervals=self.intervals(rng, count))
+
+    def next_interval(self, rng, moment):
+        """从moment开始的下一次打开间隔（分钟），只生成一个间隔或事件；当天不再有打开时返回None
+
+        泊松模型：经过最小间隔后，由无记忆性只需一个指数分布的到达时刻即可得到下一个事件。
+        """
+        if self.kind != 'poisson' or self.mean_excess <= 0:
+            return self._python_intervals(rng, 1)[0]
+        start = moment.hour * 3600 + moment.minute * 60 + moment.second + moment.microsecond / 1e6
+        earliest = start + self.interval_min * 60
+        if earliest >= 86400:
+            return None
+        table, _, end_level, rate = self._window_levels(moment.weekday(), start, 86400)
+        profile, cumulative = table[0], table[1]
+        level = self._level(profile, cumulative, earliest) + rng.expovariate(1.0) / rate
+        if level >= end_level:
+            return None
+        hour = int(earliest // 3600)
+        while cumulative[hour + 1] < level:
+            hour += 1
+        return (hour * 3600 + (level - cumulative[hour]) / profile[hour] - start) / 60
+
+    @classmethod
+    def benchmark(cls, events=1000000, rng=None, work_start=9 * 3600, work_end=18 * 3600):
+        """按工作日测量各模型生成间隔/事件的速度，返回 {模型: 每秒事件数}
+
+        与DayPlanner相同，每个工作日调用一次sampler批量生成当天的间隔（或泊松事件），直到累计生成events个。
+        """
+        rng = rng or random.Random(0)
+        results = {}
+        for kind in cls.TYPES:
+            model = cls(kind)
+            generated, day = 0, 0
+            started = time.perf_counter()
+            while generated < events:
+                sampler = model.sampler(rng, day % 5, work_start, work_end)
+                generated += len(sampler.events if sampler.events is not None else sampler.intervals)
+                day += 1
+            results[kind] = generated / max(1e-9, time.perf_counter() - started)
+        return results
+
+
+class DaySampler:
+    """一天内按顺序取下一次打开时间（时间单位为当天的秒数）
+
+    间隔模型（uniform/lognormal/gamma）：下一次打开 = 本次打开 + 预先生成的下一个间隔；
+    泊松模型：下一次打开 = 预先生成的事件中，不早于"本次打开 + 最小间隔"的第一个。
+    """
+
+    def __init__(self, model, rng, intervals=None, events=None):
+        self.model = model
+        self.rng = rng
+        self.intervals = intervals
+        self.events = events
+        self._position = 0
+
+    def next_after(self, moment):
+        """moment（秒）之后的下一次打开时间（秒），没有时返回None"""
+        if self.events is not None:
+            index = bisect.bisect_left(self.events, moment + self.model.interval_min * 60, self._position)
+            if index >= len(self.events):
+                return None
+            self._position = index + 1
+            return self.events[index]
+        if self._position >= len(self.intervals):
+            self.intervals = self.model.intervals(self.rng, len(self.intervals) or 16)
+            self._position = 0
+        interval = self.intervals[self._position]
+        self._position += 1
+        return moment + interval * 60
+
+
+class DayPlanner:
+    """每日计划生成器：一次生成全天的打开和保存时间
+
+    规则与工作模式一致：
+    - 保存延迟在配置的范围内随机，打开间隔由打开间隔模型（ActivityModel）生成，一天的间隔一次批量生成；
+    - 保存时间超过工作结束时间时调整到结束前30秒（已经来不及时为打开后5秒）；
+    - 距离工作结束不足"最小保存延迟 + 1分钟"时不再打开新文件；
+    - 午休开始时保存待保存的文件，午休期间到期的打开推迟到午休结束；
+    - 下一次打开早于上一个文件的保存时间时，上一个文件不再单独保存（与工作模式中覆盖保存时间的行为一致）。
+    """
+
+    SAVE_END_MARGIN = 30     # 保存时间超过工作结束时间时，调整到结束前的秒数
+    LATE_SAVE_DELAY = 5      # 调整后仍来不及时，打开后多少秒保存
+    OPEN_BUFFER_MINUTES = 1  # 打开新文件时，除最小保存延迟外额外预留的分钟数
+
+    def __init__(self, save_delay_min, save_delay_max, file_interval_min, file_interval_max, rng=None, model=None):
+        self.save_delay_min = max(0.1, save_delay_min)
+        self.save_delay_max = max(self.save_delay_min, save_delay_max)
+        self.file_interval_min = max(0.1, file_interval_min)
+        self.file_interval_max = max(self.file_interval_min, file_interval_max)
+        self.rng = rng or random
+        self.model = model or ActivityModel('uniform', self.file_interval_min, self.file_interval_max)
+        self._sampler = None  # 当前生成的这一天的 (日期, DaySampler)
+        # 最近一次生成的计划中被规则调整过的动作数：end_clamped_saves / lunch_saves / lunch_deferred_opens
+        self.adjustments = collections.Counter()
+
+    @property
+    def settings_key(self):
+        return (self.save_delay_min, self.save_delay_max, self.file_interval_min, self.file_interval_max, self.model.key)
+
+    def enough_time_to_open(self, moment, work_end):
+        """距离工作结束是否还够完成一次打开和保存"""
+        return (work_end - moment).total_seconds() / 60 > self.save_delay_min + self.OPEN_BUFFER_MINUTES
+
+    def save_time(self, opened_at, work_end):
+        """计算打开文件后的保存时间"""
+        return self._save_time(opened_at, work_end)[0]
+
+    def _save_time(self, opened_at, work_end):
+        """计算打开文件后的保存时间，返回 (保存时间, 是否因超过工作结束时间被调整)"""
+        delay = int(self.rng.uniform(self.save_delay_min, self.save_delay_max) * 60)
+        save_at = opened_at + datetime.timedelta(seconds=delay)
+        if save_at <= work_end:
+            return save_at, False
+        save_at = work_end - datetime.timedelta(seconds=self.SAVE_END_MARGIN)
+        if save_at <= opened_at:
+            save_at = opened_at + datetime.timedelta(seconds=self.LATE_SAVE_DELAY)
+        return save_at, True
+
+    def next_open_time(self, opened_at, work_end):
+        """计算下一次打开文件的时间，来不及完成一次完整操作时返回None"""
+        midnight = datetime.datetime.combine(opened_at.date(), datetime.time())
+        opened_seconds = (opened_at - midnight).total_seconds()
+        if self._sampler is None or self._sampler[0] != opened_at.date():
+            # 第一次计算时为这一天剩余的时间批量生成间隔（或泊松事件）
+            sampler = self.model.sampler(self.rng, opened_at.weekday(), opened_seconds, (work_end - midnight).total_seconds())
+            self._sampler = (opened_at.date(), sampler)
+        next_seconds = self._sampler[1].next_after(opened_seconds)
+        if next_seconds is None:
+            return None
+        next_open = midnight + datetime.timedelta(seconds=next_seconds)
+        required = datetime.timedelta(minutes=self.save_delay_min + self.OPEN_BUFFER_MINUTES)
+        return next_open if next_open + required <= work_end else None
+
+    @staticmethod
+    def _skip_lunch(moment, lunch_start, lunch_end):
+        """午休期间的时间推迟到午休结束"""
+        if moment is not None and lunch_start and lunch_start <= moment < lunch_end:
+            return lunch_end
+        return moment
+
+    def _save_before_next(self, opened_at, next_open, work_end, lunch_start, not_before=None):
+        """计算打开后的保存动作；下一次打开先于保存时返回None"""
+        save_at, clamped = self._save_time(opened_at, work_end)
+        lunch_save = bool(lunch_start) and opened_at < lunch_start <= save_at
+        if lunch_save:
+            save_at = lunch_start  # 午休开始时先保存
+        if not_before is not None:
+            save_at = max(save_at, not_before)
+        if next_open is not None and save_at > next_open:
+            return None
+        self.adjustments['end_clamped_saves'] += clamped
+        self.adjustments['lunch_saves'] += lunch_save
+        return save_at
+
+    def _generate(self, first_open, index, work_end, lunch_start, lunch_end, forced=True):
+        """从第index次打开开始生成后续的打开和保存动作（forced表示第一次打开不检查剩余时间）"""
+        actions = []
+        open_at, deferred = first_open, False
+        while open_at is not None:
+            skipped = self._skip_lunch(open_at, lunch_start, lunch_end)
+            deferred, open_at = deferred or skipped != open_at, skipped
+            if open_at >= work_end or (not forced and not self.enough_time_to_open(open_at, work_end)):
+                break
+            forced = False
+            actions.append(PlannedAction('open', open_at, index))
+            self.adjustments['lunch_deferred_opens'] += deferred
+
+            next_open = self.next_open_time(open_at, work_end)
+            skipped = self._skip_lunch(next_open, lunch_start, lunch_end)
+            deferred, next_open = skipped != next_open, skipped
+            save_at = self._save_before_next(open_at, next_open, work_end, lunch_start)
+            if save_at is not None:
+                actions.append(PlannedAction('save', save_at, index))
+
+            open_at = next_open
+            index += 1
+        return actions
+
+    def plan(self, work_start, work_end, lunch_start=None, lunch_end=None, start=None):
+        """生成一天的计划；start晚于工作开始时间时（例如中途启动）从start开始"""
+        first_open = max(work_start, start) if start else work_start
+        self._sampler = None
+        self.adjustments.clear()
+        actions = [PlannedAction('work_end', work_end, None)]
+        if lunch_start and lunch_end and first_open < lunch_end:
+            actions.append(PlannedAction('lunch_start', max(lunch_start, first_open), None))
+            actions.append(PlannedAction('lunch_end', lunch_end, None))
+        actions.extend(self._generate(first_open, 0, work_end, lunch_start, lunch_end))
+        return DayPlan(work_start, work_end, lunch_start, lunch_end, actions, self.settings_key)
+
+    def replan(self, plan, now):
+        """设置变化后增量重新计划：已经发生的动作保持不变，只重新生成now之后的打开和保存"""
+        past = [action for action in plan.actions if action.kind not in ('open', 'save') or action.when <= now]
+        last_open = plan.last_action(now, 'open')
+        self._sampler = None
+        self.adjustments.clear()
+        if last_open is None:
+            future = self._generate(max(plan.work_start, now), 0, plan.work_end, plan.lunch_start, plan.lunch_end)
+        else:
+            # 最近一次打开已经发生，按新设置重新计算它的保存时间（尚未保存时）和之后的打开
+            future = []
+            next_open = self.next_open_time(last_open.when, plan.work_end)
+            if next_open is not None:
+                next_open = self._skip_lunch(max(next_open, now), plan.lunch_start, plan.lunch_end)
+            if not any(action.kind == 'save' and action.index == last_open.index for action in past):
+                save_at = self._save_before_next(last_open.when, next_open, plan.work_end, plan.lunch_start, now)
+                if save_at is not None:
+                    future.append(PlannedAction('save', save_at, last_open.index))
+            if next_open is not None:
+                future.extend(self._generate(next_open, last_open.index + 1, plan.work_end,
+                                             plan.lunch_start, plan.lunch_end, forced=False))
+        return DayPlan(plan.work_start, plan.work_end, plan.lunch_start, plan.lunch_end,
+                       past + future, self.settings_key)
+
+
+class HolidayCalendarImporter:
+    """节假日日历导入：读取本地 .ics 文件和 CSV/JSON 节假日列表
+
+    每个文件解析为节假日和调休工作日两个日期序号集合。解析结果按文件内容的SHA-256缓存到磁盘，
+    文件没有变化时启动不再重新解析。
+
+    - .ics: 读取 VEVENT 的 DTSTART/DTEND（DTEND不包含在内）和 SUMMARY，
+      SUMMARY 含有"班"、"上班"、"workday"等关键词的事件视为调休工作日，其余视为节假日
+    - .csv: 每行"日期[,类型][,名称]"，日期为 YYYY-MM-DD 或 "起始~结束"，
+      类型为 holiday/休 或 work/班（默认为节假日），可以带表头
+    - .json: {"holiday_dates": [...], "work_dates": [...]}（日期为 YYYY-MM-DD 或范围），
+      或 [{"date": ..., "type": ...}, ...]
+    """
+
+    CACHE_VERSION = 1
+    WORK_KEYWORDS = ('班', '上班', '补班', 'workday', 'working day', 'make-up')
+    WORK_TYPES = ('work', 'workday', '班', '上班', '补班', '调休上班')
+    HOLIDAY_TYPES = ('holiday', 'off', '休', '假', '休息', '节假日')
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.errors = []      # (文件, 错误信息)
+        self.parsed = 0       # 本次实际解析的文件数
+        self.cached = 0       # 本次直接使用缓存的文件数
+
+    @staticmethod
+    def _parse_day(text):
+        """解析 YYYY-MM-DD、YYYYMMDD 或 YYYY/MM/DD 格式的日期"""
+        text = text.strip()
+        if len(text) >= 8 and text[:8].isdigit():
+            return datetime.date(int(text[:4]), int(text[4:6]), int(text[6:8]))
+        return datetime.date.fromisoformat(text.replace('/', '-'))
+
+    @classmethod
+    def _day_range(cls, text):
+        """解析单个日期或 "起始~结束" 范围，返回日期序号列表"""
+        if '~' in text:
+            start_text, end_text = text.split('~', 1)
+            first, last = cls._parse_day(start_text).toordinal(), cls._parse_day(end_text).toordinal()
+        else:
+            first = last = cls._parse_day(text).toordinal()
+        return range(first, last + 1)
+
+    @classmethod
+    def _classify(cls, kind, default_work=False):
+        kind = (kind or '').strip().lower()
+        if kind in cls.WORK_TYPES:
+            return True
+        if kind in cls.HOLIDAY_TYPES:
+            return False
+        return default_work
+
+    @classmethod
+    def parse_ics(cls, text):
+        """解析iCalendar文本，返回 (节假日序号集合, 调休工作日序号集合)"""
+        # 展开折行（以空格或制表符开头的行是上一行的延续）
+        lines = []
+        for raw_line in text.splitlines():
+            if raw_line[:1] in (' ', '\t') and lines:
+                lines[-1] += raw_line[1:]
+            else:
+                lines.append(raw_line)
+
+        holidays, work_days = set(), set()
+        event = None
+        for line in lines:
+            if line == 'BEGIN:VEVENT':
+                event = {}
+            elif line == 'END:VEVENT' and event is not None:
+                if 'DTSTART' in event:
+                    first = cls._parse_day(event['DTSTART']).toordinal()
+                    # 全天事件的DTEND不包含在内；没有DTEND时为单日事件
+                    last = cls._parse_day(event['DTEND']).toordinal() - 1 if 'DTEND' in event else first
+                    summary = event.get('SUMMARY', '').lower()
+                    is_work = any(keyword in summary for keyword in cls.WORK_KEYWORDS)
+                    (work_days if is_work else holidays).update(range(first, max(first, last) + 1))
+                event = None
+            elif event is not None and ':' in line:
+                name, value = line.split(':', 1)
+                event[name.split(';', 1)[0].upper()] = value.strip()
+        return holidays, work_days
+
+    @classmethod
+    def parse_csv(cls, text):
+        holidays, work_days = set(), set()
+        for row in csv.reader(io.StringIO(text)):
+            if not row or not row[0].strip() or row[0].strip().startswith('#'):
+                continue
+            try:
+                days = cls._day_range(row[0])
+            except ValueError:
+                continue  # 表头或无法解析的行
+            is_work = cls._classify(row[1] if len(row) > 1 else '')
+            (work_days if is_work else holidays).update(days)
+        return holidays, work_days
+
+    @classmethod
+    def parse_json(cls, text):
+        data = json.loads(text)
+        holidays, work_days = set(), set()
+        if isinstance(data, dict):
+            for day_text in data.get("holiday_dates", []):
+                holidays.update(cls._day_range(day_text))
+            for day_text in data.get("work_dates", []):
+                work_days.update(cls._day_range(day_text))
+        else:
+            for item in data:
+                is_work = cls._classify(item.get("type", ""))
+                (work_days if is_work else holidays).update(cls._day_range(item["date"]))
+        return holidays, work_days
+
+    @staticmethod
+    def _to_ranges(ordinals):
+        """把日期序号集合压缩为 [[起始, 结束], ...]（缓存文件更小）"""
+        ranges = []
+        for ordinal in sorted(ordinals):
+            if ranges and ranges[-1][1] == ordinal - 1:
+                ranges[-1][1] = ordinal
+            else:
+                ranges.append([ordinal, ordinal])
+        return ranges
+
+    @staticmethod
+    def _from_ranges(ranges):
+        ordinals = set()
+        for first, last in ranges:
+            ordinals.update(range(first, last + 1))
+        return ordinals
+
+    def _read_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            if cache.get("version") == self.CACHE_VERSION:
+                return cache.get("files", {})
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def _write_cache(self, entries):
+        if not self.cache_path:
+            return
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        temp_path = self.cache_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": self.CACHE_VERSION, "files": entries}, f)
+        os.replace(temp_path, self.cache_path)
+
+    def load(self, paths):
+        """导入所有文件，返回合并后的 (节假日序号集合, 调休工作日序号集合)"""
+        cache = self._read_cache()
+        entries = {}
+        holidays, work_days = set(), set()
+        for path in paths or ():
+            try:
+                with open(path, 'rb') as f:
+                    content = f.read()
+                digest = hashlib.sha256(content).hexdigest()
+                entry = cache.get(digest)
+                if entry is None:
+                    text = content.decode('utf-8-sig')
+                    ext = os.path.splitext(path)[1].lower()
+                    if ext == '.ics':
+                        file_holidays, file_work_days = self.parse_ics(text)
+                    elif ext == '.csv':
+                        file_holidays, file_work_days = self.parse_csv(text)
+                    elif ext == '.json':
+                        file_holidays, file_work_days = self.parse_json(text)
+                    else:
+                        raise ValueError(f"不支持的文件类型: {ext}")
+                    entry = {"holidays": self._to_ranges(file_holidays), "work": self._to_ranges(file_work_days)}
+                    self.parsed += 1
+                else:
+                    self.cached += 1
+                entries[digest] = entry
+                holidays |= self._from_ranges(entry["holidays"])
+                work_days |= self._from_ranges(entry["work"])
+            except Exception as e:
+                self.errors.append((path, str(e)))
+
+        # 只保留当前导入文件的缓存，文件内容或列表变化时重写
+        if set(entries) != set(cache):
+            try:
+                self._write_cache(entries)
+            except OSError as e:
+                self.errors.append((self.cache_path, str(e)))
+        return holidays, work_days
+
+
+class WorkCalendar:
+    """编译好的工作日历
+
+    节假日和调休工作日规则只解析一次，按年份展开为日期序号（date.toordinal()）集合，
+    并为一段滚动区间预先计算"下一个工作日"表，is_work_day和next_work_day都是O(1)查询。
+
+    支持的规则格式：
+    - "MM-DD": 每年生效的月日（如 "01-01"）
+    - "YY-MM-DD": 指定年份的日期（如 "25-07-21"）
+    - "起始~结束": 日期范围（两端格式相同，包含两端），如 "25-10-01~25-10-07"、"12-31~01-02"
+    另外可以传入从日历文件导入的节假日和调休工作日序号集合，与上述规则合并。
+    优先级：调休工作日 > 节假日 > 周末设置。
+    """
+
+    RANGE_SEPARATOR = '~'
+    HORIZON_DAYS = 400  # 下一个工作日表覆盖的天数
+    MAX_SEARCH_DAYS = 3660  # 表外查找下一个工作日的最长天数
+
+    def __init__(self, skip_weekends=True, work_dates=(), holiday_dates=(), horizon_days=None,
+                 imported_holidays=(), imported_work_days=()):
+        self.skip_weekends = skip_weekends
+        self._imported_holidays = frozenset(imported_holidays)
+        self._imported_work_days = frozenset(imported_work_days)
+        self.horizon_days = horizon_days or self.HORIZON_DAYS
+        self.invalid_rules = []
+        self._work_rules = self._compile(work_dates)
+        self._holiday_rules = self._compile(holiday_dates)
+        self._years = {}        # 年份 -> (节假日序号集合, 调休工作日序号集合)
+        self._table_base = None  # 下一个工作日表的起始日期序号
+        self._next_work = []     # 第i项为 >= 起始序号+i 的第一个工作日序号
+
+    def _parse_date(self, text):
+        """解析单个日期，返回 (年份或None, 月, 日)"""
+        parts = text.strip().split('-')
+        if len(parts) == 2:
+            year, (month, day) = None, map(int, parts)
+        elif len(parts) == 3:
+            year, month, day = 2000 + int(parts[0]), int(parts[1]), int(parts[2])
+        else:
+            raise ValueError(text)
+        # 校验月日（2月29日用闰年校验，非闰年展开时跳过）
+        datetime.date(year or 2000, month, day)
+        return year, month, day
+
+    def _compile(self, rules):
+        """把规则字符串解析为 (起始, 结束) 元组列表，每端为 (年份或None, 月, 日)"""
+        compiled = []
+        for rule in rules or ():
+            try:
+                if self.RANGE_SEPARATOR in rule:
+                    start_text, end_text = rule.split(self.RANGE_SEPARATOR, 1)
+                    start, end = self._parse_date(start_text), self._parse_date(end_text)
+                    if (start[0] is None) != (end[0] is None):
+                        raise ValueError(rule)
+                else:
+                    start = end = self._parse_date(rule)
+                compiled.append((start, end))
+            except (ValueError, TypeError):
+                self.invalid_rules.append(rule)
+        return compiled
+
+    @staticmethod
+    def _ordinal(year, month, day):
+        """日期序号，日期不存在（如非闰年的2月29日）时返回None"""
+        try:
+            return datetime.date(year, month, day).toordinal()
+        except ValueError:
+            return None
+
+    def _expand(self, rules, year):
+        """把规则展开为某一年内的日期序号集合"""
+        year_first = datetime.date(year, 1, 1).toordinal()
+        year_last = datetime.date(year, 12, 31).toordinal()
+        ordinals = set()
+        for (start_year, start_month, start_day), (end_year, end_month, end_day) in rules:
+            if start_year is not None:
+                spans = [(start_year, end_year)]
+            elif (start_month, start_day) <= (end_month, end_day):
+                spans = [(year, year)]
+            else:
+                # 跨年的每年范围（如 "12-31~01-02"）：上一年开始的和本年开始的都可能落在本年
+                spans = [(year - 1, year), (year, year + 1)]
+            for first_year, last_year in spans:
+                first = self._ordinal(first_year, start_month, start_day)
+                last = self._ordinal(last_year, end_month, end_day)
+                if first is None and start_month == 2 and start_day == 29:
+                    first = self._ordinal(first_year, 3, 1)
+                if last is None and end_month == 2 and end_day == 29:
+                    last = self._ordinal(last_year, 2, 28)
+                if first is None or last is None:
+                    continue
+                ordinals.update(range(max(first, year_first), min(last, year_last) + 1))
+        return ordinals
+
+    def _year(self, year):
+        sets = self._years.get(year)
+        if sets is None:
+            sets = (frozenset(self._expand(self._holiday_rules, year)),
+                    frozenset(self._expand(self._work_rules, year)))
+            self._years[year] = sets
+        return sets
+
+    def _is_work_ordinal(self, ordinal, date=None):
+        date = date or datetime.date.fromordinal(ordinal)
+        holidays, work_days = self._year(date.year)
+        if ordinal in work_days or ordinal in self._imported_work_days:
+            return True
+        if ordinal in holidays or ordinal in self._imported_holidays:
+            return False
+        return not (self.skip_weekends and date.weekday() >= 5)
+
+    def is_work_day(self, date):
+        """判断指定日期是否为工作日（date可以是date或datetime）"""
+        if isinstance(date, datetime.datetime):
+            date = date.date()
+        ordinal = date.toordinal()
+        if self._table_base is not None and 0 <= ordinal - self._table_base < len(self._next_work):
+            return self._next_work[ordinal - self._table_base] == ordinal
+        return self._is_work_ordinal(ordinal, date)
+
+    def _build_table(self, base):
+        """从base开始预先计算下一个工作日表（从后向前一次遍历）"""
+        size = self.horizon_days
+        table = [None] * size
+        following = None
+        for offset in range(size - 1, -1, -1):
+            ordinal = base + offset
+            if self._is_work_ordinal(ordinal):
+                following = ordinal
+            table[offset] = following
+        self._table_base = base
+        self._next_work = table
+
+    def next_work_day(self, date, include_today=False):
+        """获取date之后（include_today为True时包括date本身）的第一个工作日"""
+        if isinstance(date, datetime.datetime):
+            date = date.date()
+        ordinal = date.toordinal() + (0 if include_today else 1)
+        if self._table_base is None or not 0 <= ordinal - self._table_base < len(self._next_work):
+            self._build_table(date.toordinal())
+        found = self._next_work[ordinal - self._table_base]
+        if found is None:
+            # 滚动区间内没有工作日（例如大量连续的节假日），继续向后查找
+            for candidate in range(self._table_base + len(self._next_work),
+                                   ordinal + self.MAX_SEARCH_DAYS):
+                if self._is_work_ordinal(candidate):
+                    found = candidate
+                    break
+            else:
+                # 找不到工作日时按第一天处理，避免任务停止
+                found = ordinal
+        return datetime.date.fromordinal(found)
+
+
+class ScheduleStore:
+    """持久化的每日排程缓存：按 (类型, 日期) 保存当天实际的工作/午休开始和结束时间及生成时的设置哈希
+
+    每天的随机偏移由 HMAC-SHA256(密钥, 类型|日期|设置哈希) 作为种子生成，同一天、同样的设置
+    无论何时计算（包括中途重启）结果都相同。没有配置密钥时密钥自动生成并只保存在缓存文件中，
+    删除缓存文件后会换成新的密钥，需要跨缓存文件保持一致时应在配置中指定密钥。
+    今天及以后的条目只在设置哈希相同时使用，设置变化后按新设置重新生成；
+    过去的日期不论设置如何变化都保持当时的实际时间。
+    条目按最近使用顺序保存，超过条目上限时淘汰最久未使用的，早于保留天数的条目直接丢弃。
+    """
+
+    VERSION = 2
+
+    def __init__(self, path=None, secret="", max_entries=200, max_age_days=60, today=None):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.max_age_days = max(0, int(max_age_days))
+        self.today = today or datetime.date.today
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # "类型|日期" -> [开始分钟, 结束分钟, 设置哈希]
+        self.hits = 0
+        self.misses = 0
+        self.last_error = None  # 最近一次读写缓存文件的错误
+        stored_secret = self._load()
+        self.secret = secret or stored_secret or secrets.token_hex(16)
+        if not secret and not stored_secret:
+            self.save()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _load(self):
+        """读取缓存文件，返回其中保存的密钥"""
+        if not self.path or not os.path.exists(self.path):
+            return ""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            version = data.get("version")
+            if version == 1:
+                # 旧格式的键为"类型|日期|设置哈希"
+                for key, start, end in data.get("entries", []):
+                    day_key, settings_hash = key.rsplit("|", 1)
+                    self.entries[day_key] = [start, end, settings_hash]
+            elif version == self.VERSION:
+                for key, start, end, settings_hash in data.get("entries", []):
+                    self.entries[key] = [start, end, settings_hash]
+            return data.get("secret", "")
+        except (OSError, ValueError, TypeError) as e:
+            self.last_error = str(e)
+            return ""
+
+    def save(self):
+        """写入缓存文件（先写临时文件再替换），失败时记录错误并返回False"""
+        if not self.path:
+            return True
+        try:
+            store_dir = os.path.dirname(self.path)
+            if store_dir:
+                os.makedirs(store_dir, exist_ok=True)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": self.VERSION, "secret": self.secret,
+                           "entries": [[key] + value for key, value in self.entries.items()]}, f)
+            os.replace(temp_path, self.path)
+            return True
+        except OSError as e:
+            self.last_error = str(e)
+            return False
+
+    @staticmethod
+    def settings_hash(settings):
+        """设置的短哈希（设置相同则哈希相同）"""
+        text = json.dumps(settings, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def random_window(rng, base_start, base_end, random_range, min_length):
+        """按随机偏移计算实际的开始和结束分钟数（0-1439），结束不晚于开始时至少保留min_length分钟"""
+        start = max(0, min(1439, base_start + rng.randint(-random_range, random_range)))
+        end = max(0, min(1439, base_end + rng.randint(-random_range, random_range)))
+        if end <= start:
+            end = start + min_length
+            if end > 1439:
+                start, end = 1439 - min_length, 1439
+        return start, end
+
+    def rng(self, kind, date, settings_hash):
+        """该日期的确定性随机数生成器"""
+        message = f"{kind}|{date.isoformat()}|{settings_hash}".encode('utf-8')
+        digest = hmac.new(self.secret.encode('utf-8'), message, hashlib.sha256).digest()
+        return random.Random(int.from_bytes(digest[:8], 'big'))
+
+    def _cached(self, key, date, settings_hash):
+        """可以直接使用的缓存值：过去的日期总是使用当时的值，今天及以后要求设置相同（调用方需持有锁）"""
+        value = self.entries.get(key)
+        if value is None or (value[2] != settings_hash and date >= self.today()):
+            return None
+        return tuple(value[:2])
+
+    def peek(self, kind, date, settings_hash, generate):
+        """获取某天的 (开始分钟, 结束分钟) 但不写入缓存：已有缓存时返回缓存值，否则返回该天种子生成的值"""
+        with self.lock:
+            value = self._cached(f"{kind}|{date.isoformat()}", date, settings_hash)
+        if value is not None:
+            return value
+        return tuple(generate(self.rng(kind, date, settings_hash)))
+
+    def get_or_create(self, kind, date, settings_hash, generate):
+        """获取某天的 (开始分钟, 结束分钟)，没有缓存时用 generate(rng) 生成并保存
+
+        返回 ((开始分钟, 结束分钟), 是否新生成)。
+        """
+        key = f"{kind}|{date.isoformat()}"
+        with self.lock:
+            value = self._cached(key, date, settings_hash)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value, False
+            self.misses += 1
+            value = tuple(generate(self.rng(kind, date, settings_hash)))
+            self.entries[key] = list(value) + [settings_hash]
+            self.entries.move_to_end(key)
+            self._evict()
+            self.save()
+            return value, True
+
+    def _evict(self):
+        if self.max_age_days:
+            oldest = (self.today() - datetime.timedelta(days=self.max_age_days)).isoformat()
+            for key in [key for key in self.entries if key.split("|")[1] < oldest]:
+                del self.entries[key]
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate_from(self, date):
+        """清除date及以后日期的条目（设置变化时调用），返回清除的条目数"""
+        first = date.isoformat()
+        with self.lock:
+            keys = [key for key in self.entries if key.split("|")[1] >= first]
+            for key in keys:
+                del self.entries[key]
+            if keys:
+                self.save()
+            return len(keys)
+
+    def summary(self):
+        return f"条目: {len(self.entries)} | 命中: {self.hits} | 生成: {self.misses}"
+
+
+class ScheduleSimulator:
+    """排程模拟器：不必等待真实的日子过去，一次生成N周的工作安排并统计分布
+
+    规则与工作模式和DayPlanner一致：工作时间和午休时间的随机偏移与修正（ScheduleStore.random_window）、保存时间的
+    工作结束前调整、"最小保存延迟 + 1分钟"的打开缓冲、午休开始时保存和午休期间打开推迟、
+    下一次打开早于保存时覆盖保存时间，并按工作日历跳过非工作日。
+    安装numpy时所有工作日一起向量化计算（毫秒级，泊松模型除外），否则逐日用DayPlanner生成计划后统计其中的动作，
+    结果分布相同。
+    指定window_provider(类型, 日期)时每天的工作('work')和午休('lunch')时间（分钟）由它提供，
+    例如取自排程缓存，使预览与实际运行的时间一致。
+    """
+
+    DAY_FIELDS = ['date', 'work_start', 'work_end', 'lunch_start', 'lunch_end', 'opens', 'saves',
+                  'superseded_saves', 'end_clamped_saves', 'lunch_saves', 'lunch_deferred_opens']
+
+    def __init__(self, calendar, work_start=(9, 0), work_end=(18, 0), work_random_range=20,
+                 lunch_enabled=True, lunch_start=(12, 0), lunch_end=(13, 30), lunch_random_range=5,
+                 save_delay=(20, 50), file_interval=(30, 60), seed=None, model=None, window_provider=None):
+        self.calendar = calendar
+        self.work_start = work_start[0] * 60 + work_start[1]
+        self.work_end = work_end[0] * 60 + work_end[1]
+        self.work_random_range = work_random_range
+        self.lunch_enabled = lunch_enabled
+        self.lunch_start = lunch_start[0] * 60 + lunch_start[1]
+        self.lunch_end = lunch_end[0] * 60 + lunch_end[1]
+        self.lunch_random_range = lunch_random_range
+        planner = DayPlanner(save_delay[0], save_delay[1], file_interval[0], file_interval[1], model=model)
+        self.save_delay_min, self.save_delay_max = planner.save_delay_min, planner.save_delay_max
+        self.file_interval_min, self.file_interval_max = planner.file_interval_min, planner.file_interval_max
+        self.model = planner.model
+        self.seed = seed
+        self.window_provider = window_provider
+
+    @classmethod
+    def from_config(cls, config, calendar, seed=None):
+        """根据配置文件内容创建模拟器"""
+        lunch = config.get("lunch_break", {})
+        activity = config.get("activity_model", {})
+        model = ActivityModel(activity.get("type", "uniform"),
+                              config.get("file_interval_min", 30), config.get("file_interval_max", 60),
+                              activity.get("lognormal_sigma", 0.5), activity.get("gamma_shape", 2.0),
+                              activity.get("hourly_profile"), activity.get("weekday_profiles"))
+        return cls(calendar,
+                   work_start=(config.get("work_start_hour", 9), config.get("work_start_minute", 0)),
+                   work_end=(config.get("work_end_hour", 18), config.get("work_end_minute", 0)),
+                   work_random_range=config.get("work_time_random_range", 20),
+                   lunch_enabled=lunch.get("enabled", True),
+                   lunch_start=(lunch.get("start_hour", 12), lunch.get("start_minute", 0)),
+                   lunch_end=(lunch.get("end_hour", 13), lunch.get("end_minute", 30)),
+                   lunch_random_range=lunch.get("random_range", 5),
+                   save_delay=(config.get("save_delay_min", 20), config.get("save_delay_max", 50)),
+                   file_interval=(config.get("file_interval_min", 30), config.get("file_interval_max", 60)),
+                   seed=seed, model=model)
+
+    def _work_days(self, start_date, weeks):
+        return [day for day in (start_date + datetime.timedelta(days=i) for i in range(weeks * 7))
+                if self.calendar.is_work_day(day)]
+
+    def _simulate_numpy(self, work_days):
+        """所有工作日一起向量化计算，每一步处理所有天的第k次打开"""
+        rng = np.random.default_rng(self.seed)
+        count = len(work_days)
+        window_arrays = []
+        for kind, base_start, base_end, random_range, min_length in (
+                ('work', self.work_start, self.work_end, self.work_random_range, 60),
+                ('lunch', self.lunch_start, self.lunch_end, self.lunch_random_range, 30)):
+            if self.window_provider is not None:
+                windows = np.array([self.window_provider(kind, day) for day in work_days], dtype=float).reshape(count, 2)
+                window_arrays.append((windows[:, 0] * 60.0, windows[:, 1] * 60.0))
+                continue
+            start = np.clip(base_start + rng.integers(-random_range, random_range + 1, count), 0, 1439)
+            end = np.clip(base_end + rng.integers(-random_range, random_range + 1, count), 0, 1439)
+            fix = end <= start
+            end = np.where(fix, start + min_length, end)
+            overflow = end > 1439
+            start = np.where(overflow, 1439 - min_length, start)
+            end = np.where(overflow, 1439, end)
+            window_arrays.append((start * 60.0, end * 60.0))
+        (work_start, work_end), (lunch_start, lunch_end) = window_arrays
+        has_lunch = np.full(count, bool(self.lunch_enabled))
+
+        counts = {field: np.zeros(count, dtype=np.int64) for field in self.DAY_FIELDS[5:]}
+        required = (self.save_delay_min + DayPlanner.OPEN_BUFFER_MINUTES) * 60
+        open_at = work_start.copy()
+        active = np.ones(count, dtype=bool)
+        next_deferred = np.zeros(count, dtype=bool)
+        forced = True
+        while active.any():
+            deferred = next_deferred | (active & has_lunch & (lunch_start <= open_at) & (open_at < lunch_end))
+            open_at = np.where(deferred, lunch_end, open_at)
+            active &= (open_at < work_end) & (forced | (work_end - open_at > required))
+            forced = False
+            counts['opens'] += active
+            counts['lunch_deferred_opens'] += active & deferred
+
+            save_at = open_at + np.floor(rng.uniform(self.save_delay_min, self.save_delay_max, count) * 60)
+            clamped = save_at > work_end
+            save_at = np.where(clamped, work_end - DayPlanner.SAVE_END_MARGIN, save_at)
+            save_at = np.where(save_at <= open_at, open_at + DayPlanner.LATE_SAVE_DELAY, save_at)
+            next_open = open_at + self.model.interval_array(rng, count) * 60
+            has_next = next_open + required <= work_end
+            lunch_save = has_lunch & (open_at < lunch_start) & (lunch_start <= save_at)
+            save_at = np.where(lunch_save, lunch_start, save_at)
+            next_deferred = has_next & has_lunch & (lunch_start <= next_open) & (next_open < lunch_end)
+            next_open = np.where(next_deferred, lunch_end, next_open)
+            saved = active & (~has_next | (save_at <= next_open))
+            counts['saves'] += saved
+            counts['superseded_saves'] += active & ~saved
+            counts['end_clamped_saves'] += saved & clamped
+            counts['lunch_saves'] += saved & lunch_save
+            open_at = next_open
+            active &= has_next
+
+        days = []
+        for i, day in enumerate(work_days):
+            row = {'date': day.isoformat(),
+                   'work_start': self._clock(work_start[i]), 'work_end': self._clock(work_end[i]),
+                   'lunch_start': self._clock(lunch_start[i]) if self.lunch_enabled else "",
+                   'lunch_end': self._clock(lunch_end[i]) if self.lunch_enabled else ""}
+            row.update({field: int(values[i]) for field, values in counts.items()})
+            days.append(row)
+        return days
+
+    def _simulate_python(self, work_days):
+        """逐日用DayPlanner生成当天的计划并统计其中的动作"""
+        rng = random.Random(self.seed)
+        planner = DayPlanner(self.save_delay_min, self.save_delay_max, self.file_interval_min, self.file_interval_max,
+                             rng=rng, model=self.model)
+        days = []
+        for day in work_days:
+            if self.window_provider is not None:
+                start, end = self.window_provider('work', day)
+            else:
+                start, end = ScheduleStore.random_window(rng, self.work_start, self.work_end, self.work_random_range, 60)
+            lunch_start = lunch_end = None
+            if self.lunch_enabled:
+                if self.window_provider is not None:
+                    lunch_start, lunch_end = self.window_provider('lunch', day)
+                else:
+                    lunch_start, lunch_end = ScheduleStore.random_window(rng, self.lunch_start, self.lunch_end,
+                                                                         self.lunch_random_range, 30)
+                lunch_start, lunch_end = lunch_start * 60, lunch_end * 60
+            row = {'date': day.isoformat(), 'work_start': self._clock(start * 60), 'work_end': self._clock(end * 60),
+                   'lunch_start': self._clock(lunch_start) if lunch_start is not None else "",
+                   'lunch_end': self._clock(lunch_end) if lunch_end is not None else ""}
+            midnight = datetime.datetime.combine(day, datetime.time())
+
+            def at(seconds):
+                return midnight + datetime.timedelta(seconds=seconds) if seconds is not None else None
+
+            plan = planner.plan(at(start * 60), at(end * 60), at(lunch_start), at(lunch_end))
+            opens, saves = plan.count('open'), plan.count('save')
+            row.update(opens=opens, saves=saves, superseded_saves=opens - saves)
+            row.update({field: planner.adjustments[field] for field in self.DAY_FIELDS[8:]})
+            days.append(row)
+        return days
+
+    @staticmethod
+    def _clock(seconds):
+        seconds = int(seconds)
+        return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
+
+    def run(self, weeks=4, start_date=None, use_numpy=True):
+        """模拟从start_date（默认今天）开始的N周，返回ScheduleSimulation"""
+        started = time.perf_counter()
+        work_days = self._work_days(start_date or datetime.date.today(), weeks)
+        # 泊松模型的打开时间与一天中的时刻有关，按天生成
+        if use_numpy and np is not None and work_days and self.model.kind != 'poisson':
+            days, engine = self._simulate_numpy(work_days), "numpy"
+        else:
+            days, engine = self._simulate_python(work_days), "python"
+        return ScheduleSimulation(days, weeks, engine, time.perf_counter() - started)
+
+
+class ScheduleSimulation:
+    """排程模拟结果：每个工作日一行统计，以及汇总分布"""
+
+    def __init__(self, days, weeks, engine, elapsed):
+        self.days = days
+        self.weeks = weeks
+        self.engine = engine
+        self.elapsed = elapsed
+
+    @staticmethod
+    def _distribution(values):
+        if not values:
+            return {"mean": 0, "min": 0, "p50": 0, "p90": 0, "max": 0}
+        ordered = sorted(values)
+        return {"mean": round(sum(ordered) / len(ordered), 2), "min": ordered[0],
+                "p50": ordered[len(ordered) // 2], "p90": ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))],
+                "max": ordered[-1]}
+
+    def summary(self):
+        totals = {field: sum(day[field] for day in self.days) for field in ScheduleSimulator.DAY_FIELDS[5:]}
+        return {
+            "weeks": self.weeks,
+            "work_days": len(self.days),
+            "engine": self.engine,
+            "elapsed_ms": round(self.elapsed * 1000, 2),
+            "opens_per_day": self._distribution([day['opens'] for day in self.days]),
+            "saves_per_day": self._distribution([day['saves'] for day in self.days]),
+            "totals": totals
+        }
+
+    def summary_text(self):
+        summary = self.summary()
+        opens, saves, totals = summary["opens_per_day"], summary["saves_per_day"], summary["totals"]
+        return (f"模拟 {self.weeks} 周，共 {summary['work_days']} 个工作日（{self.engine}，{summary['elapsed_ms']}毫秒）\n"
+                f"每天打开: 平均 {opens['mean']} 次，最少 {opens['min']}，中位 {opens['p50']}，最多 {opens['max']}\n"
+                f"每天保存: 平均 {saves['mean']} 次，最少 {saves['min']}，中位 {saves['p50']}，最多 {saves['max']}\n"
+                f"被下一次打开覆盖的保存: {totals['superseded_saves']} 次\n"
+                f"因工作结束提前的保存: {totals['end_clamped_saves']} 次\n"
+                f"午休冲突: 午休前保存 {totals['lunch_saves']} 次，推迟到午休后的打开 {totals['lunch_deferred_opens']} 次")
+
+    def to_csv(self, path):
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=ScheduleSimulator.DAY_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.days)
+
+    def to_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"summary": self.summary(), "days": self.days}, f, ensure_ascii=False, indent=2)
+
+
+def run_simulation_cli(argv):
+    """命令行模拟入口：python activity_tracker.py --simulate 8 --output schedule.csv"""
+    import argparse
+    parser = argparse.ArgumentParser(description="模拟多周的工作排程（不打开界面）")
+    parser.add_argument("--simulate", type=int, metavar="WEEKS", default=4, help="模拟的周数")
+    parser.add_argument("--start", help="开始日期 YYYY-MM-DD（默认今天）")
+    parser.add_argument("--seed", type=int, help="随机种子（相同种子结果相同）")
+    parser.add_argument("--config", help="配置文件路径（默认使用程序目录下的 config.json）")
+    parser.add_argument("--output", action="append", default=[], help="导出结果（.csv 或 .json，可以指定多次）")
+    parser.add_argument("--no-numpy", action="store_true", help="不使用numpy（逐日计算）")
+    parser.add_argument("--benchmark-models", action="store_true", help="测量各打开间隔模型的生成速度")
+    args = parser.parse_args(argv)
+
+    if args.benchmark_models:
+        for kind, rate in ActivityModel.benchmark().items():
+            print(f"{kind}: {rate / 1e6:.2f}M 事件/秒")
+        return 0
+
+    config_path = args.config
+    if not config_path:
+        base_dir = os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else os.path.abspath(__file__))
+        config_path = os.path.join(base_dir, "config.json")
+    config = {}
+    if os.path.exists(config_path):
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+    work_calendar = config.get("work_calendar", {})
+    imported_holidays, imported_work_days = set(), set()
+    if work_calendar.get("import_files"):
+        cache_path = work_calendar.get("import_cache_path") or os.path.join(
+            os.path.dirname(os.path.abspath(config_path)), "calendar_cache.json")
+        importer = HolidayCalendarImporter(cache_path)
+        imported_holidays, imported_work_days = importer.load(work_calendar["import_files"])
+        for path, error in importer.errors:
+            print(f"节假日日历导入失败: {path} | {error}")
+    calendar = WorkCalendar(work_calendar.get("skip_weekends", True), work_calendar.get("work_dates", []),
+                            work_calendar.get("holiday_dates", []), imported_holidays=imported_holidays,
+                            imported_work_days=imported_work_days)
+
+    start_date = datetime.date.fromisoformat(args.start) if args.start else None
+    simulation = ScheduleSimulator.from_config(config, calendar, args.seed).run(args.simulate, start_date,
+                                                                               use_numpy=not args.no_numpy)
+    print(simulation.summary_text())
+    for output_path in args.output:
+        if output_path.lower().endswith(".json"):
+            simulation.to_json(output_path)
+        else:
+            simulation.to_csv(output_path)
+        print(f"已导出: {output_path}")
+    return 0
+
+
 class ActivityTracker:
     def __init__(self, root):
         try:
@@ -163,6 +4007,8 @@ class ActivityTracker:
         self.task_thread = None
         self.running = False
         self.cancel_event = threading.Event()
+        self.event_scheduler = None  # 工作模式的事件调度器（进入工作模式时创建）
+        self.day_plan = None  # 今天的工作计划（进入工作模式时生成，可查询和导出为JSON）
 
         # 存储当前周期的实际保存时间（包含随机延迟）
         self.actual_save_time = None
@@ -171,8 +4017,9 @@ class ActivityTracker:
         self.current_opened_file = None
         self.current_opened_time = None
 
-        # 当日工作时间缓存（确保每天的工作时间只计算一次）
-        self.daily_work_times = {}  # 格式: {日期字符串: (工作开始时间, 工作结束时间)}
+        # 每日排程缓存（持久化，确保每天的工作/午休时间只计算一次，重启后不变）
+        self.schedule_store = None
+        self._schedule_store_key = None
 
         # 预定的文件打开时间（确保预计时间与实际时间一致）
         self.next_file_open_time = None
@@ -201,6 +4048,39 @@ class ActivityTracker:
         self.window_check_interval = 1.0
         self.activation_delay = 0.5
         self.close_verification_delay = 1.5
+        self.window_snapshot_ttl = 1.0  # 窗口快照有效期（秒），有效期内的查询不重新枚举窗口
+        self.window_backend_name = "pyautogui"  # 窗口后端：pyautogui / fake（模拟窗口，用于测试）
+        self.window_backend = PyautoguiWindowBackend()  # 窗口后端（可替换，便于测试）
+        self.window_inventory = WindowInventory(self.window_backend, self.window_snapshot_ttl)
+        self.launch_registry = LaunchRegistry()  # 打开的文件 -> 窗口句柄/进程ID
+        self.open_wait_timeout = 10.0  # 等待打开文件窗口出现的默认上限（秒），窗口出现后立即继续
+        self.open_wait_timeouts = {    # 按扩展名设置的等待上限（秒），启动较慢的程序需要更长时间
+            ".docx": 30.0, ".doc": 30.0, ".xlsx": 30.0, ".xls": 30.0,
+            ".pptx": 30.0, ".ppt": 30.0, ".wps": 30.0, ".pdf": 20.0, ".xmind": 30.0
+        }
+        self.open_settle_delay = 0.5  # 窗口出现后等待文档加载的时间（秒）
+        self.pyautogui_pause = 0.1  # pyautogui每个操作后的暂停时间（秒）
+        self.clock = SystemClock()  # 工作线程的时钟（当前时间、睡眠、等待事件），可替换为VirtualClock加速运行
+        self.open_waiter = OpenWaiter(self.window_inventory, self.open_wait_timeout,
+                                      self.open_wait_timeouts, self.open_settle_delay,
+                                      sleep=self.clock.sleep, clock=self.clock.monotonic)
+        if PYAUTOGUI_AVAILABLE:
+            pyautogui.PAUSE = self.pyautogui_pause
+        self.save_verify_timeout = 5.0  # 保存后确认文件写入的最长等待时间（秒）
+        self.save_check_dirty_marker = True  # 是否同时检查窗口标题中的未保存标记（如"*"）
+        self.save_verifier = SaveVerifier(self.window_inventory, self.save_verify_timeout, self.save_check_dirty_marker,
+                                          sleep=self.clock.sleep, clock=self.clock.monotonic)
+
+        # 应用程序注册表配置变量（在内置定义之上追加或覆盖）
+        self.app_registry_config = {
+            "apps": {},                      # 软件类型 -> {"name": 显示名称, "patterns": [窗口标题关键词]}
+            "excluded_patterns": [],         # 追加的不应关闭的窗口关键词
+            "self_protection_keywords": [],  # 追加的自身程序关键词
+            "document_apps": [],             # 追加的文档编辑器关键词（批量保存时使用）
+            "extension_programs": {}         # 扩展名 -> 可能使用的程序名称
+        }
+        self.app_registry = None  # 编译后的注册表（配置变化时重新编译）
+        self._app_registry_key = None
 
         # 用户界面配置变量
         self.show_close_progress = True
@@ -211,6 +4091,22 @@ class ActivityTracker:
         self.skip_weekends = True
         self.work_dates = []  # 调休工作日期列表 (格式: "MM-DD"每年生效 或 "YY-MM-DD"指定年份)
         self.holiday_dates = []  # 节假日日期列表 (格式: "MM-DD"每年生效 或 "YY-MM-DD"指定年份)
+        self.calendar_import_files = []  # 导入的节假日日历文件 (.ics / .csv / .json)
+        self.calendar_import_cache_path = ""  # 导入结果缓存文件路径（空则使用默认路径）
+        self.work_calendar = None  # 编译好的工作日历（加载配置时置空，下次使用时重建）
+
+        # 排程缓存配置变量
+        self.schedule_store_path = ""  # 缓存文件路径（空则使用默认路径）
+        self.schedule_store_secret = ""  # 生成每日随机时间的密钥（空则使用缓存文件中自动生成的密钥）
+        self.schedule_store_max_entries = 200  # 最多保存的条目数（每个工作日两条：工作时间和午休时间）
+        self.schedule_store_max_age_days = 60  # 早于该天数的条目被丢弃
+
+        # 打开间隔模型配置变量
+        self.activity_model_type = "uniform"  # uniform / lognormal / gamma / poisson
+        self.activity_lognormal_sigma = 0.5
+        self.activity_gamma_shape = 2.0
+        self.activity_hourly_profile = list(ActivityModel.DEFAULT_HOURLY_PROFILE)  # poisson: 0-23点的相对强度
+        self.activity_weekday_profiles = {}  # poisson: 按星期几覆盖小时强度
 
         # 日志功能配置变量
         self.logging_enabled = False  # 默认关闭日志功能
@@ -232,6 +4128,54 @@ class ActivityTracker:
         # 文件扫描配置变量
         self.scan_subfolders = False  # 是否递归扫描子文件夹，默认为False
 
+        # 文件扫描规则配置变量（文件名/目录名通配符，"re:"开头为正则表达式）
+        self.include_patterns = []  # 包含规则，为空表示不限制
+        self.exclude_patterns = list(ScanRules.DEFAULT_EXCLUDE_PATTERNS)  # 排除的文件
+        self.exclude_dirs = list(ScanRules.DEFAULT_EXCLUDE_DIRS)  # 排除的目录（不会进入扫描）
+        self.scan_max_depth = -1  # 最大递归深度，-1表示不限制
+        self._scan_rules = None  # 编译后的扫描规则
+        self._scan_rules_key = None
+
+        # 文件索引配置变量
+        self.file_index_enabled = True  # 是否启用候选文件持久化索引
+        self.file_index_path = ""  # 索引数据库路径（空则使用配置文件同目录下的file_index.db）
+        self.file_index_max_age = 60  # 索引有效期（分钟），超过后重新扫描对应文件夹
+        self.file_index_max_file_size = 100  # 参与随机选择的最大文件大小（MB）
+        self.file_index = None  # 索引实例（延迟创建）
+        self.last_scan_stats = None  # 最近一次扫描的统计信息
+
+        # 文件扫描预算配置变量（直接扫描选择文件时使用，0表示不限制）
+        self.scan_time_budget = 0  # 单次选择文件的扫描时间预算（秒）
+        self.scan_entry_budget = 0  # 单次选择文件最多访问的目录条目数
+        self.scan_max_workers = 4  # 并行扫描的最大线程数（1表示顺序扫描）
+        self.dir_cache_enabled = True  # 是否缓存目录列举结果（目录修改时间未变时直接复用）
+        self.dir_cache_path = ""  # 目录缓存数据库路径（空则使用配置文件同目录下的dir_cache.db）
+        self.dir_cache = None  # 目录缓存实例（延迟创建）
+        self.scan_result_max_age = 300  # 扫描结果的有效期（秒），有效期内启动检查和首次选择文件共用一次扫描
+        self.scan_result = None  # 最近一次的扫描结果
+        self.title_matcher = TitleMatcher()  # 窗口标题 -> 项目文件匹配器
+
+        # 文件监视器配置变量
+        self.file_watcher_enabled = True  # 任务运行期间是否监视项目文件夹的变化
+        self.file_watcher_poll_interval = 10.0  # 无法使用系统通知时轮询目录修改时间的间隔（秒）
+        self.file_watcher_debounce = 0.5  # 合并突发事件的静默时间（秒）
+        self.file_watcher = None  # 监视器实例
+
+        # 文件选择配置变量
+        self.selection_mode = "uniform"  # 选择方式：uniform（均匀随机）/ weighted（按权重）/ shuffle_bag（不重复洗牌）
+        self.selection_recency_half_life = 30  # 修改时间权重的半衰期（天），0表示不考虑修改时间
+        self.selection_min_recency_weight = 0.1  # 修改时间权重的下限
+        self.selection_size_soft_limit = 20  # 超过该大小（MB）的文件按比例降低权重，0表示不考虑大小
+        self.selection_extension_weights = {}  # 扩展名 -> 权重倍数
+        self.pinned_files = []  # 置顶文件列表
+        self.pinned_weight = 5.0  # 置顶文件的权重倍数
+        self.selection_opened_factor = 0.5  # 文件每被打开一次，权重乘以该倍数
+        self.weighted_selector = None  # 加权选择器实例（延迟创建）
+        self.shuffle_bag_path = ""  # 洗牌进度日志路径（空则使用配置文件同目录下的shuffle_bag.log）
+        self.coverage_report_days = 7  # 停止任务时统计最近多少天的文件覆盖率
+        self.shuffle_bag = None  # 洗牌选择器实例（延迟创建）
+        self._selection_policy_key = None
+
     def setup_logging(self):
         """初始化日志系统"""
         if not self.logging_enabled:
@@ -394,6 +4338,12 @@ class ActivityTracker:
             activebackground="#FF9370")
         self.close_btn.pack(side="left", padx=5)
 
+        self.preview_btn = Button(button_frame, text="预览排程", command=self.preview_schedule,
+            bg="#B0A8E0", fg="white",
+            relief="raised", bd=2, padx=12, pady=6, cursor="hand2",
+            activebackground="#A59CDB")
+        self.preview_btn.pack(side="left", padx=5)
+
     def on_time_setting_changed(self, *args):
         """时间设置变化的回调方法（带防抖机制）"""
         # 如果程序正在运行，不处理时间设置变化
@@ -537,11 +4487,30 @@ class ActivityTracker:
                     "file_interval_min": 30.0,
                     "file_interval_max": 60.0,
 
+                    # 打开间隔模型配置
+                    "activity_model": {
+                        "type": "uniform",  # uniform / lognormal / gamma / poisson
+                        "lognormal_sigma": 0.5,
+                        "gamma_shape": 2.0,
+                        "hourly_profile": list(ActivityModel.DEFAULT_HOURLY_PROFILE),  # poisson: 0-23点的相对强度
+                        "weekday_profiles": {}  # poisson: 按星期几覆盖小时强度，如 {"fri": [24个数]}
+                    },
+
                     # 工作日历配置
                     "work_calendar": {
                         "skip_weekends": True,
                         "work_dates": [],  # 调休工作日期 (格式: "MM-DD"每年生效 或 "YY-MM-DD"指定年份)
-                        "holiday_dates": []  # 节假日日期 (格式: "MM-DD"每年生效 或 "YY-MM-DD"指定年份)
+                        "holiday_dates": [],  # 节假日日期 (格式: "MM-DD"每年生效 或 "YY-MM-DD"指定年份)
+                        "import_files": [],  # 导入的节假日日历文件 (.ics / .csv / .json)
+                        "import_cache_path": ""  # 导入结果缓存文件路径（空则使用默认路径）
+                    },
+
+                    # 排程缓存配置
+                    "schedule_store": {
+                        "path": "",  # 缓存文件路径（空则使用默认路径）
+                        "secret": "",  # 生成每日随机时间的密钥（空则自动生成并保存在缓存文件中）
+                        "max_entries": 200,
+                        "max_age_days": 60
                     },
 
                     # 智能关闭功能配置
@@ -564,7 +4533,27 @@ class ActivityTracker:
                     "program_detection": {
                         "window_check_interval": 1.0,
                         "activation_delay": 0.5,
-                        "close_verification_delay": 1.5
+                        "close_verification_delay": 1.5,
+                        "window_snapshot_ttl": 1.0,
+                        "window_backend": "pyautogui",
+                        "open_wait_timeout": 10.0,
+                        "open_wait_timeouts": {
+                            ".docx": 30.0, ".doc": 30.0, ".xlsx": 30.0, ".xls": 30.0,
+                            ".pptx": 30.0, ".ppt": 30.0, ".wps": 30.0, ".pdf": 20.0, ".xmind": 30.0
+                        },
+                        "open_settle_delay": 0.5,
+                        "pyautogui_pause": 0.1,
+                        "save_verify_timeout": 5.0,
+                        "save_check_dirty_marker": True
+                    },
+
+                    # 应用程序注册表配置（在内置定义之上追加或覆盖）
+                    "app_registry": {
+                        "apps": {},                      # 软件类型 -> {"name": 显示名称, "patterns": [窗口标题关键词]}
+                        "excluded_patterns": [],         # 追加的不应关闭的窗口关键词
+                        "self_protection_keywords": [],  # 追加的自身程序关键词
+                        "document_apps": [],             # 追加的文档编辑器关键词（批量保存时使用）
+                        "extension_programs": {}         # 扩展名 -> 可能使用的程序名称
                     },
 
                     # 用户界面配置
@@ -592,7 +4581,50 @@ class ActivityTracker:
                             ".pptx", ".ppt", ".css", ".json", ".xml",
                             ".php", ".c", ".h", ".cs", ".go", ".vue", 'xmind'
                         ],  # 允许打开的文件后缀白名单
-                        "scan_subfolders": False  # 是否递归扫描子文件夹，默认关闭
+                        "scan_subfolders": False,  # 是否递归扫描子文件夹，默认关闭
+                        "include_patterns": [],    # 包含规则（通配符或"re:"开头的正则），为空表示不限制
+                        "exclude_patterns": ScanRules.DEFAULT_EXCLUDE_PATTERNS,  # 排除的文件
+                        "exclude_dirs": ScanRules.DEFAULT_EXCLUDE_DIRS,          # 排除的目录（不会进入扫描）
+                        "max_depth": -1            # 最大递归深度，-1表示不限制
+                    },
+
+                    # 文件扫描配置
+                    "file_scanning": {
+                        "time_budget_seconds": 0,  # 直接扫描选择文件时的时间预算（秒），0表示不限制
+                        "entry_budget": 0,         # 直接扫描选择文件时最多访问的条目数，0表示不限制
+                        "max_workers": 4,          # 并行扫描的最大线程数，1表示顺序扫描
+                        "dir_cache_enabled": True, # 是否缓存目录列举结果（目录修改时间未变时直接复用）
+                        "dir_cache_path": "",      # 目录缓存数据库路径（空则使用配置文件同目录下的dir_cache.db）
+                        "result_max_age_seconds": 300  # 扫描结果有效期（秒），启动检查和首次选择文件共用一次扫描
+                    },
+
+                    # 文件监视器配置
+                    "file_watcher": {
+                        "enabled": True,               # 任务运行期间是否监视项目文件夹的变化
+                        "poll_interval_seconds": 10,   # 无法使用系统通知时轮询目录修改时间的间隔（秒）
+                        "debounce_seconds": 0.5        # 合并突发事件的静默时间（秒）
+                    },
+
+                    # 文件索引配置
+                    "file_index": {
+                        "enabled": True,           # 是否启用候选文件持久化索引
+                        "db_path": "",             # 索引数据库路径（空则使用配置文件同目录下的file_index.db）
+                        "max_age_minutes": 60,     # 索引有效期（分钟）
+                        "max_file_size_mb": 100    # 参与随机选择的最大文件大小（MB）
+                    },
+
+                    # 文件选择配置
+                    "file_selection": {
+                        "mode": "uniform",                # 选择方式：uniform（均匀随机）/ weighted（按权重）/ shuffle_bag（不重复洗牌）
+                        "recency_half_life_days": 30,     # 修改时间权重的半衰期（天），0表示不考虑修改时间
+                        "min_recency_weight": 0.1,        # 修改时间权重的下限
+                        "size_soft_limit_mb": 20,         # 超过该大小的文件按比例降低权重，0表示不考虑大小
+                        "extension_weights": {},          # 扩展名权重倍数，例如 {".docx": 2.0}
+                        "pinned_files": [],               # 置顶文件列表
+                        "pinned_weight": 5.0,             # 置顶文件的权重倍数
+                        "opened_weight_factor": 0.5,      # 文件每被打开一次，权重乘以该倍数
+                        "shuffle_bag_path": "",           # 洗牌进度日志路径（空则使用配置文件同目录下的shuffle_bag.log）
+                        "coverage_report_days": 7         # 停止任务时统计最近多少天的文件覆盖率
                     }
                 }
 
@@ -611,131 +4643,508 @@ class ActivityTracker:
         Args:
             recursive (bool): 是否递归扫描子文件夹，默认为True
         """
-        all_files = []
+        if self.selection_mode == "weighted":
+            try:
+                return self.get_weighted_random_file(recursive)
+            except Exception as e:
+                self.log_error("加权选择失败", f"错误: {str(e)}，改为均匀随机选择")
+        elif self.selection_mode == "shuffle_bag":
+            try:
+                return self.get_shuffle_bag_file(recursive)
+            except Exception as e:
+                self.log_error("洗牌选择失败", f"错误: {str(e)}，改为均匀随机选择")
+
+        # 文件监视器运行时直接从内存中的候选集合选择
+        watcher = self.get_active_watcher(recursive)
+        if watcher:
+            selected_file = watcher.candidates.choice()
+            if selected_file:
+                self.log_info("文件随机选择", f"监视器候选文件数量: {len(watcher.candidates)} | 已选择: {os.path.basename(selected_file)}")
+                return selected_file
+
+            self.log_warning("文件选择", "所有配置文件夹中未找到符合条件的文件")
+            return None
+
+        # 有效期内的扫描结果（例如启动任务时的检查）直接复用
+        scan_result = self.get_fresh_scan_result(recursive)
+        if scan_result:
+            selected_file = scan_result.candidates.choice()
+            if selected_file:
+                self.log_info("文件随机选择", f"复用扫描结果，候选文件数量: {len(scan_result)} | 已选择: {os.path.basename(selected_file)}")
+                return selected_file
+
+        # 其次从持久化索引中选择，避免每次都遍历目录
+        index = self.get_file_index()
+        if index:
+            try:
+                self.refresh_file_index(recursive)
+                record = index.random_pick(**self._get_index_filters())
+                if record:
+                    self.log_info("文件随机选择", f"索引候选文件数量: {index.count(**self._get_index_filters())} | 已选择: {os.path.basename(record.path)}")
+                    return record.path
+
+                self.log_warning("文件选择", "所有配置文件夹中未找到符合条件的文件")
+                return None
+            except Exception as e:
+                self.log_error("索引选择失败", f"错误: {str(e)}，改为直接扫描文件夹")
 
-        # 收集所有文件夹中的文件
+        # 边扫描边做蓄水池抽样，不保存完整的候选列表
+        sampler = ReservoirSampler()
+        scanner = self.create_scanner(recursive, time_budget=self.scan_time_budget,
+                                      entry_budget=self.scan_entry_budget)
+
+        # 遍历所有文件夹中的文件
         for folder_var in self.folder_vars:
             folder_path = folder_var.get().strip()
             if not folder_path or not os.path.exists(folder_path):
                 continue
 
             try:
-                if recursive:
-                    # 递归扫描所有子文件夹
-                    for root, dirs, files in os.walk(folder_path):
-                        for file in files:
-                            self._process_file(file, root, all_files)
-                else:
-                    # 只扫描当前文件夹，不包含子文件夹
-                    try:
-                        files = os.listdir(folder_path)
-                        for file in files:
-                            file_path = os.path.join(folder_path, file)
-                            # 确保是文件，不是文件夹
-                            if os.path.isfile(file_path):
-                                self._process_file(file, folder_path, all_files)
-                    except (OSError, PermissionError):
-                        continue
+                for record in scanner.scan(folder_path):
+                    sampler.offer(record.path)
             except Exception as e:
                 self.update_status(f"获取文件夹 {folder_path} 内文件失败: {str(e)}", "orange")
                 continue
 
-        if all_files:
-            # 确保真正的随机选择
-            random.shuffle(all_files)  # 先打乱文件列表
-            selected_file = random.choice(all_files)
+            if scanner.budget_exhausted:
+                break
+
+        self.flush_dir_cache(scanner, [var.get().strip() for var in self.folder_vars if var.get().strip()])
+        self.log_scan_stats(scanner.stats)
+
+        if scanner.budget_exhausted:
+            self.log_info("扫描预算用尽", f"仅从已访问的 {scanner.stats.entries_seen} 个条目中选择文件")
 
+        if sampler.selected:
             # 记录选择过程（用于调试）
-            self.log_info("文件随机选择", f"候选文件数量: {len(all_files)} | 已选择: {os.path.basename(selected_file)}")
+            self.log_info("文件随机选择", f"候选文件数量: {sampler.count} | 已选择: {os.path.basename(sampler.selected)}")
 
-            return selected_file
+            return sampler.selected
         else:
             self.log_warning("文件选择", "所有配置文件夹中未找到符合条件的文件")
             return None
 
-    def _process_file(self, file, root, all_files):
-        """处理单个文件的过滤逻辑"""
-        # 构建完整文件路径
-        full_file_path = os.path.join(root, file)
+    def get_weighted_selector(self):
+        """获取加权选择器（权重配置变化时重新创建，保留已打开次数）"""
+        policy_key = (self.selection_recency_half_life, self.selection_min_recency_weight,
+                      self.selection_size_soft_limit, tuple(sorted(self.selection_extension_weights.items())),
+                      tuple(self.pinned_files), self.pinned_weight, self.selection_opened_factor)
+        if self.weighted_selector is None or self._selection_policy_key != policy_key:
+            policy = FileWeightPolicy(recency_half_life_days=self.selection_recency_half_life,
+                                      min_recency_weight=self.selection_min_recency_weight,
+                                      size_soft_limit_mb=self.selection_size_soft_limit,
+                                      extension_weights=self.selection_extension_weights,
+                                      pinned_files=self.pinned_files,
+                                      pinned_weight=self.pinned_weight)
+            selector = WeightedSelector(policy, opened_factor=self.selection_opened_factor)
+            if self.weighted_selector is not None:
+                selector.opened_counts = self.weighted_selector.opened_counts
+            self.weighted_selector = selector
+            self._selection_policy_key = policy_key
+        return self.weighted_selector
+
+    def _get_candidate_source(self, recursive, use_scan_result=True):
+        """获取候选文件来源：返回(来源标识, 加载候选记录的函数)
+
+        来源标识不变时候选文件没有变化，加权选择器无需重建；直接扫描时标识为None。
+        监视器和扫描结果的标识为 (来源, 候选集合, 版本)，只有版本前进时可以按变化增量更新。
+        """
+        watcher = self.get_active_watcher(recursive)
+        if watcher:
+            return ('watcher', watcher.candidates, watcher.candidates.version), watcher.candidates.records
+
+        scan_result = self.get_fresh_scan_result(recursive) if use_scan_result else None
+        if scan_result:
+            return ('scan_result', scan_result.candidates, scan_result.candidates.version), scan_result.candidates.records
+
+        index = self.get_file_index()
+        if index:
+            try:
+                self.refresh_file_index(recursive)
+                filters = self._get_index_filters()
+                source_key = ('index', index.db_path, index.generation, repr(sorted(filters.items())))
+                return source_key, lambda: index.query(**filters)
+            except Exception as e:
+                self.log_error("索引读取失败", f"错误: {str(e)}，改为直接扫描文件夹")
+
+        return None, lambda: [record for result in self.scan_folders(recursive) for record in result.records]
+
+    def _get_scan_result_signature(self, recursive):
+        """扫描结果的签名：项目文件夹、扫描方式或过滤条件变化后旧结果失效"""
+        folders = [var.get().strip() for var in self.folder_vars if var.get().strip()]
+        return (tuple(folders), self._get_index_signature(recursive))
+
+    def get_fresh_scan_result(self, recursive):
+        """获取有效期内且扫描条件一致的扫描结果，没有时返回None"""
+        result = self.scan_result
+        if result is None or result.recursive != recursive:
+            return None
+        if not result.is_fresh(self.scan_result_max_age, self._get_scan_result_signature(recursive)):
+            return None
+        return result
+
+    def get_scan_result(self, recursive, force=False):
+        """获取扫描结果：有效期内直接复用，否则从监视器、索引或直接扫描中构建一次
 
-        # 多重验证确保这是一个有效文件
+        Args:
+            recursive (bool): 是否递归扫描子文件夹
+            force (bool): 是否忽略有效期重新构建
+        """
+        if not force:
+            result = self.get_fresh_scan_result(recursive)
+            if result:
+                return result
+
+        start = time.time()
+        source_key, load_records = self._get_candidate_source(recursive, use_scan_result=False)
+        records = load_records()
+        source = source_key[0] if source_key else "scan"
+        folders = [var.get().strip() for var in self.folder_vars if var.get().strip()]
+        result = ScanResult(recursive, folders, records, elapsed=time.time() - start,
+                            signature=self._get_scan_result_signature(recursive), source=source)
+        self.scan_result = result
+        self.log_info("扫描结果", result.summary())
+        return result
+
+    def get_weighted_random_file(self, recursive=True):
+        """按权重从所有配置的文件夹中选择一个文件
+
+        候选文件没有变化时直接在树状数组上抽样，不需要逐个计算权重。
+        """
+        selector = self.get_weighted_selector()
+        source_key, load_records = self._get_candidate_source(recursive)
+        if source_key is None or selector.source_key != source_key:
+            if not self._apply_candidate_changes(selector, source_key):
+                selector.rebuild(load_records(), source_key)
+
+        selected_file = selector.pick()
+        if selected_file:
+            self.log_info("文件加权选择", f"候选文件数量: {len(selector)} | 总权重: {selector.total_weight:.2f} | "
+                                          f"已选择: {os.path.basename(selected_file)} (权重 {selector.weight_of(selected_file):.3f})")
+            return selected_file
+
+        self.log_warning("文件选择", "所有配置文件夹中未找到符合条件的文件")
+        return None
+
+    @staticmethod
+    def _apply_candidate_changes(selector, source_key):
+        """候选集合相同且只是版本前进时，把期间的增删逐个应用到加权选择器或洗牌选择器上，返回是否成功"""
+        old_key = selector.source_key
+        if (source_key is None or old_key is None or source_key[0] not in ('watcher', 'scan_result')
+                or old_key[:2] != source_key[:2]):
+            return False
+        changes = source_key[1].changes_since(old_key[2])
+        if changes is None:
+            return False
+        for path, record in changes:
+            if record is None:
+                selector.remove(path)
+            else:
+                selector.add(record)
+        selector.source_key = source_key
+        return True
+
+    def get_shuffle_bag(self):
+        """获取洗牌选择器（延迟创建并从日志恢复进度）"""
+        if self.shuffle_bag is None:
+            try:
+                log_path = self.shuffle_bag_path
+                if not log_path:
+                    log_path = os.path.join(os.path.dirname(os.path.abspath(self.config_path)), "shuffle_bag.log")
+                self.shuffle_bag = ShuffleBag(log_path)
+                self.log_info("洗牌进度加载", f"日志: {log_path} | 第 {self.shuffle_bag.round} 轮 | 本轮已打开: {len(self.shuffle_bag.dealt)} 个")
+            except Exception as e:
+                self.log_error("洗牌进度加载失败", f"错误: {str(e)}")
+                return None
+        return self.shuffle_bag
+
+    def get_shuffle_bag_file(self, recursive=True):
+        """从本轮尚未打开过的文件中随机选择一个，全部打开过后开始新一轮"""
+        bag = self.get_shuffle_bag()
+        if bag is None:
+            raise RuntimeError("洗牌选择器不可用")
+
+        source_key, load_records = self._get_candidate_source(recursive)
+        if source_key is None or bag.source_key != source_key:
+            if not self._apply_candidate_changes(bag, source_key):
+                bag.sync((record.path for record in load_records()), source_key)
+
+        selected_file = bag.pick()
+        if selected_file:
+            self.log_info("文件洗牌选择", f"第 {bag.round} 轮 | 本轮剩余: {bag.remaining}/{len(bag)} | 已选择: {os.path.basename(selected_file)}")
+            return selected_file
+
+        self.log_warning("文件选择", "所有配置文件夹中未找到符合条件的文件")
+        return None
+
+    def log_coverage_report(self, days=None):
+        """记录最近days天内被打开过的文件占候选文件的比例"""
+        bag = self.shuffle_bag
+        if bag is None or not len(bag):
+            return None
+        if days is None:
+            days = self.coverage_report_days
+        touched, total, ratio = bag.coverage(days)
+        self.log_info("文件覆盖率", f"最近 {days} 天打开过 {touched}/{total} 个文件 ({ratio:.1%})")
+        return touched, total, ratio
+
+    def create_scanner(self, recursive, time_budget=0, entry_budget=0):
+        """根据当前过滤配置创建文件扫描器"""
+        return ScandirScanner(self.allowed_file_extensions, recursive,
+                              time_budget=time_budget, entry_budget=entry_budget,
+                              rules=self.get_scan_rules(), dir_cache=self.get_dir_cache())
+
+    def get_dir_cache(self):
+        """获取目录列举缓存实例（延迟创建），未启用或创建失败时返回None"""
+        if not self.dir_cache_enabled:
+            return None
+
+        if self.dir_cache is None:
+            try:
+                db_path = self.dir_cache_path
+                if not db_path:
+                    db_path = os.path.join(os.path.dirname(os.path.abspath(self.config_path)), "dir_cache.db")
+                self.dir_cache = DirCache(db_path)
+                self.log_info("目录缓存", f"缓存数据库: {db_path}")
+            except Exception as e:
+                self.log_error("目录缓存创建失败", f"错误: {str(e)}，每次扫描都将重新列举目录")
+                self.dir_cache_enabled = False
+                return None
+
+        return self.dir_cache
+
+    def flush_dir_cache(self, scanner, roots):
+        """保存扫描过程中重新列举的目录"""
         try:
-            # 检查1: 确保路径存在
-            if not os.path.exists(full_file_path):
-                return
+            scanner.flush_cache(roots)
+        except Exception as e:
+            self.log_error("目录缓存保存失败", f"错误: {str(e)}")
 
-            # 检查2: 确保这是一个文件而不是文件夹
-            if not os.path.isfile(full_file_path):
-                return
+    def get_scan_rules(self):
+        """获取编译好的扫描规则（配置不变时复用同一个编译结果）"""
+        rules_key = (tuple(self.include_patterns), tuple(self.exclude_patterns),
+                     tuple(self.exclude_dirs), self.scan_max_depth)
+        if self._scan_rules is None or self._scan_rules_key != rules_key:
+            try:
+                self._scan_rules = ScanRules(self.include_patterns, self.exclude_patterns,
+                                             self.exclude_dirs, self.scan_max_depth)
+            except re.error as e:
+                self.log_error("扫描规则编译失败", f"错误: {str(e)}，使用默认规则")
+                self._scan_rules = ScanRules()
+            self._scan_rules_key = rules_key
+        return self._scan_rules
+
+    def log_scan_stats(self, stats):
+        """记录扫描统计信息"""
+        self.last_scan_stats = stats
+        self.log_info("扫描统计", stats.summary())
+
+    def get_file_index(self):
+        """获取候选文件索引实例（延迟创建），索引未启用或创建失败时返回None"""
+        if not self.file_index_enabled:
+            return None
 
-            # 检查3: 确保不是目录（双重保险）
-            if os.path.isdir(full_file_path):
-                return
+        if self.file_index is None:
+            try:
+                db_path = self.file_index_path
+                if not db_path:
+                    db_path = os.path.join(os.path.dirname(os.path.abspath(self.config_path)), "file_index.db")
+                self.file_index = FileIndex(db_path)
+                self.log_info("文件索引", f"索引数据库: {db_path}")
+            except Exception as e:
+                self.log_error("文件索引创建失败", f"错误: {str(e)}，将直接扫描文件夹")
+                self.file_index_enabled = False
+                return None
+
+        return self.file_index
+
+    def _get_index_signature(self, recursive):
+        """计算索引签名，扫描方式或后缀白名单变化时需要重建索引"""
+        extensions = sorted(set(ext.lower() for ext in self.allowed_file_extensions))
+        raw = json.dumps({'recursive': bool(recursive), 'extensions': extensions,
+                          'rules': self.get_scan_rules().signature}, sort_keys=True)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _get_index_filters(self):
+        """获取随机选择时使用的索引过滤条件"""
+        folders = [var.get().strip() for var in self.folder_vars if var.get().strip()]
+        return {
+            'folders': folders,
+            'extensions': self.allowed_file_extensions,
+            'max_size': int(self.file_index_max_file_size * 1024 * 1024)
+        }
 
-            # 检查4: 尝试获取文件大小（这会进一步确认文件有效性）
-            file_size = os.path.getsize(full_file_path)
-            if file_size < 0:  # 理论上文件大小不应该为负
-                return
+    def scan_folders(self, recursive, folders=None, scanner=None):
+        """并行扫描项目文件夹，返回与文件夹顺序一致的FolderScanResult列表
+
+        Args:
+            recursive (bool): 是否递归扫描子文件夹
+            folders (list): 需要扫描的文件夹，默认为所有有效的项目文件夹
+            scanner (ScandirScanner): 使用的扫描器，默认按当前过滤配置创建
+        """
+        if folders is None:
+            folders = [var.get().strip() for var in self.folder_vars if var.get().strip()]
+            folders = [folder for folder in folders if os.path.exists(folder)]
+        if scanner is None:
+            scanner = self.create_scanner(recursive)
+
+        engine = ParallelScanEngine(scanner, self.scan_max_workers)
+        results = engine.scan(folders)
+        self.flush_dir_cache(scanner, folders)
+
+        for result in results:
+            self.log_info("文件夹扫描耗时", f"文件夹: {result.folder} | 目录: {result.dirs_listed} | 文件: {len(result.records)} | 耗时: {result.elapsed:.2f}秒")
+        self.log_scan_stats(scanner.stats)
+
+        return results
+
+    def refresh_file_index(self, recursive, force=False):
+        """刷新过期或签名不一致的文件夹索引
+
+        Args:
+            recursive (bool): 是否递归扫描子文件夹
+            force (bool): 是否忽略有效期强制重新扫描
+        """
+        index = self.get_file_index()
+        if not index:
+            return
+
+        signature = self._get_index_signature(recursive)
+        max_age_seconds = self.file_index_max_age * 60
 
-        except (OSError, IOError, PermissionError):
-            # 如果任何文件系统操作失败，跳过这个文件
+        stale_folders = []
+        for folder_var in self.folder_vars:
+            folder_path = folder_var.get().strip()
+            if not folder_path or not os.path.exists(folder_path):
+                continue
+
+            state = index.get_folder_state(folder_path)
+            if (not force and state is not None and state[0] == signature and
+                    time.time() - state[1] < max_age_seconds):
+                continue
+            stale_folders.append(folder_path)
+
+        if not stale_folders:
             return
 
-        # 跳过临时文件和隐藏文件
-        if (file.startswith('~$') or     # Office/WPS临时文件
-            file.startswith('.~') or      # 其他临时文件
-            file.startswith('~') or       # 临时文件
-            file.endswith('.tmp') or      # 临时文件
-            file.endswith('.temp') or     # 临时文件
-            file.startswith('.')):        # 隐藏文件
+        # 所有需要更新的文件夹一起并行扫描
+        try:
+            results = self.scan_folders(recursive, folders=stale_folders)
+        except Exception as e:
+            self.update_status(f"索引文件夹失败: {str(e)}", "orange")
             return
 
-        # 使用配置的文件后缀白名单过滤
-        file_extension = os.path.splitext(file)[1].lower()
-        if file_extension in [ext.lower() for ext in self.allowed_file_extensions]:
-            all_files.append(full_file_path)
+        for result in results:
+            try:
+                index.replace_folder(result.folder, result.records, signature)
+                self.log_info("文件索引更新", f"文件夹: {result.folder} | 文件数: {len(result.records)} | 耗时: {result.elapsed:.2f}秒")
+            except Exception as e:
+                self.update_status(f"索引文件夹 {result.folder} 失败: {str(e)}", "orange")
+
+    def get_title_matcher(self):
+        """获取与当前候选文件和跟踪文件同步的窗口标题匹配器
+
+        候选文件来源（监视器、扫描结果或索引）没有变化时直接复用，变化时只同步差异。
+        """
+        matcher = self.title_matcher
+        try:
+            source_key, load_records = self._get_candidate_source(self.scan_subfolders)
+            if source_key is None or matcher.source_key != source_key:
+                paths = [record.path for record in load_records()]
+                paths.extend(self.opened_files)
+                matcher.sync(paths, source_key)
+                self.log_info("标题匹配器同步", f"文件数量: {len(matcher)} | 重建次数: {matcher.rebuilds}")
+            else:
+                for opened_file in self.opened_files:
+                    matcher.add_file(opened_file)
+        except Exception as e:
+            self.log_warning("同步标题匹配器失败", f"错误: {str(e)}")
+        return matcher
+
+    def start_file_watcher(self):
+        """启动（或按需重启）项目文件夹监视器"""
+        if not self.file_watcher_enabled:
+            return
+
+        folders = [var.get().strip() for var in self.folder_vars if var.get().strip()]
+        folders = [folder for folder in folders if os.path.isdir(folder)]
+        if not folders:
+            return
+
+        if self.file_watcher and self.file_watcher.running:
+            if self.file_watcher.matches(folders, self.allowed_file_extensions, self.scan_subfolders,
+                                         self.get_scan_rules()):
+                return
+            self.stop_file_watcher()
+
+        try:
+            watcher = FolderWatcher(folders, self.allowed_file_extensions, self.scan_subfolders,
+                                    poll_interval=self.file_watcher_poll_interval,
+                                    debounce=self.file_watcher_debounce,
+                                    log_callback=self.log_info,
+                                    rules=self.get_scan_rules())
+            watcher.start()
+            self.file_watcher = watcher
+        except Exception as e:
+            self.log_error("文件监视器启动失败", f"错误: {str(e)}，将使用索引或直接扫描")
+            self.file_watcher = None
+
+    def stop_file_watcher(self):
+        """停止项目文件夹监视器"""
+        if self.file_watcher:
+            try:
+                self.file_watcher.stop()
+                self.log_info("文件监视器停止", f"已处理 {self.file_watcher.events_applied} 批变化，重新列举 {self.file_watcher.dirs_relisted} 个目录")
+            except Exception as e:
+                self.log_error("文件监视器停止失败", f"错误: {str(e)}")
+            self.file_watcher = None
+
+    def get_active_watcher(self, recursive):
+        """获取与当前扫描方式一致、正在运行且已完成初始扫描的监视器，没有时返回None"""
+        watcher = self.file_watcher
+        if watcher and watcher.running and watcher.ready.is_set() and watcher.recursive == recursive:
+            return watcher
+        return None
 
     def check_available_files(self):
-        """检查所有配置文件夹中是否有可用的文件"""
+        """检查所有配置文件夹中是否有可用的文件
+
+        只扫描一次，结果保存为scan_result，之后的文件数量统计和首次选择文件直接复用。
+        """
         # 根据递归扫描配置决定扫描方式
-        files_found = self.get_random_file_from_all_folders(recursive=self.scan_subfolders)
+        scan_result = self.get_scan_result(recursive=self.scan_subfolders, force=True)
+        total_files = len(scan_result)
 
         return {
-            'has_files_current_level': files_found is not None if not self.scan_subfolders else False,
-            'has_files_recursive': files_found is not None if self.scan_subfolders else False,
-            'total_files_current': self._count_files(recursive=False) if not self.scan_subfolders else 0,
-            'total_files_recursive': self._count_files(recursive=True) if self.scan_subfolders else 0
+            'has_files_current_level': total_files > 0 if not self.scan_subfolders else False,
+            'has_files_recursive': total_files > 0 if self.scan_subfolders else False,
+            'total_files_current': total_files if not self.scan_subfolders else 0,
+            'total_files_recursive': total_files if self.scan_subfolders else 0,
+            'scan_result': scan_result
         }
 
     def _count_files(self, recursive=True):
-        """统计可用文件数量"""
-        all_files = []
-
-        for folder_var in self.folder_vars:
-            folder_path = folder_var.get().strip()
-            if not folder_path or not os.path.exists(folder_path):
-                continue
+        """统计可用文件数量"""
+        watcher = self.get_active_watcher(recursive)
+        if watcher:
+            return len(watcher.candidates)
+
+        scan_result = self.get_fresh_scan_result(recursive)
+        if scan_result:
+            return len(scan_result)
 
+        index = self.get_file_index()
+        if index:
             try:
-                if recursive:
-                    # 递归扫描所有子文件夹
-                    for root, dirs, files in os.walk(folder_path):
-                        for file in files:
-                            self._process_file(file, root, all_files)
-                else:
-                    # 只扫描当前文件夹
-                    try:
-                        files = os.listdir(folder_path)
-                        for file in files:
-                            file_path = os.path.join(folder_path, file)
-                            if os.path.isfile(file_path):
-                                self._process_file(file, folder_path, all_files)
-                    except (OSError, PermissionError):
-                        continue
-            except Exception:
-                continue
+                self.refresh_file_index(recursive)
+                return index.count(**self._get_index_filters())
+            except Exception as e:
+                self.log_error("索引统计失败", f"错误: {str(e)}，改为直接扫描文件夹")
 
-        return len(all_files)
+        try:
+            return sum(len(result.records) for result in self.scan_folders(recursive))
+        except Exception:
+            return 0
 
     def open_random_file(self):
         """打开一个随机文件"""
@@ -744,27 +5153,35 @@ class ActivityTracker:
 
         if random_file:
             try:
-                # 再次验证文件是否存在且是有效文件
-                if not os.path.exists(random_file):
+                # 再次验证文件是否存在且是有效文件（一次stat完成存在性、类型和大小检查）
+                try:
+                    file_stat = os.stat(random_file)
+                except OSError:
                     self.log_warning("文件打开失败", f"文件不存在: {random_file}")
+                    # 文件已被删除，同步移除索引中的记录
+                    if self.file_index:
+                        self.file_index.remove_path(random_file)
+                    if self.weighted_selector:
+                        self.weighted_selector.remove(random_file)
+                    if self.shuffle_bag:
+                        self.shuffle_bag.remove(random_file)
+                    if self.scan_result:
+                        self.scan_result.candidates.discard(random_file)
                     self.update_status("选中的文件不存在，请重试", "orange")
                     return False
 
-                if not os.path.isfile(random_file):
+                if not stat.S_ISREG(file_stat.st_mode):
                     self.log_warning("文件打开失败", f"路径不是文件: {random_file}")
                     self.update_status("选中的路径不是有效文件，请重试", "orange")
                     return False
 
                 # 检查文件大小，避免打开过大的文件
-                try:
-                    file_size = os.path.getsize(random_file)
-                    # 限制文件大小不超过100MB
-                    if file_size > 100 * 1024 * 1024:
-                        self.log_warning("文件打开跳过", f"文件过大: {random_file} ({file_size / 1024 / 1024:.1f}MB)")
-                        self.update_status(f"文件过大，跳过打开: {os.path.basename(random_file)}", "orange")
-                        return False
-                except OSError:
-                    self.log_warning("文件大小检查失败", f"无法获取文件大小: {random_file}")
+                file_size = file_stat.st_size
+                # 限制文件大小不超过100MB
+                if file_size > 100 * 1024 * 1024:
+                    self.log_warning("文件打开跳过", f"文件过大: {random_file} ({file_size / 1024 / 1024:.1f}MB)")
+                    self.update_status(f"文件过大，跳过打开: {os.path.basename(random_file)}", "orange")
+                    return False
 
                 file_name = os.path.basename(random_file)
                 folder_name = os.path.basename(os.path.dirname(random_file))
@@ -773,19 +5190,47 @@ class ActivityTracker:
                 # 记录文件打开日志
                 self.log_info("打开文件", f"文件: {file_name} | 路径: {random_file} | 来源文件夹: {folder_name}")
 
+                # 打开前的窗口快照，用于找出打开文件后新出现的窗口
+                self.window_inventory.invalidate()
+                try:
+                    windows_before = self.window_inventory.snapshot()
+                except Exception:
+                    windows_before = []
+
                 # 使用系统默认程序打开文件
-                if sys.platform.startswith('win32'):
-                    os.startfile(random_file)
-                elif sys.platform.startswith('darwin'):
-                    subprocess.Popen(['open', random_file])
+                spawned_pid = self.window_backend.open_file(random_file)
+
+                # 等待文件对应的窗口出现（出现后立即继续，超时上限按扩展名设置）
+                try:
+                    ready, open_latency = self.open_waiter.wait(random_file, windows_before, spawned_pid)
+                except Exception as e:
+                    self.log_warning("文件打开等待失败", f"文件: {file_name} | 错误: {str(e)}，改为固定等待")
+                    ready, open_latency = None, self.open_waiter.fallback_wait()
+                if ready:
+                    self.log_info("文件打开就绪", f"文件: {file_name} | 耗时: {open_latency:.2f}秒")
+                elif ready is None:
+                    self.log_info("文件打开等待", f"文件: {file_name} | 无法枚举窗口，固定等待 {open_latency:.2f}秒")
                 else:
-                    subprocess.Popen(['xdg-open', random_file])
+                    self.log_warning("文件打开等待超时", f"文件: {file_name} | 等待 {open_latency:.2f}秒后仍未发现对应窗口")
+                self.log_info("打开耗时统计", self.open_waiter.summary())
 
-                time.sleep(2)  # 等待文件打开
+                # 把新出现的窗口和进程绑定到该文件，保存和关闭时直接使用
+                self.bind_launched_file(random_file, windows_before, spawned_pid)
 
                 # 设置当前打开的文件
                 self.current_opened_file = random_file
-                self.current_opened_time = datetime.datetime.now()
+                self.current_opened_time = self.clock.now()
+
+                # 调整已打开文件的权重（O(log n)），降低短时间内重复打开的概率
+                if self.weighted_selector:
+                    self.weighted_selector.mark_opened(random_file)
+
+                # 记录洗牌进度和最近打开时间（持久化，重启后继续）
+                if self.shuffle_bag:
+                    try:
+                        self.shuffle_bag.mark_opened(random_file)
+                    except Exception as e:
+                        self.log_error("洗牌进度保存失败", f"错误: {str(e)}")
 
                 # 根据配置决定是否跟踪打开的文件
                 if self.file_tracking_enabled:
@@ -829,12 +5274,16 @@ class ActivityTracker:
                 messagebox.showwarning("警告", f"文件夹不存在: {folder_path}")
                 return
 
+        # 启动文件监视器，之后的可用文件检查和文件选择都直接使用内存中的候选集合
+        self.start_file_watcher()
+
         # 在启动任务前检查是否有可用文件
         try:
             file_check = self.check_available_files()
         except Exception as e:
             self.log_error("文件检查失败", f"错误: {str(e)}")
             messagebox.showerror("文件检查失败", f"无法扫描文件夹: {str(e)}")
+            self.stop_file_watcher()
             return
 
         if not file_check['has_files_current_level'] and not file_check['has_files_recursive']:
@@ -847,6 +5296,7 @@ class ActivityTracker:
                 "2. 文件夹中是否包含支持格式的文件\n"
                 "3. 文件夹访问权限是否正常"
             )
+            self.stop_file_watcher()
             return
 
         # 系统兼容性检查
@@ -858,20 +5308,12 @@ class ActivityTracker:
                 f"检测到系统兼容性问题：{str(e)}\n\n是否仍要继续启动？\n注意：程序可能无法正常工作"):
                 pass
             else:
+                self.stop_file_watcher()
                 return
 
         self.save_config()
 
-        # 启动时强制清除工作时间缓存，确保重新计算
-        old_cache_count = len(self.daily_work_times)
-        self.daily_work_times.clear()
-
-        # 设置强制重新计算标记，确保启动时重新生成今天的工作时间
-        self.force_recalculate_today = True
-
-        self.log_info("任务启动", f"已清除 {old_cache_count} 个缓存的工作时间，将重新计算今日工作时间")
-
-        # 检查时间设置是否发生了变化，如果变化则清除缓存
+        # 今天的工作时间从排程缓存读取（设置不变时与停止前相同），设置变化时清除今天及以后的缓存
         if self.check_time_settings_changed():
             self.log_info("任务启动", "检测到时间设置变化，将使用新的时间设置")
 
@@ -896,6 +5338,10 @@ class ActivityTracker:
             self.log_info("文件扫描结果",
                 f"当前目录级别无可用文件，仅在子文件夹中找到：{recursive_count} 个文件")
 
+        scan_result = file_check['scan_result']
+        for folder_path, folder_count in scan_result.folder_counts.items():
+            self.log_info("文件夹文件数量", f"{folder_path}: {folder_count} 个文件")
+
         # 更新时间显示（移除"尚未启动"标识）
         self.update_save_time()
 
@@ -908,6 +5354,7 @@ class ActivityTracker:
             self.log_error("任务线程启动失败", f"错误: {str(e)}")
             self.running = False
             self.cancel_event.set()
+            self.stop_file_watcher()
             self.toggle_btn.config(text="启动自动任务", bg="#00D2AA", activebackground="#00C5A3")
             messagebox.showerror("启动失败", f"无法启动任务线程: {str(e)}")
 
@@ -915,8 +5362,8 @@ class ActivityTracker:
         """检查系统兼容性，特别是exe环境"""
         issues = []
 
-        # 检查pyautogui可用性
-        if not PYAUTOGUI_AVAILABLE:
+        # 检查pyautogui可用性（使用模拟窗口后端时不需要）
+        if not self.window_backend.available:
             issues.append("pyautogui模块不可用，无法执行自动操作")
 
         # 检查win32com可用性
@@ -1080,6 +5527,12 @@ class ActivityTracker:
             self.running = False
             self.cancel_event.set()
 
+            # 停止文件监视器
+            self.stop_file_watcher()
+
+            # 记录文件覆盖率
+            self.log_coverage_report()
+
             # 记录停止日志
             self.log_info("自动任务已停止", f"运行时长统计已记录")
 
@@ -1107,113 +5560,165 @@ class ActivityTracker:
             else:
                 self.update_status("任务已停止，跟踪信息已保留", "blue")
 
+    def get_work_calendar(self):
+        """获取编译好的工作日历（只在工作日历设置变化后的第一次使用时重建）"""
+        if self.work_calendar is None:
+            imported_holidays, imported_work_days = self.import_holiday_calendars()
+            self.work_calendar = WorkCalendar(self.skip_weekends, self.work_dates, self.holiday_dates,
+                                              imported_holidays=imported_holidays,
+                                              imported_work_days=imported_work_days)
+            if self.work_calendar.invalid_rules:
+                self.log_warning("工作日历配置", f"无法解析的日期规则已忽略: {', '.join(map(str, self.work_calendar.invalid_rules))}")
+        return self.work_calendar
+
+    def import_holiday_calendars(self):
+        """导入配置的节假日日历文件（解析结果按文件内容缓存），返回 (节假日序号集合, 调休工作日序号集合)"""
+        if not self.calendar_import_files:
+            return set(), set()
+
+        cache_path = self.calendar_import_cache_path
+        if not cache_path:
+            cache_path = os.path.join(os.path.dirname(os.path.abspath(self.config_path)), "calendar_cache.json")
+        importer = HolidayCalendarImporter(cache_path)
+        holidays, work_days = importer.load(self.calendar_import_files)
+        for path, error in importer.errors:
+            self.log_warning("节假日日历导入失败", f"文件: {path} | 错误: {error}")
+        self.log_info("节假日日历导入", f"文件: {len(self.calendar_import_files)}个 (解析 {importer.parsed} 个, 使用缓存 {importer.cached} 个) | "
+                                     f"节假日: {len(holidays)}天 | 调休工作日: {len(work_days)}天")
+        return holidays, work_days
+
     def is_work_day(self, date):
         """判断指定日期是否为工作日
 
-        支持两种日期格式：
+        支持三种日期格式：
         - "MM-DD": 每年生效的月日配置（如 "01-01" 表示每年1月1日）
         - "YY-MM-DD": 指定年份的年月日配置（如 "25-07-21" 表示2025年7月21日）
+        - "起始~结束": 日期范围（如 "25-10-01~25-10-07" 表示2025年国庆7天）
         """
         try:
-            # 获取星期几 (0=周一, 6=周日)
-            weekday = date.weekday()
-
-            # 格式化日期为两种格式
-            date_str_mmdd = date.strftime("%m-%d")  # MM-DD 格式
-            date_str_yymmdd = date.strftime("%y-%m-%d")  # YY-MM-DD 格式
-
-            # 检查是否为节假日（支持两种格式）
-            for holiday_date in self.holiday_dates:
-                if holiday_date == date_str_mmdd or holiday_date == date_str_yymmdd:
-                    return False
-
-            # 检查是否为调休工作日（支持两种格式）
-            for work_date in self.work_dates:
-                if work_date == date_str_mmdd or work_date == date_str_yymmdd:
-                    return True
-
-            # 如果配置了跳过周末，且当前是周末（周六=5，周日=6）
-            if self.skip_weekends and weekday >= 5:
-                return False
-
-            # 其他情况都是工作日
-            return True
-
+            return self.get_work_calendar().is_work_day(date)
         except Exception as e:
             self.log_error("工作日判断错误", f"错误: {e}")
             # 出错时默认为工作日，避免程序停止
             return True
 
+    def next_work_day(self, date):
+        """获取指定日期之后的第一个工作日"""
+        try:
+            return self.get_work_calendar().next_work_day(date)
+        except Exception as e:
+            self.log_error("工作日判断错误", f"错误: {e}")
+            return date + datetime.timedelta(days=1)
+
+    def create_schedule_simulator(self, seed=None, window_provider=None):
+        """根据当前界面设置和工作日历创建排程模拟器"""
+        return ScheduleSimulator(
+            self.get_work_calendar(),
+            work_start=(self.work_start_hour.get(), self.work_start_minute.get()),
+            work_end=(self.work_end_hour.get(), self.work_end_minute.get()),
+            work_random_range=self.work_time_random_range,
+            lunch_enabled=self.lunch_break_enabled,
+            lunch_start=(self.lunch_start_hour, self.lunch_start_minute),
+            lunch_end=(self.lunch_end_hour, self.lunch_end_minute),
+            lunch_random_range=self.lunch_time_random_range,
+            save_delay=(self.save_delay_min.get(), self.save_delay_max.get()),
+            file_interval=(self.file_interval_min.get(), self.file_interval_max.get()),
+            seed=seed, model=self.create_activity_model(), window_provider=window_provider)
+
+    def preview_schedule(self, weeks=4):
+        """模拟接下来几周的排程并显示统计结果（不会打开任何文件）
+
+        每天的工作和午休时间取自排程缓存或该天的种子，与实际运行时的时间一致。
+        """
+        try:
+            simulation = self.create_schedule_simulator(window_provider=self.preview_window).run(
+                weeks, self.clock.now().date())
+        except Exception as e:
+            self.log_error("排程预览失败", f"错误: {e}")
+            messagebox.showerror("排程预览失败", f"无法模拟排程: {str(e)}")
+            return None
+
+        text = simulation.summary_text()
+        self.log_info("排程预览", text.replace("\n", " | "))
+        messagebox.showinfo("排程预览", text)
+        return simulation
+
+    def get_schedule_store(self):
+        """获取排程缓存（配置不变时复用）"""
+        store_key = json.dumps([self.schedule_store_path, self.schedule_store_secret,
+                                self.schedule_store_max_entries, self.schedule_store_max_age_days])
+        if self.schedule_store is None or self._schedule_store_key != store_key:
+            store_path = self.schedule_store_path
+            if not store_path:
+                store_path = os.path.join(os.path.dirname(os.path.abspath(self.config_path)), "schedule_cache.json")
+            self.schedule_store = ScheduleStore(store_path, self.schedule_store_secret,
+                                                self.schedule_store_max_entries, self.schedule_store_max_age_days,
+                                                today=lambda: self.clock.now().date())
+            self._schedule_store_key = store_key
+            if self.schedule_store.last_error:
+                self.log_warning("排程缓存读取失败", f"文件: {store_path} | 错误: {self.schedule_store.last_error}")
+                self.schedule_store.last_error = None
+        return self.schedule_store
+
+    def get_time_settings(self):
+        """当前影响每日工作/午休时间的设置"""
+        return {
+            'work_start_hour': self.work_start_hour.get(),
+            'work_start_minute': self.work_start_minute.get(),
+            'work_end_hour': self.work_end_hour.get(),
+            'work_end_minute': self.work_end_minute.get(),
+            'work_time_random_range': getattr(self, 'work_time_random_range', 20),
+            'lunch_start': (self.lunch_start_hour, self.lunch_start_minute),
+            'lunch_end': (self.lunch_end_hour, self.lunch_end_minute),
+            'lunch_time_random_range': getattr(self, 'lunch_time_random_range', 10)
+        }
+
+    def get_window_settings(self, kind):
+        """工作('work')或午休('lunch')时间窗口的 (设置, 基准开始分钟, 基准结束分钟, 随机范围, 最短分钟数)"""
+        settings = self.get_time_settings()
+        if kind == 'work':
+            return ([settings[key] for key in ('work_start_hour', 'work_start_minute', 'work_end_hour',
+                                               'work_end_minute', 'work_time_random_range')],
+                    settings['work_start_hour'] * 60 + settings['work_start_minute'],
+                    settings['work_end_hour'] * 60 + settings['work_end_minute'],
+                    settings['work_time_random_range'], 60)  # 至少工作1小时
+        return ([settings['lunch_start'], settings['lunch_end'], settings['lunch_time_random_range']],
+                self.lunch_start_hour * 60 + self.lunch_start_minute,
+                self.lunch_end_hour * 60 + self.lunch_end_minute,
+                settings['lunch_time_random_range'], 30)  # 至少午休30分钟
+
+    def preview_window(self, kind, date):
+        """不写入排程缓存地获取某天的 (开始分钟, 结束分钟)，与该天实际运行时使用的时间相同"""
+        settings, base_start, base_end, random_range, min_length = self.get_window_settings(kind)
+        return self.get_schedule_store().peek(
+            kind, date, ScheduleStore.settings_hash(settings),
+            lambda rng: ScheduleStore.random_window(rng, base_start, base_end, random_range, min_length))
+
+    def get_scheduled_window(self, kind, base_date, settings, base_start, base_end, random_range, min_length):
+        """从排程缓存获取某天的 (开始datetime, 结束datetime)，没有缓存时按该天的种子生成"""
+        store = self.get_schedule_store()
+        (start_minutes, end_minutes), created = store.get_or_create(
+            kind, base_date.date(), ScheduleStore.settings_hash(settings),
+            lambda rng: ScheduleStore.random_window(rng, base_start, base_end, random_range, min_length))
+        if store.last_error:
+            self.log_warning("排程缓存保存失败", f"错误: {store.last_error}")
+            store.last_error = None
+        start_time = base_date.replace(hour=start_minutes // 60, minute=start_minutes % 60, second=0, microsecond=0)
+        end_time = base_date.replace(hour=end_minutes // 60, minute=end_minutes % 60, second=0, microsecond=0)
+        return start_time, end_time, created
+
     def get_random_lunch_times(self, base_date):
-        """获取指定日期的随机午休时间（带缓存机制，确保每天只计算一次）"""
+        """获取指定日期的随机午休时间（按日期和设置持久缓存，确保每天只计算一次）"""
         if not self.lunch_break_enabled:
             return None, None
 
-        # 获取日期字符串作为缓存键
-        date_key = f"{base_date.strftime('%Y-%m-%d')}_lunch"
-
-        # 如果已经计算过该日期的午休时间，直接返回缓存的结果
-        if date_key in self.daily_work_times:
-            return self.daily_work_times[date_key]
-
         try:
-            # 基础午休时间
-            base_start_hour = self.lunch_start_hour
-            base_start_minute = self.lunch_start_minute
-            base_end_hour = self.lunch_end_hour
-            base_end_minute = self.lunch_end_minute
-
-            # 获取随机区间（分钟）
-            random_range = getattr(self, 'lunch_time_random_range', 10)
-
-            # 计算基础时间（以分钟为单位）
-            base_start_minutes = base_start_hour * 60 + base_start_minute
-            base_end_minutes = base_end_hour * 60 + base_end_minute
-
-            # 生成随机偏移量（-random_range 到 +random_range 分钟）
-            start_offset = random.randint(-random_range, random_range)
-            end_offset = random.randint(-random_range, random_range)
-
-            # 计算实际午休时间
-            actual_start_minutes = base_start_minutes + start_offset
-            actual_end_minutes = base_end_minutes + end_offset
-
-            # 确保时间在合理范围内（0-1439分钟，即0:00-23:59）
-            actual_start_minutes = max(0, min(1439, actual_start_minutes))
-            actual_end_minutes = max(0, min(1439, actual_end_minutes))
-
-            # 确保结束时间晚于开始时间
-            if actual_end_minutes <= actual_start_minutes:
-                actual_end_minutes = actual_start_minutes + 30  # 至少午休30分钟
-                if actual_end_minutes > 1439:  # 如果超过23:59
-                    actual_start_minutes = 1439 - 30  # 调整开始时间
-                    actual_end_minutes = 1439
-
-            # 转换回小时和分钟
-            start_hour = actual_start_minutes // 60
-            start_minute = actual_start_minutes % 60
-            end_hour = actual_end_minutes // 60
-            end_minute = actual_end_minutes % 60
-
-            # 创建datetime对象
-            lunch_start_time = base_date.replace(
-                hour=start_hour,
-                minute=start_minute,
-                second=0,
-                microsecond=0
-            )
-            lunch_end_time = base_date.replace(
-                hour=end_hour,
-                minute=end_minute,
-                second=0,
-                microsecond=0
-            )
-
-            # 缓存结果
-            self.daily_work_times[date_key] = (lunch_start_time, lunch_end_time)
+            lunch_start_time, lunch_end_time, created = self.get_scheduled_window(
+                'lunch', base_date, *self.get_window_settings('lunch'))
 
             # 记录日志
-            self.log_info("午休时间计算", f"日期: {base_date.strftime('%Y-%m-%d')} | 午休开始: {lunch_start_time.strftime('%H:%M')} | 午休结束: {lunch_end_time.strftime('%H:%M')}")
+            if created:
+                self.log_info("午休时间计算", f"日期: {base_date.strftime('%Y-%m-%d')} | 午休开始: {lunch_start_time.strftime('%H:%M')} | 午休结束: {lunch_end_time.strftime('%H:%M')}")
 
             return lunch_start_time, lunch_end_time
 
@@ -1242,83 +5747,16 @@ class ActivityTracker:
             return False
 
     def get_random_work_times(self, base_date):
-        """获取指定日期的随机工作开始和结束时间（带缓存机制，确保每天只计算一次）"""
-        # 获取日期字符串作为缓存键
+        """获取指定日期的随机工作开始和结束时间（按日期和设置持久缓存，同一天重启后时间不变）"""
         date_key = base_date.strftime("%Y-%m-%d")
-        today_key = datetime.datetime.now().strftime("%Y-%m-%d")
-
-        # 检查是否需要强制重新计算今天的时间（启动时）
-        force_recalc = getattr(self, 'force_recalculate_today', False)
-        if force_recalc and date_key == today_key:
-            # 清除今天的缓存，强制重新计算
-            if date_key in self.daily_work_times:
-                self.log_info("工作时间重新计算", f"启动时强制重新计算今日 ({date_key}) 工作时间")
-                del self.daily_work_times[date_key]
-            # 重置标记
-            self.force_recalculate_today = False
-
-        # 如果已经计算过该日期的工作时间，直接返回缓存的结果
-        if date_key in self.daily_work_times:
-            return self.daily_work_times[date_key]
 
         try:
-            # 基础工作时间
-            base_start_hour = self.work_start_hour.get()
-            base_start_minute = self.work_start_minute.get()
-            base_end_hour = self.work_end_hour.get()
-            base_end_minute = self.work_end_minute.get()
-
-            # 获取随机区间（分钟）
-            random_range = getattr(self, 'work_time_random_range', 20)
-
-            # 计算基础时间（以分钟为单位）
-            base_start_minutes = base_start_hour * 60 + base_start_minute
-            base_end_minutes = base_end_hour * 60 + base_end_minute
-
-            # 生成随机偏移量（-random_range 到 +random_range 分钟）
-            start_offset = random.randint(-random_range, random_range)
-            end_offset = random.randint(-random_range, random_range)
-
-            # 计算实际工作时间
-            actual_start_minutes = base_start_minutes + start_offset
-            actual_end_minutes = base_end_minutes + end_offset
-
-            # 确保时间在合理范围内（0-1439分钟，即0:00-23:59）
-            actual_start_minutes = max(0, min(1439, actual_start_minutes))
-            actual_end_minutes = max(0, min(1439, actual_end_minutes))
-
-            # 确保结束时间晚于开始时间
-            if actual_end_minutes <= actual_start_minutes:
-                actual_end_minutes = actual_start_minutes + 60  # 至少工作1小时
-                if actual_end_minutes > 1439:  # 如果超过23:59
-                    actual_start_minutes = 1439 - 60  # 调整开始时间
-                    actual_end_minutes = 1439
-
-            # 转换回小时和分钟
-            start_hour = actual_start_minutes // 60
-            start_minute = actual_start_minutes % 60
-            end_hour = actual_end_minutes // 60
-            end_minute = actual_end_minutes % 60
-
-            # 创建datetime对象
-            work_start_time = base_date.replace(
-                hour=start_hour,
-                minute=start_minute,
-                second=0,
-                microsecond=0
-            )
-            work_end_time = base_date.replace(
-                hour=end_hour,
-                minute=end_minute,
-                second=0,
-                microsecond=0
-            )
-
-            # 缓存结果
-            self.daily_work_times[date_key] = (work_start_time, work_end_time)
+            work_start_time, work_end_time, created = self.get_scheduled_window(
+                'work', base_date, *self.get_window_settings('work'))
 
             # 记录日志
-            self.log_info("工作时间计算", f"日期: {date_key} | 开始: {work_start_time.strftime('%H:%M')} | 结束: {work_end_time.strftime('%H:%M')}")
+            if created:
+                self.log_info("工作时间计算", f"日期: {date_key} | 开始: {work_start_time.strftime('%H:%M')} | 结束: {work_end_time.strftime('%H:%M')}")
 
             return work_start_time, work_end_time
 
@@ -1338,20 +5776,11 @@ class ActivityTracker:
                 microsecond=0
             )
 
-            # 即使出错也要缓存结果
-            self.daily_work_times[date_key] = (work_start_time, work_end_time)
-
             return work_start_time, work_end_time
 
     def check_time_settings_changed(self):
-        """检查时间设置是否发生了变化，如果变化则清除相关缓存"""
-        current_settings = {
-            'work_start_hour': self.work_start_hour.get(),
-            'work_start_minute': self.work_start_minute.get(),
-            'work_end_hour': self.work_end_hour.get(),
-            'work_end_minute': self.work_end_minute.get(),
-            'work_time_random_range': getattr(self, 'work_time_random_range', 20)
-        }
+        """检查时间设置是否发生了变化，如果变化则清除今天及以后的排程缓存"""
+        current_settings = self.get_time_settings()
 
         # 如果是第一次检查，保存当前设置
         if not self.cached_time_settings:
@@ -1367,10 +5796,9 @@ class ActivityTracker:
                 break
 
         if settings_changed:
-            # 清除工作时间缓存
-            old_cache_count = len(self.daily_work_times)
-            self.daily_work_times.clear()
-            self.log_info("工作时间缓存清除", f"由于时间设置变化，已清除 {old_cache_count} 个缓存的工作时间")
+            # 清除今天及以后的排程缓存（过去的日期保持当时的实际时间）
+            removed = self.get_schedule_store().invalidate_from(self.clock.now().date())
+            self.log_info("工作时间缓存清除", f"由于时间设置变化，已清除今天及以后的 {removed} 个缓存的工作/午休时间")
 
             # 更新缓存的设置
             self.cached_time_settings = current_settings.copy()
@@ -1391,7 +5819,7 @@ class ActivityTracker:
                         self.update_status("任务已取消", "orange")
                         break
 
-                    now = datetime.datetime.now()
+                    now = self.clock.now()
 
                     # 获取今天的随机工作时间
                     try:
@@ -1407,9 +5835,7 @@ class ActivityTracker:
                     # 如果当前时间已经过了今天的结束时间，寻找下一个工作日
                     if now >= work_end_time:
                         # 寻找下一个工作日
-                        next_work_day = now.date() + datetime.timedelta(days=1)
-                        while not self.is_work_day(next_work_day):
-                            next_work_day += datetime.timedelta(days=1)
+                        next_work_day = self.next_work_day(now.date())
 
                         # 设置下一个工作日的随机工作时间
                         next_day_datetime = datetime.datetime.combine(next_work_day, datetime.time(9, 0))
@@ -1424,9 +5850,7 @@ class ActivityTracker:
                     elif work_start_time <= now < work_end_time:
                         if not self.is_work_day(now.date()):
                             # 今天不是工作日，寻找下一个工作日
-                            next_work_day = now.date() + datetime.timedelta(days=1)
-                            while not self.is_work_day(next_work_day):
-                                next_work_day += datetime.timedelta(days=1)
+                            next_work_day = self.next_work_day(now.date())
 
                             next_day_datetime = datetime.datetime.combine(next_work_day, datetime.time(9, 0))
                             try:
@@ -1448,9 +5872,7 @@ class ActivityTracker:
                     else:
                         if not self.is_work_day(now.date()):
                             # 今天不是工作日，寻找下一个工作日
-                            next_work_day = now.date() + datetime.timedelta(days=1)
-                            while not self.is_work_day(next_work_day):
-                                next_work_day += datetime.timedelta(days=1)
+                            next_work_day = self.next_work_day(now.date())
 
                             next_day_datetime = datetime.datetime.combine(next_work_day, datetime.time(9, 0))
                             try:
@@ -1497,7 +5919,7 @@ class ActivityTracker:
 
                     if self.running and not self.cancel_event.is_set():
                         # 再次确认当前时间确实在工作时间内
-                        current_time = datetime.datetime.now()
+                        current_time = self.clock.now()
 
                         # 使用同一天的工作时间进行验证，避免重新计算导致的时间不一致
                         if current_time.date() == work_start_time.date():
@@ -1544,35 +5966,92 @@ class ActivityTracker:
             self.log_info("任务循环结束", "主任务循环已结束")
 
     def work_mode(self, work_end_time):
-        """工作模式：在工作时间内不断打开和保存文件"""
-        start_time = datetime.datetime.now()
+        """工作模式：在工作时间内按计划打开和保存文件（事件驱动，只在事件到期时唤醒）"""
+        start_time = self.clock.now()
         self.log_info("工作模式开始", f"开始时间: {start_time.strftime('%H:%M:%S')}, 预计结束时间: {work_end_time.strftime('%H:%M:%S')}")
         self.update_status("进入工作模式，开始文档操作...")
 
-        # 首次打开文件（工作开始时）
+        # 一次生成全天的计划（午休时间只计算一次），之后的打开和保存时间都从计划中读取
+        lunch_start_time, lunch_end_time = self.get_random_lunch_times(start_time)
+        plan = self.create_day_planner().plan(start_time, work_end_time, lunch_start_time, lunch_end_time)
+        self.day_plan = plan
+        self.log_info("今日计划", plan.summary())
+        self.log_info("今日计划明细", plan.to_json())
+
+        scheduler = EventScheduler(self.clock.time)
+        self.event_scheduler = scheduler
+        scheduler.schedule('work_end', work_end_time)
+        lunch_action = plan.next_action(start_time - datetime.timedelta(seconds=1), 'lunch_start')
+        if lunch_action:
+            scheduler.schedule('lunch_start', lunch_action.when, plan.lunch_end)
+
+        # 首次打开文件（工作开始时；正处于午休时间则按计划在午休结束后打开）
         valid_folders = [var.get().strip() for var in self.folder_vars if var.get().strip()]
-        if valid_folders:
-            self.update_status("工作开始，打开第一个文档文件...")
-            self.open_random_file()
+        first_open = plan.next_action(start_time - datetime.timedelta(seconds=1), 'open')
+        if valid_folders and first_open:
+            if first_open.when <= start_time:
+                self.update_status("工作开始，打开第一个文档文件...")
+                self.open_random_file()
+
+                # 为第一个文件设置保存延迟
+                self.schedule_save_for_current_file(work_end_time)
+
+                # 计算并显示下一次文件打开时间
+                self.calculate_next_file_open_time(work_end_time)
+            else:
+                self.next_file_open_time = first_open.when
 
-            # 为第一个文件设置保存延迟
-            self.schedule_save_for_current_file(work_end_time)
+        in_lunch = False
 
-            # 计算并显示下一次文件打开时间
-            self.calculate_next_file_open_time(work_end_time)
+        def sync_file_events():
+            """把当前的保存时间和下次打开时间同步到调度器"""
+            if self.actual_save_time:
+                if scheduler.pending('save') != self.actual_save_time:
+                    scheduler.schedule('save', self.actual_save_time)
+            else:
+                scheduler.cancel('save')
+            if valid_folders and self.next_file_open_time and not in_lunch:
+                if scheduler.pending('open') != self.next_file_open_time:
+                    scheduler.schedule('open', self.next_file_open_time)
+            else:
+                scheduler.cancel('open')
 
-        last_file_open_time = datetime.datetime.now()
+        sync_file_events()
 
         while self.running:
-            # 检查取消事件
+            # 阻塞到最近的截止时间（每次最多MAX_WAIT秒，醒来后重新计算），停止任务时立即返回
+            timeout = scheduler.time_until_next()
+            if timeout is None or timeout > 0:
+                self.clock.wait(self.cancel_event, scheduler.MAX_WAIT if timeout is None else min(timeout, scheduler.MAX_WAIT))
             if self.cancel_event.is_set():
                 self.update_status("任务已取消", "orange")
                 break
 
-            now = datetime.datetime.now()
+            # 保存延迟或打开间隔在工作中被修改时，增量重新计划尚未执行的打开和保存
+            planner = self.create_day_planner()
+            if planner.settings_key != plan.settings_key:
+                now = self.clock.now()
+                pending = [when for when in (scheduler.pending('open'), scheduler.pending('save')) if when]
+                cutoff = min([now] + pending) - datetime.timedelta(microseconds=1)
+                plan = planner.replan(plan, cutoff)
+                self.day_plan = plan
+                if self.actual_save_time:
+                    self.actual_save_time = self.get_planned_save_time(cutoff)
+                next_open = plan.next_action(cutoff, 'open')
+                self.next_file_open_time = next_open.when if next_open else None
+                self.log_info("计划已更新", f"设置变化，重新计划后续操作: {plan.summary()}")
+                sync_file_events()
+
+            event = scheduler.pop_due()
+            if event is None:
+                continue
+
+            now = self.clock.now()
+            overrun = scheduler.overrun_of(event.kind)
+            if overrun > 5:
+                self.log_warning("事件执行延迟", f"事件: {event.kind} | 计划: {event.when.strftime('%H:%M:%S')} | 延迟: {overrun:.1f}秒")
 
-            # 检查是否已到工作结束时间
-            if now >= work_end_time:
+            if event.kind == 'work_end':
                 # 二次验证：重新获取今天的工作时间，确保时间一致性
                 try:
                     today_work_start, today_work_end = self.get_random_work_times(now)
@@ -1587,14 +6066,11 @@ class ActivityTracker:
                         # 如果当前时间还在新的工作时间内，继续工作
                         if now < work_end_time:
                             self.log_info("工作时间延续", f"使用更新的结束时间 {work_end_time.strftime('%H:%M')}")
+                            scheduler.schedule('work_end', work_end_time)
                             continue
 
-                    # 确认工作时间确实结束了
-                    if now >= work_end_time:
-                        self.log_info("工作时间确认结束", f"当前时间 {now.strftime('%H:%M:%S')} >= 结束时间 {work_end_time.strftime('%H:%M:%S')}")
-                        self.update_status("工作时间结束，正在处理未保存的文件...")
-                    else:
-                        continue
+                    self.log_info("工作时间确认结束", f"当前时间 {now.strftime('%H:%M:%S')} >= 结束时间 {work_end_time.strftime('%H:%M:%S')}")
+                    self.update_status("工作时间结束，正在处理未保存的文件...")
 
                 except Exception as e:
                     self.log_error("工作时间验证失败", f"错误: {str(e)}，使用原始结束时间")
@@ -1616,14 +6092,12 @@ class ActivityTracker:
                             self.log_error("工作结束保存失败", f"保存文件时出错: {str(e)}")
                             self.update_status("最后文件保存失败，但继续结束工作")
 
-                        # 清除保存时间，避免重复保存
+                        # 清除保存时间，避免重复保存（保存结果已在保存时验证，无需额外等待）
                         self.actual_save_time = None
                         self.update_save_time()
 
-                        # 等待一小段时间确保保存完成
-                        time.sleep(2)
-
                 self.update_status("工作时间结束")
+                self.log_info("事件调度统计", scheduler.summary())
 
                 # 根据配置决定是否工作结束后关闭所有软件
                 if self.auto_close_on_work_end:
@@ -1634,98 +6108,141 @@ class ActivityTracker:
 
                 break
 
-            # 检查是否在午休时间内
-            if self.is_lunch_time(now):
-                # 获取午休时间信息用于显示
-                lunch_start_time, lunch_end_time = self.get_random_lunch_times(now)
-                if lunch_start_time and lunch_end_time:
-                    # ✨ 在进入午休时间时，如果有待保存的文件，先立即保存
-                    if self.current_opened_file and self.actual_save_time:
-                        self.update_status("进入午休时间前，先保存当前文件...")
-                        self.log_info("午休时间处理", f"检测到有待保存文件 {os.path.basename(self.current_opened_file)}，立即保存")
-                        self.perform_save_only()
-                        # 清除保存时间，避免午休后重复保存
-                        self.actual_save_time = None
-                        self.update_save_time()
-
-                    self.update_status(f"午休时间 ({lunch_start_time.strftime('%H:%M')} - {lunch_end_time.strftime('%H:%M')})，暂停文件操作...")
-
-                    # 在午休时间内，暂停所有文件操作，但不关闭应用
-                    self.log_info("午休时间", f"进入午休时间，暂停文件操作直到 {lunch_end_time.strftime('%H:%M')}")
-
-                    # 等待午休结束
-                    while self.running and now < lunch_end_time:
-                        if self.cancel_event.is_set():
-                            break
-
-                        # 更新状态显示剩余午休时间
-                        remaining_minutes = int((lunch_end_time - now).total_seconds() / 60)
-                        if remaining_minutes > 0:
-                            self.update_status(f"午休中，还有 {remaining_minutes} 分钟恢复工作...")
-                        else:
-                            self.update_status("午休即将结束...")
-
-                        # 等待1分钟或直到午休结束
-                        wait_seconds = min(60, (lunch_end_time - now).total_seconds())
-                        if wait_seconds > 0:
-                            if self.wait_with_cancel(wait_seconds):
-                                break
+            elif event.kind == 'lunch_start':
+                lunch_end_time = event.payload
+                in_lunch = True
 
-                        now = datetime.datetime.now()
+                # ✨ 在进入午休时间时，如果有待保存的文件，先立即保存
+                if self.current_opened_file and self.actual_save_time:
+                    self.update_status("进入午休时间前，先保存当前文件...")
+                    self.log_info("午休时间处理", f"检测到有待保存文件 {os.path.basename(self.current_opened_file)}，立即保存")
+                    self.perform_save_only()
+                    # 清除保存时间，避免午休后重复保存
+                    self.actual_save_time = None
+                    self.update_save_time()
 
-                    # 午休结束，恢复工作
-                    if self.running and not self.cancel_event.is_set():
-                        self.update_status("午休结束，恢复文件操作...")
-                        self.log_info("午休时间", "午休结束，恢复正常工作模式")
+                # 在午休时间内，暂停所有文件操作，但不关闭应用
+                self.update_status(f"午休时间 ({event.when.strftime('%H:%M')} - {lunch_end_time.strftime('%H:%M')})，暂停文件操作...")
+                self.log_info("午休时间", f"进入午休时间，暂停文件操作直到 {lunch_end_time.strftime('%H:%M')}")
+                scheduler.schedule('lunch_end', lunch_end_time)
 
-                # 继续下一轮循环检查
-                continue
+            elif event.kind == 'lunch_end':
+                # 午休结束，恢复工作（午休期间到期的打开操作立即执行）
+                in_lunch = False
+                self.update_status("午休结束，恢复文件操作...")
+                self.log_info("午休时间", "午休结束，恢复正常工作模式")
 
-            # 检查是否需要打开下一个文件
-            if valid_folders and self.next_file_open_time:
-                if now >= self.next_file_open_time:
-                    # 检查距离工作结束时间是否足够进行一次完整的文件操作
-                    time_until_end = (work_end_time - now).total_seconds() / 60  # 转换为分钟
-                    min_save_delay = max(0.1, self.save_delay_min.get())  # 最小保存延迟
+            elif event.kind == 'open':
+                # 检查距离工作结束时间是否足够进行一次完整的文件操作
+                time_until_end = (work_end_time - now).total_seconds() / 60  # 转换为分钟
+                min_save_delay = max(0.1, self.save_delay_min.get())  # 最小保存延迟
 
-                    # 如果距离结束时间小于最小保存延迟时间 + 1分钟缓冲时间，不再打开新文件
-                    if time_until_end > (min_save_delay + 1):
-                        # 时间充足，可以打开下一个文件
-                        self.open_random_file()
-                        last_file_open_time = now
+                # 如果距离结束时间小于最小保存延迟时间 + 1分钟缓冲时间，不再打开新文件
+                if time_until_end > (min_save_delay + DayPlanner.OPEN_BUFFER_MINUTES):
+                    # 时间充足，可以打开下一个文件
+                    self.open_random_file()
 
-                        # 为新文件设置保存延迟
-                        self.schedule_save_for_current_file(work_end_time)
+                    # 为新文件设置保存延迟
+                    self.schedule_save_for_current_file(work_end_time)
 
-                        # 计算并显示下一次文件打开时间
-                        self.calculate_next_file_open_time(work_end_time)
+                    # 计算并显示下一次文件打开时间
+                    self.calculate_next_file_open_time(work_end_time)
 
-                        self.log_info("文件打开", f"打开新文件，距离工作结束还有 {time_until_end:.1f} 分钟")
-                    else:
-                        # 时间不足，不再打开新文件
-                        self.log_info("文件打开跳过", f"距离工作结束仅剩 {time_until_end:.1f} 分钟，停止打开新文件")
-                        self.update_status(f"工作即将结束（{time_until_end:.1f}分钟），不再打开新文件")
-                        self.next_file_open_time = None  # 清除下次打开时间
+                    self.log_info("文件打开", f"打开新文件，距离工作结束还有 {time_until_end:.1f} 分钟")
+                else:
+                    # 时间不足，不再打开新文件
+                    self.log_info("文件打开跳过", f"距离工作结束仅剩 {time_until_end:.1f} 分钟，停止打开新文件")
+                    self.update_status(f"工作即将结束（{time_until_end:.1f}分钟），不再打开新文件")
+                    self.next_file_open_time = None  # 清除下次打开时间
 
-            # 检查是否有待执行的保存操作
-            if self.actual_save_time and now >= self.actual_save_time:
+            elif event.kind == 'save':
                 # 检查保存时间是否已超过工作结束时间
-                if self.actual_save_time <= work_end_time:
+                if self.actual_save_time and self.actual_save_time <= work_end_time:
                     self.update_status("执行计划的保存操作...")
                     self.perform_save_only(work_end_time)
-                else:
+                elif self.actual_save_time:
                     self.log_warning("保存操作跳过", f"保存时间 {self.actual_save_time.strftime('%H:%M:%S')} 超过工作结束时间 {work_end_time.strftime('%H:%M:%S')}")
                     self.update_status("保存时间超过工作结束时间，跳过保存操作")
 
                 self.actual_save_time = None
                 self.update_save_time()
 
-            # 使用wait_with_cancel代替简单的sleep，以便更快响应停止按钮
-            if self.wait_with_cancel(1):  # 等待1秒，但可以被取消
-                break
+            # 处理完事件后，保存时间和下次打开时间可能已经变化
+            sync_file_events()
+
+        # 退出工作模式后计划不再生效（保留以便查看）
+        self.event_scheduler = None
+
+    def set_clock(self, clock):
+        """替换工作线程使用的时钟（SystemClock 或 VirtualClock）"""
+        self.clock = clock
+        for component in (self.open_waiter, self.save_verifier):
+            component.sleep = clock.sleep
+            component.clock = clock.monotonic
+
+    def run_virtual(self, start, days):
+        """用虚拟时钟从start开始同步运行days天的完整任务循环（配合假的窗口后端使用），返回虚拟时钟
+
+        不打开界面线程，等待直接跳到下一个截止时间，适合性能测试和排程逻辑的回归测试。
+        """
+        previous_clock = self.clock
+        previous_store = self.get_schedule_store()
+        clock = VirtualClock(start, start + datetime.timedelta(days=days), self.cancel_event)
+        self.set_clock(clock)
+        # 虚拟运行的排程只保存在内存中，不写入排程缓存文件
+        self.schedule_store = ScheduleStore(None, previous_store.secret, previous_store.max_entries,
+                                            previous_store.max_age_days, today=lambda: self.clock.now().date())
+        self.running = True
+        self.cancel_event.clear()
+        try:
+            self.task_loop()
+        finally:
+            self.running = False
+            self.set_clock(previous_clock)
+            self.schedule_store = previous_store
+        return clock
+
+    def create_activity_model(self):
+        """按当前的打开间隔设置和模型配置创建打开间隔模型"""
+        return ActivityModel(self.activity_model_type, self.file_interval_min.get(), self.file_interval_max.get(),
+                             self.activity_lognormal_sigma, self.activity_gamma_shape,
+                             self.activity_hourly_profile, self.activity_weekday_profiles)
+
+    def create_day_planner(self):
+        """按当前的保存延迟和打开间隔设置创建计划生成器"""
+        return DayPlanner(self.save_delay_min.get(), self.save_delay_max.get(),
+                          self.file_interval_min.get(), self.file_interval_max.get(),
+                          model=self.create_activity_model())
+
+    def plan_in_effect(self, now):
+        """工作模式正在按今天的计划执行"""
+        return self.event_scheduler is not None and self.day_plan is not None and self.day_plan.covers(now)
+
+    def get_planned_save_time(self, now):
+        """从今天的计划中获取最近一次打开对应的保存时间，计划中没有安排保存时返回None"""
+        last_open = self.day_plan.last_action(now, 'open')
+        save_action = self.day_plan.save_for(last_open.index) if last_open else None
+        if save_action is None:
+            return None
+        if save_action.when <= now:
+            # 打开操作执行得比计划晚，保存时间已过则尽快保存
+            return now + datetime.timedelta(seconds=DayPlanner.LATE_SAVE_DELAY)
+        return save_action.when
 
     def schedule_save_for_current_file(self, work_end_time=None):
-        """为当前文件安排保存时间"""
+        """为当前文件安排保存时间（工作模式中使用今天计划的保存时间）"""
+        now = self.clock.now()
+        if self.plan_in_effect(now):
+            self.actual_save_time = self.get_planned_save_time(now)
+            if self.actual_save_time is None:
+                self.log_info("保存计划", "计划中下一次打开早于保存时间，本文件不单独保存")
+                self.update_save_time()
+                return
+            remaining_seconds = int((self.actual_save_time - now).total_seconds())
+            self.start_save_countdown(max(1, remaining_seconds))
+            self.update_save_time()
+            return
+
         save_delay_min = max(0.1, self.save_delay_min.get())  # 最小0.1分钟（6秒）
         save_delay_max = max(save_delay_min, self.save_delay_max.get())
 
@@ -1733,13 +6250,13 @@ class ActivityTracker:
         save_delay_minutes = random.uniform(save_delay_min, save_delay_max)
         save_delay_seconds = int(save_delay_minutes * 60)
 
-        proposed_save_time = datetime.datetime.now() + datetime.timedelta(seconds=save_delay_seconds)
+        proposed_save_time = self.clock.now() + datetime.timedelta(seconds=save_delay_seconds)
 
         # 如果提供了工作结束时间，确保保存时间不超过工作结束时间
         if work_end_time and proposed_save_time > work_end_time:
             # 调整保存时间为工作结束前30秒
             adjusted_save_time = work_end_time - datetime.timedelta(seconds=30)
-            current_time = datetime.datetime.now()
+            current_time = self.clock.now()
 
             # 确保调整后的时间仍然在当前时间之后
             if adjusted_save_time > current_time:
@@ -1753,7 +6270,7 @@ class ActivityTracker:
             self.actual_save_time = proposed_save_time
 
         # 启动实时倒计时
-        remaining_seconds = int((self.actual_save_time - datetime.datetime.now()).total_seconds())
+        remaining_seconds = int((self.actual_save_time - self.clock.now()).total_seconds())
         self.start_save_countdown(max(1, remaining_seconds))
 
         self.update_save_time()
@@ -1764,7 +6281,7 @@ class ActivityTracker:
             if not self.running or self.cancel_event.is_set():
                 return
 
-            now = datetime.datetime.now()
+            now = self.clock.now()
             if self.actual_save_time and now < self.actual_save_time:
                 remaining_seconds = int((self.actual_save_time - now).total_seconds())
 
@@ -1786,31 +6303,31 @@ class ActivityTracker:
         countdown_update()
 
     def wait_with_cancel(self, seconds, work_start_time=None):
-        """精确等待指定秒数，支持取消操作，可动态更新日期显示"""
-        start_time = datetime.datetime.now()
+        """精确等待指定秒数，支持取消操作（取消时立即返回），可动态更新日期显示"""
+        start_time = self.clock.now()
         end_time = start_time + datetime.timedelta(seconds=seconds)
 
-        while datetime.datetime.now() < end_time:
+        while self.clock.now() < end_time:
             if self.cancel_event.is_set() or not self.running:
                 return True
 
             # 计算剩余时间
-            remaining = (end_time - datetime.datetime.now()).total_seconds()
+            remaining = (end_time - self.clock.now()).total_seconds()
             if remaining <= 0:
                 break
 
-            # 每10秒更新一次保存时间显示和状态
-            sleep_time = min(1, remaining)
-            time.sleep(sleep_time)
+            # 阻塞到下一个30秒的显示更新点（或等待结束），停止任务时立即唤醒
+            if self.clock.wait(self.cancel_event, min(30, remaining)):
+                return True
 
             # 每30秒更新一次显示（减少频率）
-            if int(remaining) % 30 == 0:
+            if (end_time - self.clock.now()).total_seconds() > 0:
                 if self.actual_save_time:
                     self.update_save_time()
 
                 # 如果提供了工作开始时间，动态更新状态显示
                 if work_start_time:
-                    current_now = datetime.datetime.now()
+                    current_now = self.clock.now()
                     # 重新计算日期显示
                     if work_start_time.date() > current_now.date():
                         days_diff = (work_start_time.date() - current_now.date()).days
@@ -1898,13 +6415,13 @@ class ActivityTracker:
                     self.update_status(f"等待保存延迟: {save_delay_seconds}秒...")
 
                     # 等待保存时间到达
-                    while self.actual_save_time and datetime.datetime.now() < self.actual_save_time:
+                    while self.actual_save_time and self.clock.now() < self.actual_save_time:
                         if self.cancel_event.is_set():
                             self.update_status("延迟已取消", "orange")
                             self.log_warning("立即执行模式", "保存延迟被用户取消")
                             self.running = False
                             return
-                        time.sleep(1)
+                        self.clock.sleep(1)
 
                     self.update_status("保存延迟结束，准备执行保存...")
                     self.log_info("立即执行模式", "保存延迟时间到达，开始执行保存操作")
@@ -1917,7 +6434,7 @@ class ActivityTracker:
             # 延迟一秒后关闭软件
             self.update_status("保存完成，准备关闭软件...")
             self.log_info("立即执行模式", "保存操作完成，准备关闭相关软件")
-            time.sleep(1)
+            self.clock.sleep(1)
 
             # 执行关闭软件操作
             self.close_opened_programs()
@@ -1967,15 +6484,15 @@ class ActivityTracker:
         saved_count = 0
 
         try:
-            # 检查pyautogui是否可用
-            if not PYAUTOGUI_AVAILABLE:
+            # 检查窗口后端（pyautogui）是否可用
+            if not self.window_backend.available:
                 self.log_warning("保存操作", "pyautogui不可用，无法执行保存操作")
                 self.update_status("pyautogui不可用，跳过保存操作", "orange")
                 return 0
 
-            # 获取所有窗口 - 添加错误处理
+            # 获取所有窗口（使用窗口快照） - 添加错误处理
             try:
-                all_windows = pyautogui.getAllWindows()
+                all_windows = self.window_inventory.snapshot()
             except Exception as e:
                 self.log_error("获取窗口列表失败", f"错误: {str(e)}")
                 self.update_status("无法获取窗口列表，跳过保存操作", "orange")
@@ -1986,30 +6503,44 @@ class ActivityTracker:
 
             self.log_info("开始保存当前文件", f"目标文件: {current_file_name} | 文件路径: {self.current_opened_file}")
 
+            current_file_name_lower = current_file_name.lower()
+            current_file_name_without_ext_lower = current_file_name_without_ext.lower()
+
+            # 优先使用打开文件时绑定的窗口，找不到时才按标题匹配
+            bound_windows = self.launch_registry.windows_for(self.current_opened_file, all_windows)
+            if bound_windows:
+                self.log_info("使用绑定窗口", f"文件: {current_file_name} | 窗口: {len(bound_windows)}个")
+                all_windows = bound_windows
+
             # 寻找与当前文件相关的窗口
-            for window in all_windows:
+            for window_info in all_windows:
                 try:
-                    window_title = window.title
+                    window = window_info.window
+                    window_title = window_info.title
 
                     # 跳过空标题窗口
                     if not window_title.strip():
                         continue
 
-                    # 检查窗口标题是否包含当前文件名
-                    if (current_file_name.lower() in window_title.lower() or
-                        current_file_name_without_ext.lower() in window_title.lower()):
+                    # 检查窗口标题是否包含当前文件名（绑定的窗口无需检查）
+                    if (bound_windows or current_file_name_lower in window_info.title_lower or
+                        current_file_name_without_ext_lower in window_info.title_lower):
 
                         try:
                             # 激活窗口并保存 - 添加错误处理
                             try:
-                                window.activate()
-                                time.sleep(0.5)
+                                self.window_backend.activate(window)
+                                self.clock.sleep(0.5)
                             except Exception as e:
                                 self.log_warning("窗口激活失败", f"窗口: {window_title[:50]} | 错误: {str(e)}")
                                 continue
 
+                            # 保存前的文件状态，用于确认保存是否真正写入了文件
+                            state_before = SaveVerifier.file_state(self.current_opened_file)
+
                             try:
-                                pyautogui.hotkey('ctrl', 's')
+                                self.window_backend.hotkey('ctrl', 's')
+                                self.window_inventory.invalidate()  # 保存后窗口标题可能变化
                                 saved_count += 1
                             except Exception as e:
                                 self.log_warning("保存快捷键失败", f"窗口: {window_title[:50]} | 错误: {str(e)}")
@@ -2018,11 +6549,14 @@ class ActivityTracker:
                             # 获取清理后的窗口标题（避免过长的标题）
                             clean_title = self.clean_window_title(window_title)
 
+                            # 轮询文件修改时间/大小和标题中的未保存标记，确认保存结果
+                            outcome = self.verify_save(self.current_opened_file, state_before,
+                                                       window_info.handle, window_title)
+
                             # 记录保存操作日志
-                            self.log_info("保存文档", f"窗口: {clean_title} | 文件: {current_file_name} | 文档已保存")
+                            self.log_info("保存文档", f"窗口: {clean_title} | 文件: {current_file_name} | 验证结果: {outcome}")
 
                             self.update_status(f"已保存文档: {clean_title}")
-                            time.sleep(1)
 
                         except Exception as e:
                             clean_title = self.clean_window_title(window_title)
@@ -2076,7 +6610,7 @@ class ActivityTracker:
             return
 
         try:
-            now = datetime.datetime.now()
+            now = self.clock.now()
             time_diff = (self.next_file_open_time - now).total_seconds() / 60  # 转换为分钟
 
             if time_diff > 0:
@@ -2088,23 +6622,38 @@ class ActivityTracker:
             self.log_warning("显示下次文件时间失败", f"错误: {str(e)}")
 
     def calculate_next_file_open_time(self, work_end_time=None):
-        """计算并设置下一次文件打开时间"""
+        """计算并设置下一次文件打开时间（工作模式中使用今天计划的打开时间）"""
         if not self.running:
             return
 
         try:
-            # 计算下一次文件打开的时间间隔
-            file_interval_min = max(0.1, self.file_interval_min.get())
-            file_interval_max = max(file_interval_min, self.file_interval_max.get())
-            next_interval_minutes = random.uniform(file_interval_min, file_interval_max)
+            now = self.clock.now()
+            if self.plan_in_effect(now):
+                next_open = self.day_plan.next_action(now, 'open')
+                self.next_file_open_time = next_open.when if next_open else None
+                if next_open:
+                    self.update_status(f"下一次文件打开时间: {next_open.when.strftime('%H:%M:%S')} ({(next_open.when - now).total_seconds() / 60:.1f}分钟后)")
+                    self.log_info("下次文件打开计划", f"预计时间: {next_open.when.strftime('%H:%M:%S')} | 来自今日计划")
+                else:
+                    self.log_info("下次文件打开计划", "今日计划中没有更多的打开操作")
+                    self.update_status("临近工作结束时间，不再计划新的文件打开")
+                return
+
+            # 按打开间隔模型计算下一次文件打开的时间间隔
+            next_interval_minutes = self.create_activity_model().next_interval(random, now)
+            if next_interval_minutes is None:
+                self.next_file_open_time = None
+                self.log_info("下次文件打开计划", "今天不再有计划的打开操作")
+                self.update_status("今天不再计划新的文件打开")
+                return
 
-            next_file_time = datetime.datetime.now() + datetime.timedelta(minutes=next_interval_minutes)
+            next_file_time = now + datetime.timedelta(minutes=next_interval_minutes)
 
             # 如果提供了工作结束时间，检查下一次打开时间是否会导致来不及保存
             if work_end_time:
                 # 计算最小保存延迟时间 + 缓冲时间
                 min_save_delay = max(0.1, self.save_delay_min.get())
-                buffer_time = 1  # 1分钟缓冲时间
+                buffer_time = DayPlanner.OPEN_BUFFER_MINUTES  # 1分钟缓冲时间
                 required_time = min_save_delay + buffer_time
 
                 # 检查下一次打开时间 + 必需的操作时间是否超过工作结束时间
@@ -2133,60 +6682,45 @@ class ActivityTracker:
         self.update_status("正在保存打开的文档文件...")
 
         try:
-            # 获取所有窗口
-            all_windows = pyautogui.getAllWindows()
+            # 获取所有窗口（使用窗口快照）
+            all_windows = self.window_inventory.snapshot()
             saved_count = 0
 
-            # 定义常见的文档编辑器和办公软件
-            document_apps = [
-                "notepad", "记事本", "wordpad", "写字板",
-                "microsoft word", "word", "excel", "powerpoint",
-                "wps", "金山", "sublime", "atom", "brackets",
-                "adobe", "pdf", "foxit", "福昕", "visual studio code",
-                "pycharm", "intellij", "eclipse", "dev-c++"
-            ]
-
-            for window in all_windows:
-                window_title = window.title.lower()
+            # 常见的文档编辑器和办公软件由应用程序注册表识别
+            app_registry = self.get_app_registry()
+
+            title_matcher = None  # 项目文件名匹配器（按需同步一次）
+
+            for window_info in all_windows:
+                window = window_info.window
+                window_title = window_info.title_lower
                 # 检查是否是文档编辑器窗口
-                is_document_window = any(app in window_title for app in document_apps)
+                is_document_window = app_registry.is_document_window(window_title)
 
-                # 或者检查窗口标题是否包含配置文件夹中的文件名
+                # 或者检查窗口标题是否包含配置文件夹中的文件名（一次线性扫描匹配所有文件名）
                 is_folder_file = False
-                for folder_var in self.folder_vars:
-                    folder_path = folder_var.get().strip()
-                    if not folder_path or not os.path.exists(folder_path):
-                        continue
-                    try:
-                        for root, dirs, files in os.walk(folder_path):
-                            for file in files:
-                                file_name_without_ext = os.path.splitext(file)[0].lower()
-                                if file_name_without_ext in window_title:
-                                    is_folder_file = True
-                                    break
-                            if is_folder_file:
-                                break
-                    except:
-                        pass
-                    if is_folder_file:
-                        break
+                if not is_document_window:
+                    if title_matcher is None:
+                        title_matcher = self.get_title_matcher()
+                    is_folder_file = title_matcher.match(window_title) is not None
 
                 if is_document_window or is_folder_file:
                     try:
                         # 激活窗口并保存
-                        window.activate()
-                        time.sleep(0.5)
-                        pyautogui.hotkey('ctrl', 's')
+                        self.window_backend.activate(window)
+                        self.clock.sleep(0.5)
+                        self.window_backend.hotkey('ctrl', 's')
+                        self.window_inventory.invalidate()  # 保存后窗口标题可能变化
                         saved_count += 1
 
                         # 记录保存操作日志
-                        self.log_info("保存文档", f"窗口: {window.title[:50]} | 文档已保存")
+                        self.log_info("保存文档", f"窗口: {window_info.title[:50]} | 文档已保存")
 
-                        self.update_status(f"已保存文档: {window.title[:50]}...")
-                        time.sleep(1)
+                        self.update_status(f"已保存文档: {window_info.title[:50]}...")
+                        self.clock.sleep(1)
                     except Exception as e:
-                        self.log_warning("保存文档失败", f"窗口: {window.title[:30]} | 错误: {str(e)}")
-                        self.update_status(f"保存窗口 '{window.title[:30]}...' 失败: {str(e)}", "orange")
+                        self.log_warning("保存文档失败", f"窗口: {window_info.title[:30]} | 错误: {str(e)}")
+                        self.update_status(f"保存窗口 '{window_info.title[:30]}...' 失败: {str(e)}", "orange")
 
             if saved_count > 0:
                 self.log_info("批量保存完成", f"成功保存 {saved_count} 个文档文件")
@@ -2229,7 +6763,7 @@ class ActivityTracker:
             self.root.after(0, lambda: self.save_time_label.config(text=f"下次操作时间: {save_str}"))
         else:
             # 计算下一个工作开始时间
-            now = datetime.datetime.now()
+            now = self.clock.now()
 
             # 获取今天的随机工作时间
             work_start_time, work_end_time = self.get_random_work_times(now)
@@ -2242,9 +6776,7 @@ class ActivityTracker:
 
             if now >= work_end_time or not today_is_work_day:
                 # 如果已过工作结束时间，或今天不是工作日，寻找下一个工作日
-                next_work_day = now.date() + datetime.timedelta(days=1)
-                while not self.is_work_day(next_work_day):
-                    next_work_day += datetime.timedelta(days=1)
+                next_work_day = self.next_work_day(now.date())
 
                 # 获取下一个工作日的随机工作时间
                 next_day_datetime = datetime.datetime.combine(next_work_day, datetime.time(9, 0))
@@ -2308,6 +6840,15 @@ class ActivityTracker:
                 "file_interval_min": self.file_interval_min.get(),
                 "file_interval_max": self.file_interval_max.get(),
 
+                # 打开间隔模型配置
+                "activity_model": {
+                    "type": getattr(self, 'activity_model_type', "uniform"),
+                    "lognormal_sigma": getattr(self, 'activity_lognormal_sigma', 0.5),
+                    "gamma_shape": getattr(self, 'activity_gamma_shape', 2.0),
+                    "hourly_profile": getattr(self, 'activity_hourly_profile', list(ActivityModel.DEFAULT_HOURLY_PROFILE)),
+                    "weekday_profiles": getattr(self, 'activity_weekday_profiles', {})
+                },
+
                 # 智能关闭功能配置
                 "auto_close_on_work_end": getattr(self, 'auto_close_on_work_end', True),
                 "close_strategy": {
@@ -2328,9 +6869,20 @@ class ActivityTracker:
                 "program_detection": {
                     "window_check_interval": getattr(self, 'window_check_interval', 1.0),
                     "activation_delay": getattr(self, 'activation_delay', 0.5),
-                    "close_verification_delay": getattr(self, 'close_verification_delay', 1.5)
+                    "close_verification_delay": getattr(self, 'close_verification_delay', 1.5),
+                    "window_snapshot_ttl": getattr(self, 'window_snapshot_ttl', 1.0),
+                    "window_backend": getattr(self, 'window_backend_name', "pyautogui"),
+                    "open_wait_timeout": getattr(self, 'open_wait_timeout', 10.0),
+                    "open_wait_timeouts": getattr(self, 'open_wait_timeouts', {}),
+                    "open_settle_delay": getattr(self, 'open_settle_delay', 0.5),
+                    "pyautogui_pause": getattr(self, 'pyautogui_pause', 0.1),
+                    "save_verify_timeout": getattr(self, 'save_verify_timeout', 5.0),
+                    "save_check_dirty_marker": getattr(self, 'save_check_dirty_marker', True)
                 },
 
+                # 应用程序注册表配置
+                "app_registry": getattr(self, 'app_registry_config', {}),
+
                 # 用户界面配置
                 "ui_settings": {
                     "show_close_progress": getattr(self, 'show_close_progress', True),
@@ -2342,7 +6894,17 @@ class ActivityTracker:
                 "work_calendar": {
                     "skip_weekends": getattr(self, 'skip_weekends', True),
                     "work_dates": getattr(self, 'work_dates', []),
-                    "holiday_dates": getattr(self, 'holiday_dates', [])
+                    "holiday_dates": getattr(self, 'holiday_dates', []),
+                    "import_files": getattr(self, 'calendar_import_files', []),
+                    "import_cache_path": getattr(self, 'calendar_import_cache_path', "")
+                },
+
+                # 排程缓存配置
+                "schedule_store": {
+                    "path": getattr(self, 'schedule_store_path', ""),
+                    "secret": getattr(self, 'schedule_store_secret', ""),
+                    "max_entries": getattr(self, 'schedule_store_max_entries', 200),
+                    "max_age_days": getattr(self, 'schedule_store_max_age_days', 60)
                 },
 
                 # 日志功能配置
@@ -2363,7 +6925,50 @@ class ActivityTracker:
                         '.pptx', '.ppt', '.css', '.json', '.xml',
                         '.php', '.c', '.h', '.cs', '.go', '.vue', 'xmind'
                     ]),
-                    "scan_subfolders": getattr(self, 'scan_subfolders', False)
+                    "scan_subfolders": getattr(self, 'scan_subfolders', False),
+                    "include_patterns": getattr(self, 'include_patterns', []),
+                    "exclude_patterns": getattr(self, 'exclude_patterns', ScanRules.DEFAULT_EXCLUDE_PATTERNS),
+                    "exclude_dirs": getattr(self, 'exclude_dirs', ScanRules.DEFAULT_EXCLUDE_DIRS),
+                    "max_depth": getattr(self, 'scan_max_depth', -1)
+                },
+
+                # 文件扫描配置
+                "file_scanning": {
+                    "time_budget_seconds": getattr(self, 'scan_time_budget', 0),
+                    "entry_budget": getattr(self, 'scan_entry_budget', 0),
+                    "max_workers": getattr(self, 'scan_max_workers', 4),
+                    "dir_cache_enabled": getattr(self, 'dir_cache_enabled', True),
+                    "dir_cache_path": getattr(self, 'dir_cache_path', ""),
+                    "result_max_age_seconds": getattr(self, 'scan_result_max_age', 300)
+                },
+
+                # 文件监视器配置
+                "file_watcher": {
+                    "enabled": getattr(self, 'file_watcher_enabled', True),
+                    "poll_interval_seconds": getattr(self, 'file_watcher_poll_interval', 10.0),
+                    "debounce_seconds": getattr(self, 'file_watcher_debounce', 0.5)
+                },
+
+                # 文件索引配置
+                "file_index": {
+                    "enabled": getattr(self, 'file_index_enabled', True),
+                    "db_path": getattr(self, 'file_index_path', ""),
+                    "max_age_minutes": getattr(self, 'file_index_max_age', 60),
+                    "max_file_size_mb": getattr(self, 'file_index_max_file_size', 100)
+                },
+
+                # 文件选择配置
+                "file_selection": {
+                    "mode": getattr(self, 'selection_mode', "uniform"),
+                    "recency_half_life_days": getattr(self, 'selection_recency_half_life', 30),
+                    "min_recency_weight": getattr(self, 'selection_min_recency_weight', 0.1),
+                    "size_soft_limit_mb": getattr(self, 'selection_size_soft_limit', 20),
+                    "extension_weights": getattr(self, 'selection_extension_weights', {}),
+                    "pinned_files": getattr(self, 'pinned_files', []),
+                    "pinned_weight": getattr(self, 'pinned_weight', 5.0),
+                    "opened_weight_factor": getattr(self, 'selection_opened_factor', 0.5),
+                    "shuffle_bag_path": getattr(self, 'shuffle_bag_path', ""),
+                    "coverage_report_days": getattr(self, 'coverage_report_days', 7)
                 }
             }
 
@@ -2424,6 +7029,17 @@ class ActivityTracker:
                 self.file_interval_min.set(config.get("file_interval_min", 30))
                 self.file_interval_max.set(config.get("file_interval_max", 60))
 
+                # 加载打开间隔模型配置
+                activity_model = config.get("activity_model", {})
+                self.activity_model_type = activity_model.get("type", "uniform")
+                if self.activity_model_type not in ActivityModel.TYPES:
+                    self.log_warning("打开间隔模型配置", f"未知的模型 {self.activity_model_type}，使用 uniform")
+                    self.activity_model_type = "uniform"
+                self.activity_lognormal_sigma = activity_model.get("lognormal_sigma", 0.5)
+                self.activity_gamma_shape = activity_model.get("gamma_shape", 2.0)
+                self.activity_hourly_profile = activity_model.get("hourly_profile", list(ActivityModel.DEFAULT_HOURLY_PROFILE))
+                self.activity_weekday_profiles = activity_model.get("weekday_profiles", {})
+
                 # 加载智能关闭功能配置
                 self.auto_close_on_work_end = config.get("auto_close_on_work_end", True)
 
@@ -2444,6 +7060,35 @@ class ActivityTracker:
                 self.window_check_interval = program_detection.get("window_check_interval", 1.0)
                 self.activation_delay = program_detection.get("activation_delay", 0.5)
                 self.close_verification_delay = program_detection.get("close_verification_delay", 1.5)
+                self.window_snapshot_ttl = program_detection.get("window_snapshot_ttl", 1.0)
+                self.set_window_backend(program_detection.get("window_backend", "pyautogui"))
+                self.window_inventory.ttl = self.window_snapshot_ttl
+                self.open_wait_timeout = program_detection.get("open_wait_timeout", 10.0)
+                self.open_wait_timeouts = program_detection.get("open_wait_timeouts", self.open_wait_timeouts)
+                self.open_settle_delay = program_detection.get("open_settle_delay", 0.5)
+                self.pyautogui_pause = program_detection.get("pyautogui_pause", 0.1)
+                # 就地更新等待器设置，保留已记录的打开耗时
+                self.open_waiter.inventory = self.window_inventory
+                self.open_waiter.default_timeout = self.open_wait_timeout
+                self.open_waiter.timeouts = {ext.lower(): value for ext, value in self.open_wait_timeouts.items()}
+                self.open_waiter.settle_delay = self.open_settle_delay
+                if PYAUTOGUI_AVAILABLE:
+                    pyautogui.PAUSE = self.pyautogui_pause
+                self.save_verify_timeout = program_detection.get("save_verify_timeout", 5.0)
+                self.save_check_dirty_marker = program_detection.get("save_check_dirty_marker", True)
+                self.save_verifier.inventory = self.window_inventory
+                self.save_verifier.timeout = self.save_verify_timeout
+                self.save_verifier.check_dirty_marker = self.save_check_dirty_marker
+
+                # 加载应用程序注册表配置
+                app_registry_config = config.get("app_registry", {})
+                self.app_registry_config = {
+                    "apps": app_registry_config.get("apps", {}),
+                    "excluded_patterns": app_registry_config.get("excluded_patterns", []),
+                    "self_protection_keywords": app_registry_config.get("self_protection_keywords", []),
+                    "document_apps": app_registry_config.get("document_apps", []),
+                    "extension_programs": app_registry_config.get("extension_programs", {})
+                }
 
                 # 加载用户界面配置
                 ui_settings = config.get("ui_settings", {})
@@ -2456,6 +7101,16 @@ class ActivityTracker:
                 self.skip_weekends = work_calendar.get("skip_weekends", True)
                 self.work_dates = work_calendar.get("work_dates", [])
                 self.holiday_dates = work_calendar.get("holiday_dates", [])
+                self.calendar_import_files = work_calendar.get("import_files", [])
+                self.calendar_import_cache_path = work_calendar.get("import_cache_path", "")
+                self.work_calendar = None  # 工作日历设置可能已变化，下次使用时重建
+
+                # 加载排程缓存配置
+                schedule_store = config.get("schedule_store", {})
+                self.schedule_store_path = schedule_store.get("path", "")
+                self.schedule_store_secret = schedule_store.get("secret", "")
+                self.schedule_store_max_entries = schedule_store.get("max_entries", 200)
+                self.schedule_store_max_age_days = schedule_store.get("max_age_days", 60)
 
                 # 加载日志功能配置
                 logging_config = config.get("logging", {})
@@ -2478,12 +7133,55 @@ class ActivityTracker:
                 # 加载文件扫描控制配置
                 self.scan_subfolders = file_filtering.get("scan_subfolders", False)
 
+                # 加载文件扫描规则配置
+                self.include_patterns = file_filtering.get("include_patterns", [])
+                self.exclude_patterns = file_filtering.get("exclude_patterns", list(ScanRules.DEFAULT_EXCLUDE_PATTERNS))
+                self.exclude_dirs = file_filtering.get("exclude_dirs", list(ScanRules.DEFAULT_EXCLUDE_DIRS))
+                self.scan_max_depth = file_filtering.get("max_depth", -1)
+
+                # 加载文件扫描配置
+                file_scanning = config.get("file_scanning", {})
+                self.scan_time_budget = file_scanning.get("time_budget_seconds", 0)
+                self.scan_entry_budget = file_scanning.get("entry_budget", 0)
+                self.scan_max_workers = file_scanning.get("max_workers", 4)
+                self.dir_cache_enabled = file_scanning.get("dir_cache_enabled", True)
+                self.dir_cache_path = file_scanning.get("dir_cache_path", "")
+                self.scan_result_max_age = file_scanning.get("result_max_age_seconds", 300)
+
+                # 加载文件监视器配置
+                file_watcher_config = config.get("file_watcher", {})
+                self.file_watcher_enabled = file_watcher_config.get("enabled", True)
+                self.file_watcher_poll_interval = file_watcher_config.get("poll_interval_seconds", 10.0)
+                self.file_watcher_debounce = file_watcher_config.get("debounce_seconds", 0.5)
+
+                # 加载文件索引配置
+                file_index_config = config.get("file_index", {})
+                self.file_index_enabled = file_index_config.get("enabled", True)
+                self.file_index_path = file_index_config.get("db_path", "")
+                self.file_index_max_age = file_index_config.get("max_age_minutes", 60)
+                self.file_index_max_file_size = file_index_config.get("max_file_size_mb", 100)
+
+                # 加载文件选择配置
+                file_selection = config.get("file_selection", {})
+                self.selection_mode = file_selection.get("mode", "uniform")
+                self.selection_recency_half_life = file_selection.get("recency_half_life_days", 30)
+                self.selection_min_recency_weight = file_selection.get("min_recency_weight", 0.1)
+                self.selection_size_soft_limit = file_selection.get("size_soft_limit_mb", 20)
+                self.selection_extension_weights = file_selection.get("extension_weights", {})
+                self.pinned_files = file_selection.get("pinned_files", [])
+                self.pinned_weight = file_selection.get("pinned_weight", 5.0)
+                self.selection_opened_factor = file_selection.get("opened_weight_factor", 0.5)
+                self.shuffle_bag_path = file_selection.get("shuffle_bag_path", "")
+                self.coverage_report_days = file_selection.get("coverage_report_days", 7)
+
                 self.log_info("配置加载完成", f"项目文件夹数量: {len(self.folder_vars)}")
                 self.log_info("工作日历配置", f"跳过周末: {self.skip_weekends}, 调休日期: {len(self.work_dates)}个, 节假日: {len(self.holiday_dates)}个")
                 self.log_info("午休时间配置", f"启用: {self.lunch_break_enabled}, 时间: {self.lunch_start_hour:02d}:{self.lunch_start_minute:02d}-{self.lunch_end_hour:02d}:{self.lunch_end_minute:02d}, 随机区间: {self.lunch_time_random_range}分钟")
                 self.log_info("日志功能配置", f"启用: {self.logging_enabled}, 级别: {self.log_level}")
                 self.log_info("文件过滤配置", f"允许的文件后缀: {len(self.allowed_file_extensions)}个")
                 self.log_info("文件扫描配置", f"递归扫描: {self.scan_subfolders}")
+                self.log_info("文件索引配置", f"启用: {self.file_index_enabled}, 有效期: {self.file_index_max_age}分钟")
+                self.log_info("文件选择配置", f"方式: {self.selection_mode}, 置顶文件: {len(self.pinned_files)}个")
 
         except Exception as e:
             self.log_error("配置加载失败", f"错误: {str(e)}")
@@ -2519,47 +7217,23 @@ class ActivityTracker:
             else:
                 self.update_status("开始关闭检测到的程序...")
 
-            # 逐个关闭检测到的程序
-            for program_info in running_programs:
-                program_name = program_info['name']
-                window = program_info['window']
-
-                try:
-                    if self.show_close_progress:
-                        self.update_status(f"正在关闭: {program_name}")
-
-                    # 激活窗口
-                    window.activate()
-                    time.sleep(self.activation_delay)
-
-                    # 根据配置使用不同的关闭策略
-                    if self.use_alt_f4:
-                        pyautogui.hotkey('alt', 'f4')
-                        time.sleep(self.close_verification_delay)
-
-                    # 检查窗口是否还存在
-                    try:
-                        # 检查原窗口是否还存在
-                        if window in pyautogui.getAllWindows():
-                            if self.use_ctrl_q:
-                                # 如果Alt+F4无效，尝试Ctrl+Q
-                                pyautogui.hotkey('ctrl', 'q')
-                                time.sleep(self.close_timeout)
-
-                            # 再次检查
-                            if window in pyautogui.getAllWindows() and self.use_ctrl_w:
-                                # 如果还是无效，尝试Ctrl+W关闭当前标签页/文档
-                                pyautogui.hotkey('ctrl', 'w')
-                                time.sleep(self.close_timeout)
-                    except:
-                        pass  # 窗口可能已经关闭，这是正常的
+            # 逐个关闭检测到的程序（窗口消失后立即处理下一个）
+            def on_start(program_info):
+                if self.show_close_progress:
+                    self.update_status(f"正在关闭: {program_info['name']}")
 
+            def on_done(program_info, closed, keys, elapsed, error):
+                program_name = program_info['name']
+                if error is not None:
+                    self.log_error("关闭程序失败", f"程序: {program_name} | 错误: {str(error)}")
+                    self.update_status(f"关闭 {program_name} 时出错: {str(error)}", "orange")
+                elif closed:
                     closed_programs.append(program_name)
-                    self.log_info("成功关闭程序", f"程序: {program_name}")
+                    self.log_info("成功关闭程序", f"程序: {program_name} | 方式: {keys} | 耗时: {elapsed:.2f}秒")
+                else:
+                    self.log_warning("关闭程序未确认", f"程序: {program_name} | 等待 {elapsed:.2f}秒后窗口仍然存在")
 
-                except Exception as e:
-                    self.log_error("关闭程序失败", f"程序: {program_name} | 错误: {str(e)}")
-                    self.update_status(f"关闭 {program_name} 时出错: {str(e)}", "orange")
+            self.create_close_engine().close_all(running_programs, on_start, on_done)
 
             if closed_programs:
                 self.log_info("批量关闭完成", f"成功关闭 {len(closed_programs)} 个软件: {', '.join(closed_programs)}")
@@ -2569,6 +7243,8 @@ class ActivityTracker:
                 self.log_warning("关闭软件操作", "没有成功关闭任何软件")
                 self.update_status("没有成功关闭任何软件")
 
+            self.log_info("窗口枚举统计", self.window_inventory.summary())
+
             # 在关闭软件操作完成后，根据配置决定是否清空跟踪列表
             if self.clear_tracking_on_stop:
                 if self.opened_files or self.opened_programs:
@@ -2591,25 +7267,27 @@ class ActivityTracker:
                 self.update_status("没有检测到当前打开的文件")
                 return
 
-            # 获取实际运行的程序列表
-            running_programs = self.get_actually_running_programs()
+            current_filename = os.path.splitext(os.path.basename(self.current_opened_file))[0]
 
-            if not running_programs:
-                self.log_info("立即执行模式", "没有检测到需要关闭的程序")
-                self.update_status("没有检测到需要关闭的程序")
-                return
+            # 优先关闭打开文件时绑定的窗口
+            related_programs = self.get_bound_programs(self.current_opened_file)
 
-            # 过滤出与当前文件相关的程序
-            current_filename = os.path.splitext(os.path.basename(self.current_opened_file))[0]
-            related_programs = []
+            if not related_programs:
+                # 获取实际运行的程序列表
+                running_programs = self.get_actually_running_programs()
 
-            for program_info in running_programs:
-                program_name = program_info['name']
-                window_title = program_info['window'].title.lower()
+                if not running_programs:
+                    self.log_info("立即执行模式", "没有检测到需要关闭的程序")
+                    self.update_status("没有检测到需要关闭的程序")
+                    return
 
-                # 检查窗口标题是否包含当前文件名
-                if current_filename.lower() in window_title:
-                    related_programs.append(program_info)
+                # 过滤出与当前文件相关的程序
+                for program_info in running_programs:
+                    window_title = program_info['title'].lower()
+
+                    # 检查窗口标题是否包含当前文件名
+                    if current_filename.lower() in window_title:
+                        related_programs.append(program_info)
 
             if not related_programs:
                 self.log_warning("立即执行模式", f"没有找到与文件 {self.current_opened_file} 相关的程序窗口")
@@ -2619,45 +7297,27 @@ class ActivityTracker:
             self.log_info("立即执行模式", f"找到 {len(related_programs)} 个与文件 {current_filename} 相关的程序")
 
             closed_programs = []
-            # 逐个关闭相关程序
-            for program_info in related_programs:
-                program_name = program_info['name']
-                window = program_info['window']
-
-                try:
-                    self.update_status(f"正在关闭: {program_name}")
-                    self.log_info("立即执行模式", f"正在关闭程序: {program_name}")
-
-                    # 激活窗口
-                    window.activate()
-                    time.sleep(self.activation_delay)
-
-                    # 使用关闭策略
-                    if self.use_alt_f4:
-                        pyautogui.hotkey('alt', 'f4')
-                        time.sleep(self.close_verification_delay)
-
-                    # 检查窗口是否还存在，如果存在尝试其他方法
-                    try:
-                        if window in pyautogui.getAllWindows():
-                            if self.use_ctrl_q:
-                                pyautogui.hotkey('ctrl', 'q')
-                                time.sleep(self.close_timeout)
 
-                            if window in pyautogui.getAllWindows() and self.use_ctrl_w:
-                                pyautogui.hotkey('ctrl', 'w')
-                                time.sleep(self.close_timeout)
-                    except:
-                        pass  # 窗口可能已经关闭
+            # 逐个关闭相关程序（窗口消失后立即处理下一个）
+            def on_start(program_info):
+                self.update_status(f"正在关闭: {program_info['name']}")
+                self.log_info("立即执行模式", f"正在关闭程序: {program_info['name']}")
 
+            def on_done(program_info, closed, keys, elapsed, error):
+                program_name = program_info['name']
+                if error is not None:
+                    self.log_error("立即执行模式", f"关闭程序失败: {program_name} | 错误: {str(error)}")
+                    self.update_status(f"关闭 {program_name} 时出错: {str(error)}", "orange")
+                elif closed:
                     closed_programs.append(program_name)
-                    self.log_info("立即执行模式", f"成功关闭程序: {program_name}")
+                    self.log_info("立即执行模式", f"成功关闭程序: {program_name} | 方式: {keys} | 耗时: {elapsed:.2f}秒")
+                else:
+                    self.log_warning("立即执行模式", f"关闭程序未确认: {program_name} | 等待 {elapsed:.2f}秒后窗口仍然存在")
 
-                except Exception as e:
-                    self.log_error("立即执行模式", f"关闭程序失败: {program_name} | 错误: {str(e)}")
-                    self.update_status(f"关闭 {program_name} 时出错: {str(e)}", "orange")
+            self.create_close_engine().close_all(related_programs, on_start, on_done)
 
             if closed_programs:
+                self.launch_registry.forget(self.current_opened_file)
                 self.log_info("立即执行模式", f"程序关闭完成，成功关闭 {len(closed_programs)} 个相关程序: {', '.join(closed_programs)}")
                 self.update_status(f"成功关闭 {len(closed_programs)} 个相关程序")
             else:
@@ -2671,34 +7331,37 @@ class ActivityTracker:
     def close_program(self, program_name):
         """关闭指定名称的程序窗口"""
         try:
-            windows = pyautogui.getAllWindows()
+            program_name_lower = program_name.lower()
+            windows = self.window_inventory.find(program_name_lower)
             closed = False
 
-            for window in windows:
-                if program_name.lower() in window.title.lower():
-                    try:
-                        # 激活窗口
-                        window.activate()
-                        time.sleep(0.5)
+            for window_info in windows:
+                window = window_info.window
+                try:
+                    # 激活窗口
+                    self.window_backend.activate(window)
+                    self.clock.sleep(0.5)
 
-                        # 尝试使用Alt+F4关闭窗口
-                        pyautogui.hotkey('alt', 'f4')
-                        time.sleep(1)
+                    # 尝试使用Alt+F4关闭窗口
+                    self.window_backend.hotkey('alt', 'f4')
+                    self.window_inventory.invalidate()
+                    self.clock.sleep(1)
 
-                        # 检查窗口是否还存在
-                        if not any(program_name.lower() in w.title.lower() for w in pyautogui.getAllWindows()):
-                            closed = True
-                        else:
-                            # 如果Alt+F4无效，尝试Ctrl+Q（某些程序）
-                            pyautogui.hotkey('ctrl', 'q')
-                            time.sleep(1)
+                    # 检查窗口是否还存在
+                    if not self.window_inventory.find(program_name_lower):
+                        closed = True
+                    else:
+                        # 如果Alt+F4无效，尝试Ctrl+Q（某些程序）
+                        self.window_backend.hotkey('ctrl', 'q')
+                        self.window_inventory.invalidate()
+                        self.clock.sleep(1)
 
-                            if not any(program_name.lower() in w.title.lower() for w in pyautogui.getAllWindows()):
-                                closed = True
+                        if not self.window_inventory.find(program_name_lower):
+                            closed = True
 
-                    except Exception as e:
-                        self.update_status(f"关闭{program_name}窗口失败: {str(e)}", "orange")
-                        continue
+                except Exception as e:
+                    self.update_status(f"关闭{program_name}窗口失败: {str(e)}", "orange")
+                    continue
 
             return closed
 
@@ -2706,35 +7369,132 @@ class ActivityTracker:
             self.update_status(f"查找{program_name}窗口失败: {str(e)}", "orange")
             return False
 
+    def get_app_registry(self):
+        """获取编译好的应用程序注册表（配置不变时复用）"""
+        registry_key = json.dumps(self.app_registry_config, sort_keys=True, ensure_ascii=False)
+        if self.app_registry is None or self._app_registry_key != registry_key:
+            # 当前可执行文件名（去除扩展名）也作为自身保护关键词
+            current_exe_name = os.path.splitext(os.path.basename(sys.executable).lower())[0]
+            config = self.app_registry_config
+            try:
+                self.app_registry = AppRegistry(apps=config.get("apps", {}),
+                                                excluded_patterns=config.get("excluded_patterns", []),
+                                                self_protection_keywords=config.get("self_protection_keywords", []),
+                                                document_apps=config.get("document_apps", []),
+                                                extension_programs=config.get("extension_programs", {}),
+                                                self_names=[current_exe_name])
+            except Exception as e:
+                self.log_error("应用程序注册表加载失败", f"错误: {str(e)}，使用内置定义")
+                self.app_registry = AppRegistry(self_names=[current_exe_name])
+            self._app_registry_key = registry_key
+        return self.app_registry
+
+    def set_window_backend(self, backend_name):
+        """切换窗口后端（pyautogui / fake），同时重建窗口清单"""
+        if backend_name == self.window_backend.name:
+            return
+        if backend_name == "fake":
+            self.window_backend = FakeWindowBackend()
+        else:
+            backend_name = "pyautogui"
+            self.window_backend = PyautoguiWindowBackend()
+        self.window_backend_name = backend_name
+        self.window_inventory = WindowInventory(self.window_backend, self.window_snapshot_ttl)
+        self.open_waiter.inventory = self.window_inventory
+        self.save_verifier.inventory = self.window_inventory
+        self.log_info("窗口后端", f"使用: {backend_name}")
+
+    def verify_save(self, file_path, state_before, handle=None, title_before=None):
+        """验证一次保存的结果，并把结果和文件新状态记录到文件索引"""
+        try:
+            outcome, state, elapsed = self.save_verifier.verify(file_path, state_before, handle, title_before)
+        except Exception as e:
+            self.log_warning("保存验证失败", f"文件: {file_path} | 错误: {str(e)}")
+            return SaveVerifier.FAILED
+
+        if outcome == SaveVerifier.VERIFIED:
+            self.log_info("保存已验证", f"文件: {os.path.basename(file_path)} | 耗时: {elapsed:.2f}秒")
+        elif outcome == SaveVerifier.UNCHANGED:
+            self.log_info("保存未改变文件", f"文件: {os.path.basename(file_path)} | 文档可能没有修改，编辑器未写入")
+        else:
+            self.log_warning("保存未生效", f"文件: {os.path.basename(file_path)} | 等待 {elapsed:.2f}秒后仍未确认保存")
+
+        index = self.get_file_index()
+        if index:
+            try:
+                if outcome == SaveVerifier.VERIFIED and state is not None:
+                    index.record_save(file_path, outcome, state[1], state[0] / 1e9)
+                else:
+                    index.record_save(file_path, outcome)
+            except Exception as e:
+                self.log_warning("保存结果记录失败", f"文件: {file_path} | 错误: {str(e)}")
+
+        self.log_info("保存验证统计", self.save_verifier.summary())
+        return outcome
+
+    def create_close_engine(self):
+        """根据关闭策略配置创建关闭引擎"""
+        strategies = []
+        if self.use_alt_f4:
+            strategies.append(('alt', 'f4'))
+        if self.use_ctrl_q:
+            strategies.append(('ctrl', 'q'))
+        if self.use_ctrl_w:
+            strategies.append(('ctrl', 'w'))
+        return CloseEngine(self.window_backend, self.window_inventory, strategies,
+                           activation_delay=self.activation_delay,
+                           verification_timeout=self.close_verification_delay,
+                           close_timeout=self.close_timeout,
+                           sleep=self.clock.sleep, clock=self.clock.monotonic)
+
+    def get_bound_programs(self, file_path):
+        """获取打开文件时绑定的、仍然存在的窗口（格式与get_actually_running_programs一致）"""
+        try:
+            bound_windows = self.launch_registry.windows_for(file_path, self.window_inventory.snapshot())
+        except Exception as e:
+            self.log_warning("获取绑定窗口失败", f"错误: {str(e)}")
+            return []
+
+        app_registry = self.get_app_registry()
+        programs = []
+        for window_info in bound_windows:
+            app_match = app_registry.classify(window_info.title_lower)
+            programs.append({
+                'name': app_match.display_name or f'文档编辑器 ({os.path.basename(file_path)})',
+                'window': window_info.window,
+                'title': window_info.title,
+                'handle': window_info.handle,
+                'pid': window_info.pid,
+                'software_type': app_match.app_type or 'bound_window',
+                'window_count': 1
+            })
+        if programs:
+            self.log_info("使用绑定窗口", f"文件: {os.path.basename(file_path)} | 窗口: {len(programs)}个")
+        return programs
+
+    def bind_launched_file(self, file_path, windows_before, spawned_pid=None):
+        """根据打开文件前后的窗口快照，把新窗口和进程绑定到文件"""
+        try:
+            windows_after = self.window_inventory.snapshot()
+            record = self.launch_registry.bind(file_path, windows_before, windows_after, spawned_pid)
+            if record.handles:
+                self.log_info("窗口绑定", f"文件: {os.path.basename(file_path)} | 窗口: {len(record.handles)}个 | 进程: {sorted(record.pids)}")
+            else:
+                self.log_info("窗口绑定", f"文件: {os.path.basename(file_path)} | 未发现新窗口，保存和关闭时按标题匹配")
+            return record
+        except Exception as e:
+            self.log_warning("窗口绑定失败", f"文件: {file_path} | 错误: {str(e)}")
+            return None
+
     def track_program_by_file_extension(self, file_ext):
         """根据文件扩展名跟踪可能使用的程序"""
-        # 文档类型到程序的映射
-        extension_to_programs = {
-            '.txt': ['记事本', 'Notepad', 'Sublime Text', 'VS Code'],
-            '.docx': ['Microsoft Word', 'WPS Writer', 'WPS 文字'],
-            '.doc': ['Microsoft Word', 'WPS Writer', 'WPS 文字'],
-            '.pdf': ['Adobe Acrobat', 'Foxit Reader', '福昕', 'Microsoft Edge'],
-            '.wps': ['WPS Writer', 'WPS 文字'],
-            '.py': ['VS Code', 'PyCharm', 'IDLE', 'Sublime Text'],
-            '.java': ['IntelliJ IDEA', 'Eclipse', 'VS Code'],
-            '.cpp': ['VS Code', 'Dev-C++', 'Code::Blocks'],
-            '.html': ['VS Code', 'Sublime Text', 'Chrome', 'Edge'],
-            '.js': ['VS Code', 'Sublime Text', 'WebStorm'],
-            '.md': ['VS Code', 'Typora', 'MarkdownPad'],
-            '.xlsx': ['Microsoft Excel', 'WPS 表格'],
-            '.xls': ['Microsoft Excel', 'WPS 表格'],
-            '.pptx': ['Microsoft PowerPoint', 'WPS 演示'],
-            '.ppt': ['Microsoft PowerPoint', 'WPS 演示']
-        }
-
-        if file_ext in extension_to_programs:
-            for program in extension_to_programs[file_ext]:
-                self.opened_programs.add(program)
+        for program in self.get_app_registry().programs_for_extension(file_ext):
+            self.opened_programs.add(program)
 
     def get_actually_running_programs(self):
         """获取实际正在运行的程序列表（按软件进程分组，避免重复关闭）"""
         try:
-            all_windows = pyautogui.getAllWindows()
+            all_windows = self.window_inventory.snapshot()
             software_groups = {}  # 按软件类型分组
             excluded_titles = set()  # 排除不应关闭的窗口
 
@@ -2742,96 +7502,40 @@ class ActivityTracker:
             current_process_name = os.path.basename(sys.executable).lower()
             current_script_name = os.path.basename(__file__).lower() if '__file__' in globals() else 'activity_tracker.py'
 
-            # 定义软件类型识别模式
-            software_patterns = {
-                'word': ['microsoft word', 'word', 'winword'],
-                'excel': ['microsoft excel', 'excel'],
-                'powerpoint': ['microsoft powerpoint', 'powerpoint'],
-                'wps_writer': ['wps writer', 'wps 文字', 'wps文字'],
-                'wps_spreadsheet': ['wps spreadsheets', 'wps 表格', 'wps表格'],
-                'wps_presentation': ['wps presentation', 'wps 演示', 'wps演示'],
-                'notepad': ['notepad.exe', '记事本'],
-                'notepadpp': ['notepad++'],
-                'sublime': ['sublime text'],
-                'vscode': ['visual studio code', 'vscode'],
-                'pycharm': ['pycharm'],
-                'adobe_acrobat': ['adobe acrobat', 'acrobat'],
-                'foxit': ['foxit reader', '福昕'],
-                'chrome': ['google chrome'],
-                'edge': ['microsoft edge']
-            }
-
-            # 定义不应关闭的软件模式（避免关闭开发环境自身）
-            excluded_patterns = [
-                'activity_tracker',     # 避免关闭自身（开发环境）
-                'worktrace mocker',     # 避免关闭打包后的程序
-                'workTraceMocker',      # 避免关闭打包后的程序（驼峰命名）
-                'WorkTrace Mocker',
-                'python',               # 避免关闭Python相关程序
-                'pythonw',              # 避免关闭Python窗口版本
-                'cmd.exe',             # 避免关闭命令行
-                'powershell',          # 避免关闭PowerShell
-                'explorer.exe',        # 避免关闭文件资源管理器
-                'taskmgr.exe',         # 避免关闭任务管理器
-                'pyinstaller',         # 避免关闭PyInstaller相关进程
-                '.exe - python',       # 避免关闭Python相关的exe进程
-            ]
+            # 软件识别、排除模式和自身保护关键词都由应用程序注册表一次完成
+            app_registry = self.get_app_registry()
 
             self.log_info("程序检测开始", f"当前进程: {current_process_name}, 脚本: {current_script_name}")
 
-            for window in all_windows:
-                window_title = window.title
-                window_title_lower = window_title.lower()
+            title_matcher = None  # 项目文件名匹配器（按需同步一次）
+
+            for window_info in all_windows:
+                window_title = window_info.title
+                window_title_lower = window_info.title_lower
 
                 if len(window_title.strip()) == 0:  # 跳过空标题窗口
                     continue
 
-                # 检查是否为不应关闭的软件
-                should_exclude = False
-
-                # 首先检查基本排除模式
-                for excluded_pattern in excluded_patterns:
-                    if excluded_pattern in window_title_lower:
-                        should_exclude = True
-                        excluded_titles.add(window_title)
-                        self.log_info("排除窗口", f"基本排除模式匹配: {window_title} (模式: {excluded_pattern})")
-                        break
+                # 一次调用完成分类（结果按标题缓存）
+                app_match = app_registry.classify(window_title_lower)
 
-                # 额外的自身保护检查
-                if not should_exclude:
-                    # 检查是否包含当前可执行文件名（去除扩展名）
-                    current_exe_name = os.path.splitext(current_process_name)[0]
-                    if current_exe_name in window_title_lower:
-                        should_exclude = True
-                        excluded_titles.add(window_title)
-                        self.log_info("排除窗口", f"可执行文件名匹配: {window_title} (文件: {current_exe_name})")
-
-                    # 检查是否为包含特定关键词的可能的自身程序
-                    self_protection_keywords = ['活动痕迹', '自动活动', 'activity tracker', 'trace mocker']
-                    for keyword in self_protection_keywords:
-                        if keyword in window_title_lower:
-                            should_exclude = True
-                            excluded_titles.add(window_title)
-                            self.log_info("排除窗口", f"自身保护关键词匹配: {window_title} (关键词: {keyword})")
-                            break
+                # 检查是否为不应关闭的软件
+                if app_match.category == 'excluded':
+                    excluded_titles.add(window_title)
+                    self.log_info("排除窗口", f"基本排除模式匹配: {window_title} (模式: {app_match.pattern})")
+                    continue
 
-                if should_exclude:
+                # 额外的自身保护检查（包括当前可执行文件名）
+                if app_match.category == 'self':
+                    excluded_titles.add(window_title)
+                    self.log_info("排除窗口", f"自身保护关键词匹配: {window_title} (关键词: {app_match.pattern})")
                     continue
 
                 # 确定软件类型
-                software_type = None
-                detected_pattern = None
+                software_type = app_match.app_type
+                detected_pattern = app_match.pattern
                 matched_file = None  # 初始化匹配的文件名
 
-                for soft_type, patterns in software_patterns.items():
-                    for pattern in patterns:
-                        if pattern in window_title_lower:
-                            software_type = soft_type
-                            detected_pattern = pattern
-                            break
-                    if software_type:
-                        break
-
                 # 如果没有匹配到预定义软件类型，检查是否包含我们的文件
                 if not software_type:
                     contains_tracked_file = False
@@ -2847,34 +7551,19 @@ class ActivityTracker:
                                 matched_file = file_name
                                 break
 
-                    # 检查是否包含项目文件夹中的文件
+                    # 检查是否包含项目文件夹中的文件（一次线性扫描匹配所有文件名）
                     if not contains_tracked_file:
-                        for folder_var in self.folder_vars:
-                            folder_path = folder_var.get().strip()
-                            if not folder_path or not os.path.exists(folder_path):
-                                continue
+                        if title_matcher is None:
+                            title_matcher = self.get_title_matcher()
 
-                            try:
-                                for root, dirs, files in os.walk(folder_path):
-                                    for file in files:
-                                        file_name = os.path.basename(file)
-                                        file_name_no_ext = os.path.splitext(file_name)[0]
-                                        if (file_name.lower() in window_title_lower or
-                                            file_name_no_ext.lower() in window_title_lower):
-                                            contains_tracked_file = True
-                                            matched_file = file_name
-                                            break
-                                    if contains_tracked_file:
-                                        break
-                            except (OSError, PermissionError, UnicodeError):
-                                continue
-
-                            if contains_tracked_file:
-                                break
+                        project_file = title_matcher.match(window_title_lower)
+                        if project_file:
+                            contains_tracked_file = True
+                            matched_file = project_file
 
                     if contains_tracked_file:
-                        # 为包含我们文件的未知软件创建临时分组
-                        software_type = f'unknown_editor_{hash(window_title_lower) % 1000}'
+                        # 为包含我们文件的未知软件创建临时分组（按完整标题，不同文件的窗口不会被合并）
+                        software_type = f'unknown_editor_{window_title_lower}'
 
                 # 如果确定了软件类型，加入分组
                 if software_type:
@@ -2885,21 +7574,24 @@ class ActivityTracker:
                             'primary_window': None
                         }
 
-                    software_groups[software_type]['windows'].append(window)
+                    software_groups[software_type]['windows'].append(window_info)
 
                     # 选择主窗口（通常是第一个或者标题最简洁的）
                     if (software_groups[software_type]['primary_window'] is None or
                         len(window_title) < len(software_groups[software_type]['primary_window'].title)):
-                        software_groups[software_type]['primary_window'] = window
+                        software_groups[software_type]['primary_window'] = window_info
 
             # 构建最终的程序列表（每个软件只保留一个主窗口）
             running_programs = []
             for software_type, group_info in software_groups.items():
                 if group_info['primary_window']:
+                    primary_window = group_info['primary_window']
                     running_programs.append({
                         'name': group_info['display_name'],
-                        'window': group_info['primary_window'],
-                        'title': group_info['primary_window'].title,
+                        'window': primary_window.window,
+                        'title': primary_window.title,
+                        'handle': primary_window.handle,
+                        'pid': primary_window.pid,
                         'software_type': software_type,
                         'window_count': len(group_info['windows'])
                     })
@@ -2924,26 +7616,9 @@ class ActivityTracker:
 
     def _get_software_display_name(self, software_type, detected_pattern, matched_file):
         """获取软件的显示名称"""
-        display_names = {
-            'word': 'Microsoft Word',
-            'excel': 'Microsoft Excel',
-            'powerpoint': 'Microsoft PowerPoint',
-            'wps_writer': 'WPS 文字',
-            'wps_spreadsheet': 'WPS 表格',
-            'wps_presentation': 'WPS 演示',
-            'notepad': '记事本',
-            'notepadpp': 'Notepad++',
-            'sublime': 'Sublime Text',
-            'vscode': 'Visual Studio Code',
-            'pycharm': 'PyCharm',
-            'adobe_acrobat': 'Adobe Acrobat',
-            'foxit': 'Foxit Reader',
-            'chrome': 'Google Chrome',
-            'edge': 'Microsoft Edge'
-        }
-
-        if software_type in display_names:
-            return display_names[software_type]
+        display_name = self.get_app_registry().display_name(software_type)
+        if display_name:
+            return display_name
         elif software_type.startswith('unknown_editor_'):
             if matched_file:
                 return f'文档编辑器 ({matched_file})'
@@ -2959,6 +7634,14 @@ except ImportError:
     winreg = None
 
 if __name__ == "__main__":
+    # 命令行测量排除目录前后的扫描耗时，不打开界面
+    if any(arg.split("=")[0] == "--benchmark-scan" for arg in sys.argv[1:]):
+        sys.exit(run_scan_benchmark_cli(sys.argv[1:]))
+
+    # 命令行模拟排程或测量打开间隔模型的速度，不打开界面
+    if "--simulate" in sys.argv[1:] or "--benchmark-models" in sys.argv[1:]:
+        sys.exit(run_simulation_cli(sys.argv[1:]))
+
     try:
         # 初始化Tkinter根窗口
         try:
@@ -0,0 +1,90 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activity_tracker import FakeWindowBackend, LaunchRegistry  # noqa: E402
+
+
+class MatchLaunchedTest(unittest.TestCase):
+    """打开文件后窗口绑定的匹配规则"""
+
+    def setUp(self):
+        self.backend = FakeWindowBackend()
+        self.path = os.path.join("project", "report.txt")
+
+    def match(self, before, process_tree=()):
+        after = self.backend.list_windows()
+        return LaunchRegistry.match_launched(self.path, before, after, set(process_tree))
+
+    def test_new_window_with_full_name_is_bound(self):
+        before = self.backend.list_windows()
+        window = self.backend.add_window("report.txt - Editor")
+        self.assertEqual([info.handle for info in self.match(before)], [window._hWnd])
+
+    def test_new_window_with_stem_only_is_not_bound(self):
+        before = self.backend.list_windows()
+        self.backend.add_window("report - Spreadsheet")
+        self.backend.add_window("Quarterly report draft")
+        self.assertEqual(self.match(before), [])
+
+    def test_lone_unrelated_new_window_is_not_bound(self):
+        before = self.backend.list_windows()
+        self.backend.add_window("Update available")
+        self.assertEqual(self.match(before), [])
+
+    def test_new_window_in_process_tree_is_bound(self):
+        before = self.backend.list_windows()
+        window = self.backend.add_window("Untitled - Editor", pid=4321)
+        self.backend.add_window("Update available")
+        self.assertEqual([info.handle for info in self.match(before, {4321})], [window._hWnd])
+
+    def test_existing_window_requires_full_name(self):
+        editor = self.backend.add_window("Editor")
+        other = self.backend.add_window("Mail")
+        before = self.backend.list_windows()
+        editor.title = "report.txt - Editor"
+        other.title = "Re: report - Mail"
+        self.assertEqual([info.handle for info in self.match(before)], [editor._hWnd])
+
+    def test_unchanged_existing_window_is_not_bound(self):
+        self.backend.add_window("report.txt - Editor")
+        before = self.backend.list_windows()
+        self.assertEqual(self.match(before), [])
+
+
+class LaunchRegistryBindTest(unittest.TestCase):
+    """绑定记录只包含与文件相关的窗口，关闭时不会波及其他程序"""
+
+    def test_bound_windows_exclude_unrelated_popups(self):
+        backend = FakeWindowBackend()
+        registry = LaunchRegistry()
+        path = os.path.join("project", "plan.md")
+
+        before = backend.list_windows()
+        backend.open_file(path)
+        backend.add_window("plan - Notes")
+        record = registry.bind(path, before, backend.list_windows())
+
+        bound = registry.windows_for(path, backend.list_windows())
+        self.assertEqual([info.title for info in bound], ["plan.md - FakeEditor"])
+        self.assertEqual(len(record.handles), 1)
+        self.assertEqual((registry.bound, registry.unbound), (1, 0))
+
+    def test_no_match_leaves_record_unbound(self):
+        backend = FakeWindowBackend()
+        registry = LaunchRegistry()
+        path = os.path.join("project", "plan.md")
+
+        before = backend.list_windows()
+        backend.add_window("Update available")
+        record = registry.bind(path, before, backend.list_windows())
+
+        self.assertEqual(record.handles, set())
+        self.assertEqual(registry.windows_for(path, backend.list_windows()), [])
+        self.assertEqual((registry.bound, registry.unbound), (0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activity_tracker import FakeWindowBackend, OpenWaiter, WindowInventory  # noqa: E402
+
+
+class FakeTime:
+    """可控的时钟：sleep只推进时间"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def clock(self):
+        return self.now
+
+
+class BrokenBackend(FakeWindowBackend):
+    def list_windows(self):
+        raise AttributeError("getAllWindows")
+
+
+class OpenWaiterTest(unittest.TestCase):
+    """打开文件后的就绪等待"""
+
+    def make_waiter(self, backend, timeout=10.0):
+        self.time = FakeTime()
+        return OpenWaiter(WindowInventory(backend, ttl=0), timeout, settle_delay=0,
+                          sleep=self.time.sleep, clock=self.time.clock)
+
+    def test_ready_when_window_appears(self):
+        backend = FakeWindowBackend()
+        waiter = self.make_waiter(backend)
+        backend.add_window("Mail")
+        before = backend.list_windows()
+        backend.open_file(os.path.join("project", "a.txt"))
+        ready, _ = waiter.wait(os.path.join("project", "a.txt"), before)
+        self.assertTrue(ready)
+        self.assertEqual(self.time.now, 0.0)
+
+    def test_timeout_when_window_never_appears(self):
+        backend = FakeWindowBackend()
+        waiter = self.make_waiter(backend, timeout=3.0)
+        backend.add_window("Mail")
+        ready, elapsed = waiter.wait(os.path.join("project", "a.txt"), backend.list_windows())
+        self.assertFalse(ready)
+        self.assertAlmostEqual(elapsed, 3.0)
+        self.assertEqual(waiter.timeouts_hit[".txt"], 1)
+
+    def test_unavailable_backend_uses_fixed_delay(self):
+        backend = FakeWindowBackend()
+        backend.available = False
+        waiter = self.make_waiter(backend)
+        self.assertEqual(waiter.wait("a.txt", []), (None, OpenWaiter.FALLBACK_DELAY))
+        self.assertEqual(self.time.now, OpenWaiter.FALLBACK_DELAY)
+
+    def test_enumeration_error_uses_fixed_delay(self):
+        waiter = self.make_waiter(BrokenBackend())
+        self.assertEqual(waiter.wait("a.txt", []), (None, OpenWaiter.FALLBACK_DELAY))
+        self.assertEqual(waiter.fallbacks, 1)
+
+    def test_empty_window_list_does_not_wait_for_timeout(self):
+        waiter = self.make_waiter(FakeWindowBackend(), timeout=30.0)
+        ready, elapsed = waiter.wait("a.txt", [])
+        self.assertIsNone(ready)
+        self.assertEqual(elapsed, OpenWaiter.FALLBACK_DELAY)
+        self.assertEqual(self.time.now, OpenWaiter.FALLBACK_DELAY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activity_tracker import FakeWindowBackend, SaveVerifier, WindowInventory  # noqa: E402
+
+
+class FakeTime:
+    """可控的时钟：sleep只推进时间"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def clock(self):
+        return self.now
+
+
+class SaveVerifierTest(unittest.TestCase):
+    """发送Ctrl+S后的保存确认"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.path = os.path.join(self.temp_dir, "report.txt")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("draft")
+        self.backend = FakeWindowBackend(touch_on_save=False)
+        self.time = FakeTime()
+        self.verifier = SaveVerifier(WindowInventory(self.backend, ttl=0), timeout=5.0,
+                                     sleep=self.time.sleep, clock=self.time.clock)
+
+    def save(self, title):
+        window = self.backend.add_window(title, path=self.path)
+        before_state = SaveVerifier.file_state(self.path)
+        window.activate()
+        self.backend.hotkey('ctrl', 's')
+        return self.verifier.verify(self.path, before_state, window._hWnd, title)
+
+    def test_clean_title_returns_unchanged_after_short_grace(self):
+        outcome, _, elapsed = self.save("report.txt - FakeEditor")
+        self.assertEqual(outcome, SaveVerifier.UNCHANGED)
+        self.assertLessEqual(elapsed, SaveVerifier.UNCHANGED_GRACE)
+        self.assertLessEqual(self.time.now, SaveVerifier.UNCHANGED_GRACE)
+
+    def test_dirty_title_waits_full_timeout(self):
+        outcome, _, elapsed = self.save("*report.txt - FakeEditor")
+        self.assertEqual(outcome, SaveVerifier.FAILED)
+        self.assertAlmostEqual(elapsed, 5.0)
+
+    def test_unknown_title_waits_full_timeout(self):
+        before_state = SaveVerifier.file_state(self.path)
+        outcome, _, elapsed = self.verifier.verify(self.path, before_state)
+        self.assertEqual(outcome, SaveVerifier.UNCHANGED)
+        self.assertAlmostEqual(elapsed, 5.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activity_tracker import FileRecord, FolderWatcher, ScanResult  # noqa: E402
+
+
+class FolderPathNormalizationTest(unittest.TestCase):
+    """配置中的文件夹写法（正斜杠、末尾分隔符、多余的路径段）不影响按文件夹统计和范围判断"""
+
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base, ignore_errors=True)
+        self.project = os.path.join(self.base, "project")
+        self.other = os.path.join(self.base, "project_old")
+        for folder in (os.path.join(self.project, "sub"), self.other):
+            os.makedirs(folder)
+
+    def forward_slash(self, folder, suffix="/"):
+        return folder.replace(os.sep, "/") + suffix
+
+    def test_folder_counts_with_forward_slash_folders(self):
+        folders = [self.forward_slash(self.project, "/sub/../"), self.forward_slash(self.other, "")]
+        records = [FileRecord(os.path.join(self.project, "a.txt"), ".txt", 1, 0.0),
+                   FileRecord(os.path.join(self.project, "sub", "b.txt"), ".txt", 1, 0.0),
+                   FileRecord(os.path.join(self.other, "c.txt"), ".txt", 1, 0.0)]
+        result = ScanResult(True, folders, records)
+        self.assertEqual(list(result.folder_counts.values()), [2, 1])
+
+    def test_watcher_scope_with_forward_slash_folders(self):
+        watcher = FolderWatcher([self.forward_slash(self.project)], [".txt"], True)
+        self.assertTrue(watcher._within_folders(self.project))
+        self.assertTrue(watcher._within_folders(os.path.join(self.project, "sub")))
+        self.assertFalse(watcher._within_folders(self.other))
+        self.assertTrue(watcher.matches([self.project], [".txt"], True, watcher.rules))
+
+
+if __name__ == "__main__":
+    unittest.main()
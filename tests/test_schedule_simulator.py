@@ -0,0 +1,65 @@
+import datetime
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activity_tracker import ActivityModel, DayPlanner, ScheduleSimulator, WorkCalendar, np  # noqa: E402
+
+WINDOWS = {'work': (9 * 60, 18 * 60), 'lunch': (12 * 60, 13 * 60 + 30)}
+START = datetime.date(2026, 1, 5)
+SEED = 7
+
+
+def window_provider(kind, day):
+    return WINDOWS[kind]
+
+
+class ScheduleSimulatorEngineTest(unittest.TestCase):
+    """两种模拟引擎与工作模式使用的DayPlanner一致"""
+
+    def make_simulator(self, model):
+        return ScheduleSimulator(WorkCalendar(), save_delay=(20, 50), file_interval=(30, 60), seed=SEED,
+                                 model=model, window_provider=window_provider)
+
+    def planner_days(self, model, days):
+        """直接用DayPlanner逐日生成计划，统计打开和保存次数"""
+        planner = DayPlanner(20, 50, 30, 60, rng=random.Random(SEED), model=model)
+        counts = []
+        for day in days:
+            midnight = datetime.datetime.combine(day, datetime.time())
+            moments = {kind: [midnight + datetime.timedelta(minutes=minutes) for minutes in window]
+                       for kind, window in WINDOWS.items()}
+            plan = planner.plan(*moments['work'], *moments['lunch'])
+            counts.append((plan.count('open'), plan.count('save')))
+        return counts
+
+    def test_python_engine_matches_day_planner(self):
+        for kind in ('uniform', 'gamma', 'poisson'):
+            model = ActivityModel(kind, 30, 60)
+            simulation = self.make_simulator(model).run(2, START, use_numpy=False)
+            days = [datetime.date.fromisoformat(row['date']) for row in simulation.days]
+            self.assertEqual(len(days), 10)
+            self.assertEqual([(row['opens'], row['saves']) for row in simulation.days],
+                             self.planner_days(model, days), kind)
+            for row in simulation.days:
+                self.assertEqual(row['opens'], row['saves'] + row['superseded_saves'])
+
+    @unittest.skipIf(np is None, "未安装numpy")
+    def test_numpy_engine_matches_day_planner_distribution(self):
+        for kind in ('uniform', 'lognormal', 'gamma'):
+            model = ActivityModel(kind, 30, 60)
+            simulation = self.make_simulator(model).run(40, START, use_numpy=True)
+            self.assertEqual(simulation.engine, "numpy")
+            days = [datetime.date.fromisoformat(row['date']) for row in simulation.days]
+            expected = self.planner_days(model, days)
+            for column, field in enumerate(('opens', 'saves')):
+                actual_mean = sum(row[field] for row in simulation.days) / len(days)
+                expected_mean = sum(counts[column] for counts in expected) / len(days)
+                self.assertAlmostEqual(actual_mean, expected_mean, delta=expected_mean * 0.03, msg=f"{kind} {field}")
+
+
+if __name__ == "__main__":
+    unittest.main()
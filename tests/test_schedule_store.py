@@ -0,0 +1,53 @@
+import datetime
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activity_tracker import ScheduleStore  # noqa: E402
+
+
+def window(base_start):
+    return lambda rng: ScheduleStore.random_window(rng, base_start, base_start + 540, 20, 60)
+
+
+class ScheduleStoreTest(unittest.TestCase):
+    """每日排程缓存在设置变化前后的行为"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        self.path = os.path.join(self.temp_dir, "schedule_cache.json")
+        self.today = datetime.date(2026, 3, 10)
+        self.store = self.make_store()
+        self.old_hash = ScheduleStore.settings_hash([540, 20])
+        self.new_hash = ScheduleStore.settings_hash([600, 20])
+
+    def make_store(self, secret="fixed"):
+        return ScheduleStore(self.path, secret, today=lambda: self.today)
+
+    def test_past_day_keeps_times_after_settings_change(self):
+        day = self.today
+        actual, _ = self.store.get_or_create('work', day, self.old_hash, window(540))
+        self.today += datetime.timedelta(days=1)
+        self.assertEqual(self.store.peek('work', day, self.new_hash, window(600)), actual)
+        self.assertEqual(self.make_store().get_or_create('work', day, self.new_hash, window(600)), (actual, False))
+
+    def test_today_follows_new_settings(self):
+        old, _ = self.store.get_or_create('work', self.today, self.old_hash, window(540))
+        new, created = self.store.get_or_create('work', self.today, self.new_hash, window(600))
+        self.assertTrue(created)
+        self.assertNotEqual(new, old)
+        self.assertEqual(self.store.get_or_create('work', self.today, self.old_hash, window(540)), (old, True))
+
+    def test_configured_secret_survives_cache_deletion(self):
+        actual, _ = self.store.get_or_create('work', self.today, self.old_hash, window(540))
+        os.remove(self.path)
+        self.assertEqual(self.make_store().peek('work', self.today, self.old_hash, window(540)), actual)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import collections
+import datetime
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+import tkinter
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activity_tracker import ActivityTracker, FakeWindowBackend, WindowInventory  # noqa: E402
+
+
+class FakeRoot:
+    """不带界面的根窗口：界面刷新回调直接丢弃"""
+
+    def after(self, ms, func=None, *args):
+        return None
+
+    def after_cancel(self, after_id):
+        pass
+
+
+class FakeLabel:
+    def __init__(self):
+        self.options = {}
+
+    def config(self, **options):
+        self.options.update(options)
+
+    configure = config
+
+    def cget(self, key):
+        return self.options.get(key, "")
+
+
+class ReusingWindowBackend(FakeWindowBackend):
+    """与大多数编辑器一致：再次打开已打开的文件时只激活原来的窗口"""
+
+    def open_file(self, path):
+        for window in list(self.windows):
+            if window.path == path:
+                self.actions.append(('open', window.title))
+                return window.pid
+        return super().open_file(path)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def setUpModule():
+    # Tk变量需要一个默认根对象，Tcl解释器不需要图形界面
+    global _previous_default_root
+    _previous_default_root = tkinter._default_root
+    tkinter._default_root = tkinter.Tcl()
+
+
+def tearDownModule():
+    tkinter._default_root = _previous_default_root
+
+
+class VirtualRunTest(unittest.TestCase):
+    """用虚拟时钟和假的窗口后端完整运行两周的工作模式"""
+
+    START = datetime.datetime(2026, 1, 5, 7, 0)  # 周一
+    DAYS = 14
+    WORK_DAYS = 10
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        project = os.path.join(self.temp_dir, "project")
+        os.makedirs(project)
+        for index in range(40):
+            with open(os.path.join(project, f"note{index}.txt"), 'w') as f:
+                f.write("x")
+
+        tracker = ActivityTracker.__new__(ActivityTracker)
+        tracker.root = FakeRoot()
+        tracker.config_path = os.path.join(self.temp_dir, "config.json")
+        tracker.initialize_basic_attributes()
+        tracker.status_label = FakeLabel()
+        tracker.save_time_label = FakeLabel()
+        tracker.toggle_btn = FakeLabel()
+        tracker.folder_vars = [tkinter.StringVar(value=project)]
+
+        self.handler = ListHandler()
+        tracker.logger = logging.getLogger(f"virtual_run_{id(self)}")
+        tracker.logger.propagate = False
+        tracker.logger.setLevel(logging.INFO)
+        tracker.logger.addHandler(self.handler)
+
+        self.backend = ReusingWindowBackend()
+        tracker.window_backend = self.backend
+        tracker.window_inventory = WindowInventory(self.backend, 0)
+        tracker.open_waiter.inventory = tracker.window_inventory
+        tracker.save_verifier.inventory = tracker.window_inventory
+        self.tracker = tracker
+
+    def count_logs(self, prefix):
+        return sum(1 for message in self.handler.messages if message.startswith(prefix))
+
+    def test_two_weeks(self):
+        clock = self.tracker.run_virtual(self.START, self.DAYS)
+        actions = collections.Counter(action for action, _ in self.backend.actions)
+
+        self.assertEqual(clock.now(), self.START + datetime.timedelta(days=self.DAYS))
+
+        # 每个工作日都打开了文件，每次打开都对应一次打开操作
+        opens = self.count_logs("打开文件 |")
+        self.assertGreaterEqual(opens, self.WORK_DAYS)
+        self.assertEqual(actions['open'], opens)
+
+        # 保存：每次发送的Ctrl+S都记录为保存完成
+        saves = actions['ctrl+s']
+        self.assertGreater(saves, 0)
+        self.assertLessEqual(saves, opens + self.WORK_DAYS)
+        saved_windows = sum(int(re.search(r"成功保存 (\d+) 个", message).group(1))
+                            for message in self.handler.messages if message.startswith("当前文件保存完成"))
+        self.assertEqual(saved_windows, saves)
+
+        # 午休：每个工作日进入并结束一次
+        self.assertEqual(self.count_logs("午休时间 | 进入午休时间"), self.WORK_DAYS)
+        self.assertEqual(self.count_logs("午休时间 | 午休结束"), self.WORK_DAYS)
+
+        # 下班：每个工作日关闭一次软件，结束时没有遗留的窗口
+        self.assertEqual(self.count_logs("开始关闭软件"), self.WORK_DAYS)
+        self.assertEqual(self.backend.windows, [])
+
+
+if __name__ == "__main__":
+    unittest.main()